@@ -0,0 +1,51 @@
+'''
+This module defines the JWT authentication classes used by the API views
+'''
+from typing import List
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.authentication import BaseAuthentication
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework_simplejwt.authentication import (
+    JWTAuthentication, JWTStatelessUserAuthentication)
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import Token
+from .cache import auth_user_cache_key
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication that keeps the authenticated User in the cache
+    for AUTH_USER_CACHE_TIMEOUT seconds, so a burst of requests from
+    the same user loads the row once. The entry is dropped whenever
+    the user is saved or deleted.
+    """
+
+    def get_user(self, validated_token: Token):
+        timeout = settings.AUTH_USER_CACHE_TIMEOUT
+        user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+        if not timeout or user_id is None:
+            return super().get_user(validated_token)
+
+        key = auth_user_cache_key(user_id)
+        user = cache.get(key)
+        if user is None:
+            user = super().get_user(validated_token)
+            cache.set(key, user, timeout)
+        return user
+
+
+class StatelessReadMixin:
+    """
+    View mixin authenticating GET, HEAD and OPTIONS requests from the
+    token claims alone: request.user is a TokenUser carrying the
+    id (and username) claims, and no User row is loaded.
+
+    Other methods use the configured authentication classes and get
+    a full User instance, as they may write rows referencing it.
+    """
+
+    def get_authenticators(self) -> List[BaseAuthentication]:
+        if self.request.method in SAFE_METHODS:
+            return [JWTStatelessUserAuthentication()]
+        return super().get_authenticators()
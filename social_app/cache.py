@@ -0,0 +1,163 @@
+'''
+This module defines the response cache for the post feed and post details
+'''
+import hashlib
+import time
+from typing import Callable, Iterable
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+
+FEED_GENERATION_KEY = 'feed:generation'
+
+
+def post_cache_key(post_id) -> str:
+    """
+    Returns the cache key holding the serialized post.
+
+    Args:
+        post_id: The id of the post.
+
+    Returns:
+        str: The cache key.
+    """
+    return f'post:{post_id}'
+
+
+def get_feed_generation() -> int:
+    """
+    Returns the current feed generation. Every cached feed page is
+    stored under a generation, so bumping it invalidates all pages
+    at once without having to enumerate their keys.
+
+    Returns:
+        int: The current generation number.
+    """
+    # seeding from the clock guarantees a fresh namespace if the
+    # generation key itself was ever evicted
+    return cache.get_or_set(FEED_GENERATION_KEY, time.time_ns, timeout=None)
+
+
+def feed_page_cache_key(request) -> str:
+    """
+    Returns the cache key for the feed page selected by the request,
+    which depends on its full URL (cursor, page size, count flag).
+
+    Args:
+        request: The incoming request for the feed.
+
+    Returns:
+        str: The cache key.
+    """
+    url = request.build_absolute_uri().encode()
+    return f'feed:{get_feed_generation()}:{hashlib.md5(url).hexdigest()}'
+
+
+def invalidate_feed() -> None:
+    """
+    Invalidates every cached feed page by bumping the feed generation
+    once the current transaction commits, so reads during the
+    transaction do not re-cache the old pages.
+
+    Returns:
+        None
+    """
+    def bump():
+        try:
+            cache.incr(FEED_GENERATION_KEY)
+        except ValueError:
+            get_feed_generation()
+
+    transaction.on_commit(bump)
+
+
+def invalidate_posts(post_ids: Iterable) -> None:
+    """
+    Removes the cached serialization of the given posts once the
+    current transaction commits, so reads during the transaction do
+    not re-cache their old counters or content.
+
+    Args:
+        post_ids: The ids of the posts that changed.
+
+    Returns:
+        None
+    """
+    keys = [post_cache_key(post_id) for post_id in post_ids]
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def unread_count_cache_key(user_id) -> str:
+    """
+    Returns the cache key holding a user's unread notification count.
+
+    Args:
+        user_id: The id of the user.
+
+    Returns:
+        str: The cache key.
+    """
+    return f'notifications:unread:{user_id}'
+
+
+def get_unread_count(user_id, compute: Callable[[], int]) -> int:
+    """
+    Returns the cached unread count, computing and caching it on a miss
+    for UNREAD_COUNT_CACHE_TIMEOUT. A count computed just before a
+    commit may be stored after its invalidation; the timeout bounds
+    how long such a stale count is served.
+
+    Args:
+        user_id: The id of the user.
+        compute: Callable returning the count from the database.
+
+    Returns:
+        int: The number of unread notifications.
+    """
+    return cache.get_or_set(
+        unread_count_cache_key(user_id), compute,
+        timeout=settings.UNREAD_COUNT_CACHE_TIMEOUT)
+
+
+def invalidate_unread_count(user_id) -> None:
+    """
+    Drops a user's cached unread count after notifications are
+    created, read or deleted, once the current transaction commits,
+    so reads during the transaction do not re-cache the old count.
+    The count is recomputed from the database on the next read.
+
+    Args:
+        user_id: The id of the user.
+
+    Returns:
+        None
+    """
+    transaction.on_commit(
+        lambda: cache.delete(unread_count_cache_key(user_id)))
+
+
+def auth_user_cache_key(user_id) -> str:
+    """
+    Returns the cache key holding the User loaded for authentication.
+
+    Args:
+        user_id: The id of the user.
+
+    Returns:
+        str: The cache key.
+    """
+    return f'auth:user:{user_id}'
+
+
+def invalidate_auth_user(user_id) -> None:
+    """
+    Drops the cached User of the given id after it changes.
+
+    Args:
+        user_id: The id of the user.
+
+    Returns:
+        None
+    """
+    cache.delete(auth_user_cache_key(user_id))
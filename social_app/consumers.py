@@ -1,13 +1,47 @@
 import json
-from asgiref.sync import async_to_sync
-from channels.generic.websocket import WebsocketConsumer
+from datetime import datetime, timezone as dt_timezone
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs
+from channels.db import database_sync_to_async
+from channels.generic.websocket import AsyncWebsocketConsumer
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from .models import Notification
+from .serialiser import NotificationSerialiser
 
-class NotificationConsumer(WebsocketConsumer):
+
+def user_group_name(user_id) -> str:
+    """
+    Returns the channel-layer group every open socket of a user joins.
+
+    Args:
+        user_id: The id of the user.
+
+    Returns:
+        str: The group name.
+    """
+    return f'user_{user_id}'
+
+
+class NotificationConsumer(AsyncWebsocketConsumer):
     """
-    WebSocket consumer for handling notifications.
+    Asynchronous WebSocket consumer for handling notifications.
+    Each socket joins its user's group, so a user can have any
+    number of tabs or devices connected at once. The user is set
+    by JWTAuthMiddleware from the connection's access token.
+
+    Clients reconnecting after being offline pass the `timestamp` of the
+    newest notification they saw, e.g.
+    `ws/notify/?since=2024-07-12T18:34:56.123456Z`, and the unread
+    notifications created after it are replayed newest first, in the
+    shape of live pushes, in batches of `replay_batch_size` and up to
+    `replay_limit` in total; past the limit the oldest are left to the
+    notifications endpoint. A malformed `since` replays nothing.
 
     connect():
-        Connects the user to the WebSocket and saves the user's channel name.
+        Connects the user to the WebSocket, joins the user's group
+        and replays the unread notifications missed while offline.
 
     disconnect(close_code):
         Disconnects the user from the WebSocket.
@@ -16,28 +50,37 @@ class NotificationConsumer(WebsocketConsumer):
         Sends a notification message over the WebSocket.
     """
 
-    def connect(self):
+    replay_batch_size = 50
+    replay_limit = 500
+
+    async def connect(self):
         """
-        Connects the user to the WebSocket if authenticated, 
-        saves the user's channel name, and accepts the connection.
+        Connects the user to the WebSocket if authenticated,
+        joins the user's group, accepts the connection and
+        replays missed unread notifications.
 
         Returns:
             None
         """
 
-        self.user = self.scope['user']
-        if self.user.is_authenticated:
-            self.user.channel_name = self.channel_name
-            self.user.save()
-            self.accept()
-            print(f"User {self.user.username} connected.")
+        self.user = self.scope.get('user')
+        if self.user is not None and self.user.is_authenticated:
+            self.group_name = user_group_name(self.user.id)
+            await self.channel_layer.group_add(
+                self.group_name, self.channel_name)
+            await self.accept(self.scope.get('auth_subprotocol'))
+            try:
+                since = self.get_since()
+            except ValueError:
+                # a bad timestamp is not taken as a request for everything
+                return
+            await self.replay_unread(since)
         else:
-            self.close()
+            await self.close()
 
-    def disconnect(self, close_code):
+    async def disconnect(self, close_code):
         """
-        Disconnects the user from the WebSocket by 
-        setting the user's channel name to None.
+        Disconnects the user from the WebSocket by leaving the user's group.
 
         Args:
             close_code: The close code for the disconnection.
@@ -46,9 +89,11 @@ class NotificationConsumer(WebsocketConsumer):
             None
         """
 
-        self.user.channel_name = None
+        if hasattr(self, 'group_name'):
+            await self.channel_layer.group_discard(
+                self.group_name, self.channel_name)
 
-    def send_notification(self, event):
+    async def send_notification(self, event):
         """
         Sends a notification message over the WebSocket.
 
@@ -58,4 +103,76 @@ class NotificationConsumer(WebsocketConsumer):
         Returns:
             None
         """
-        self.send(text_data=json.dumps({ 'message': event['message'] }))
\ No newline at end of file
+        await self.send(text_data=json.dumps({ 'message': event['message'] }))
+
+    def get_since(self) -> Optional[datetime]:
+        """
+        Returns the client's last-seen timestamp from the query string,
+        or None if it is missing.
+
+        Raises:
+            ValueError: If the timestamp is malformed.
+        """
+        query = parse_qs(self.scope.get('query_string', b'').decode())
+        if 'since' not in query:
+            return None
+        since = parse_datetime(query['since'][0])
+        if since is None:
+            raise ValueError('Malformed since timestamp.')
+        if timezone.is_naive(since):
+            since = since.replace(tzinfo=dt_timezone.utc)
+        return since
+
+    async def replay_unread(self, since: Optional[datetime]) -> None:
+        """
+        Streams unread notifications created after `since`, newest
+        first, one bounded batch at a time, each sent as a live push
+        would be. The next batch is only fetched once the previous one
+        has been handed to the server, so at most one batch is held in
+        memory per socket.
+
+        Args:
+            since: Only notifications created after this are replayed.
+
+        Returns:
+            None
+        """
+        position = None
+        sent = 0
+        while sent < self.replay_limit:
+            size = min(self.replay_batch_size, self.replay_limit - sent)
+            batch, position = await self.get_unread_batch(
+                since, position, size)
+            if not batch:
+                return
+            await self.send_notification({'message': batch})
+            sent += len(batch)
+            if len(batch) < size:
+                return
+
+    @database_sync_to_async
+    def get_unread_batch(
+        self, since: Optional[datetime], position, size: int
+    ) -> Tuple[List[Dict[str, Any]], Any]:
+        """
+        Returns the next batch of serialized unread notifications, seeking
+        back from `position` on the (created_for, read, created_at) index,
+        together with the position to resume from.
+        """
+        notifications = Notification.objects.filter(
+            created_for_id=self.user.id, read=False).select_related('user')
+        if since is not None:
+            notifications = notifications.filter(created_at__gt=since)
+        if position is not None:
+            created_at, pk = position
+            notifications = notifications.filter(
+                Q(created_at__lt=created_at) |
+                Q(created_at=created_at, id__lt=pk))
+        notifications = list(
+            notifications.order_by('-created_at', '-id')[:size])
+        if not notifications:
+            return [], position
+
+        last = notifications[-1]
+        batch = NotificationSerialiser(notifications, many=True).data
+        return batch, (last.created_at, last.id)
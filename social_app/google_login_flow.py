@@ -3,19 +3,33 @@ from django.core.exceptions import ImproperlyConfigured
 from attrs import define
 from dotenv import load_dotenv
 import os
+import secrets
+from django.db import IntegrityError, transaction
 from rest_framework.views import APIView
 from random import SystemRandom
 from urllib.parse import urlencode
 from django.urls import reverse_lazy
 from oauthlib.common import UNICODE_ASCII_CHARACTER_SET
+import httpx
 import requests
 import jwt
 from typing import Dict, Any
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from .http_client import get_http_session, request_with_retries
+from .jwks import JWKSCache
+from .models import User
 
 
 load_dotenv()
 
+GOOGLE_JWKS_URL = "https://www.googleapis.com/oauth2/v3/certs"
+GOOGLE_ISSUERS = ("https://accounts.google.com", "accounts.google.com")
+
+GOOGLE_USERNAME_ATTEMPTS = 5
+
+# shared by every login in the process, see JWKSCache
+google_jwks = JWKSCache(GOOGLE_JWKS_URL)
+
 @define
 class GoogleRawLoginCredentials:
     """
@@ -47,8 +61,9 @@ class GoogleAccessTokens:
 
     def decode_id_token(self, client_id: str) -> Dict[str, str]:
         """
-        Decode the provided ID token using JWT with the 
-        specified client ID as the audience.
+        Verify and decode the provided ID token: its RS256 signature
+        against Google's cached signing keys, its expiry, issuer and
+        the specified client ID as the audience.
 
         Args:
             client_id (str): The client ID to verify the 
@@ -58,15 +73,21 @@ class GoogleAccessTokens:
             Dict[str, str]: Decoded token information.
 
         Raises:
-            ValueError: If the audience in the token is invalid.
+            ValueError: If the audience in the token is invalid,
+            or the token is otherwise not a valid Google ID token.
         """
         id_token = self.id_token
         try:
+            kid = jwt.get_unverified_header(id_token).get("kid")
+            signing_key = google_jwks.get_signing_key(kid)
             return jwt.decode(
-                jwt=id_token, audience=client_id,
-                options={"verify_signature": False})
+                jwt=id_token, key=signing_key.key, algorithms=["RS256"],
+                audience=client_id, issuer=GOOGLE_ISSUERS,
+                options={"require": ["exp", "iat", "iss", "aud"]})
         except jwt.InvalidAudienceError as e:
             raise ValueError("Invalid audience.") from e
+        except jwt.PyJWTError as e:
+            raise ValueError("Invalid ID token.") from e
 
 def google_raw_login_get_credentials() -> GoogleRawLoginCredentials:
     """
@@ -121,6 +142,13 @@ class GoogleRawLoginFlowService:
     def __init__(self):
         self._credentials = google_raw_login_get_credentials()
 
+    @property
+    def client_id(self) -> str:
+        """
+        The OAuth2 client id, the audience of the ID tokens issued to it.
+        """
+        return self._credentials.client_id
+
     @staticmethod
     def _generate_state_session_token(length=30, chars=UNICODE_ASCII_CHARACTER_SET):
         """
@@ -171,6 +199,37 @@ class GoogleRawLoginFlowService:
         authorization_url = f"{self.GOOGLE_AUTH_URL}?{query_params}"
         return authorization_url, state
     
+    def _token_request_data(self, code: str) -> Dict[str, str]:
+        """
+        Build the form data exchanging an authorization code for tokens.
+        """
+        return {
+            "code": code,
+            "client_id": self._credentials.client_id,
+            "client_secret": self._credentials.client_secret,
+            "redirect_uri": self._get_redirect_uri(),
+            "grant_type": "authorization_code",
+        }
+
+    @staticmethod
+    def _parse_tokens(response) -> GoogleAccessTokens:
+        """
+        Reads the tokens of a successful token response, requests' or
+        httpx's.
+
+        Raises:
+            ValueError: If the body is not JSON or lacks a token.
+        """
+        try:
+            tokens = response.json()
+            return GoogleAccessTokens(
+                id_token=tokens["id_token"],
+                access_token=tokens["access_token"]
+            )
+        except (ValueError, KeyError, TypeError) as e:
+            raise ValueError(
+                "Failed to obtain access token from Google.") from e
+
     def get_tokens(self, *, code: str):
         """
         Obtain Google access tokens using the provided authorization code.
@@ -185,25 +244,46 @@ class GoogleRawLoginFlowService:
             ValueError: If access token retrieval from Google fails.
         """
 
-        redirect_uri = self._get_redirect_uri()
-
-        data = {
-            "code": code,
-            "client_id": self._credentials.client_id,
-            "client_secret": self._credentials.client_secret,
-            "redirect_uri": redirect_uri,
-            "grant_type": "authorization_code",
-        }
+        data = self._token_request_data(code)
 
-        response = requests.post(self.GOOGLE_ACCESS_TOKEN_OBTAIN_URL, data=data)
+        try:
+            response = get_http_session().post(
+                self.GOOGLE_ACCESS_TOKEN_OBTAIN_URL, data=data)
+        except requests.RequestException as e:
+            raise ValueError("Failed to obtain access token from Google.") from e
 
         if not response.ok:
             raise ValueError("Failed to obtain access token from Google.")
 
-        tokens = response.json()
-        return GoogleAccessTokens(
-            id_token=tokens["id_token"], access_token=tokens["access_token"]
-        )
+        return self._parse_tokens(response)
+
+    async def aget_tokens(self, *, code: str) -> GoogleAccessTokens:
+        """
+        Async version of `get_tokens`, awaiting Google without
+        holding a worker thread.
+
+        Args:
+            code (str): The authorization code received from Google.
+
+        Returns:
+            GoogleAccessTokens: Object containing the obtained Google access tokens.
+
+        Raises:
+            ValueError: If access token retrieval from Google fails.
+        """
+
+        data = self._token_request_data(code)
+
+        try:
+            response = await request_with_retries(
+                "POST", self.GOOGLE_ACCESS_TOKEN_OBTAIN_URL, data=data)
+        except httpx.HTTPError as e:
+            raise ValueError("Failed to obtain access token from Google.") from e
+
+        if not response.is_success:
+            raise ValueError("Failed to obtain access token from Google.")
+
+        return self._parse_tokens(response)
     
     def get_user_info(self, *, google_tokens: GoogleAccessTokens) -> Dict[str, Any]:
         """
@@ -223,18 +303,96 @@ class GoogleRawLoginFlowService:
 
         access_token = google_tokens.access_token
         # Reference: https://developers.google.com/identity/protocols/oauth2/web-server#callinganapi
-        response = requests.get(self.GOOGLE_USER_INFO_URL, params={"access_token": access_token})
+        try:
+            response = get_http_session().get(
+                self.GOOGLE_USER_INFO_URL, params={"access_token": access_token})
+        except requests.RequestException as e:
+            raise ValueError("Failed to obtain user info from Google.") from e
 
         if not response.ok:
             raise ValueError("Failed to obtain user info from Google.")
 
         return response.json()
 
+    async def aget_user_info(
+        self, *, google_tokens: GoogleAccessTokens
+    ) -> Dict[str, Any]:
+        """
+        Async version of `get_user_info`.
+
+        Args:
+            google_tokens (GoogleAccessTokens): Object 
+            containing Google access tokens.
+
+        Returns:
+            Dict[str, Any]: User information retrieved from Google.
+        
+        Raises:
+            ValueError: If user info retrieval from Google fails.
+        """
+
+        access_token = google_tokens.access_token
+        try:
+            response = await request_with_retries(
+                "GET", self.GOOGLE_USER_INFO_URL,
+                params={"access_token": access_token})
+        except httpx.HTTPError as e:
+            raise ValueError("Failed to obtain user info from Google.") from e
+
+        if not response.is_success:
+            raise ValueError("Failed to obtain user info from Google.")
+
+        return response.json()
+
 def generate_tokens_for_user(user):
     """
-    Generate access and refresh tokens for the given user
+    Generate access and refresh tokens for the given user.
+    The username is added as a claim for stateless authentication.
     """
     serializer = TokenObtainPairSerializer()
     token_data = serializer.get_token(user)
+    token_data['username'] = user.username
     refresh_token = token_data
-    return refresh_token.access_token, refresh_token
\ No newline at end of file
+    return refresh_token.access_token, refresh_token
+
+
+def get_or_create_google_user(id_token: Dict[str, Any]) -> User:
+    """
+    Returns the user with the email of a verified Google ID token,
+    creating it on the first login. The new username is the email's
+    local part, with a random suffix when another user already has it
+    (e.g. john@gmail.com and john@yahoo.com).
+
+    Args:
+        id_token: The decoded claims of the ID token.
+
+    Returns:
+        User: The existing or created user.
+
+    Raises:
+        ValueError: If no free username was found.
+    """
+    email = id_token['email']
+    user = User.objects.filter(email=email).first()
+    if user is not None:
+        return user
+
+    max_length = User._meta.get_field('username').max_length
+    base = email.split('@')[0][:max_length - 7]
+    username = base
+    for _ in range(GOOGLE_USERNAME_ATTEMPTS):
+        try:
+            with transaction.atomic():
+                return User.objects.create(
+                    email=email,
+                    username=username,
+                    first_name=id_token.get('given_name', ''),
+                    last_name=id_token.get('family_name', ''),
+                    registration_method='google')
+        except IntegrityError:
+            # a concurrent first login may have created this email
+            user = User.objects.filter(email=email).first()
+            if user is not None:
+                return user
+            username = f'{base}_{secrets.randbelow(10**6):06d}'
+    raise ValueError("Could not find a free username.")
@@ -0,0 +1,144 @@
+'''
+This module defines the pooled HTTP session used to call external services
+'''
+import asyncio
+import weakref
+from functools import lru_cache
+import httpx
+from django.conf import settings
+from requests import Session
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+# only idempotent requests are retried once the request was sent;
+# connection failures are retried for every method
+RETRY_METHODS = frozenset({'GET', 'HEAD', 'OPTIONS'})
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class TimeoutHTTPAdapter(HTTPAdapter):
+    """
+    HTTPAdapter applying a default (connect, read) timeout to every
+    request that does not pass its own, so no call can hang forever.
+    """
+
+    def __init__(self, *args, timeout=None, **kwargs):
+        self.timeout = timeout
+        super().__init__(*args, **kwargs)
+
+    def send(self, request, **kwargs):
+        if kwargs.get('timeout') is None:
+            kwargs['timeout'] = self.timeout
+        return super().send(request, **kwargs)
+
+
+def build_session() -> Session:
+    """
+    Builds a requests Session with a bounded keep-alive connection pool,
+    the HTTP_CLIENT_TIMEOUT timeouts and HTTP_CLIENT_RETRIES retries
+    with exponential backoff on connection errors and transient
+    (429/5xx) responses.
+
+    Returns:
+        Session: The configured session.
+    """
+    retries = settings.HTTP_CLIENT_RETRIES
+    retry = Retry(
+        total=retries,
+        connect=retries,
+        read=retries,
+        status=retries,
+        backoff_factor=settings.HTTP_CLIENT_BACKOFF_FACTOR,
+        status_forcelist=RETRY_STATUSES,
+        method_whitelist=RETRY_METHODS,
+        raise_on_status=False,
+    )
+    adapter = TimeoutHTTPAdapter(
+        timeout=settings.HTTP_CLIENT_TIMEOUT,
+        max_retries=retry,
+        pool_connections=settings.HTTP_CLIENT_POOL_SIZE,
+        pool_maxsize=settings.HTTP_CLIENT_POOL_SIZE,
+    )
+    session = Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+@lru_cache(maxsize=None)
+def get_http_session() -> Session:
+    """
+    Returns the process-wide session, created on first use so
+    connections are never shared across forked workers.
+
+    Returns:
+        Session: The shared session.
+    """
+    return build_session()
+
+
+# one AsyncClient per event loop, as its connections belong to the loop
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def build_async_client() -> httpx.AsyncClient:
+    """
+    Builds an httpx AsyncClient with the same pool size and timeouts
+    as `build_session`. Its transport retries failed connections;
+    `request_with_retries` adds the retries on transient responses.
+
+    Returns:
+        httpx.AsyncClient: The configured client.
+    """
+    connect, read = settings.HTTP_CLIENT_TIMEOUT
+    pool_size = settings.HTTP_CLIENT_POOL_SIZE
+    transport = httpx.AsyncHTTPTransport(
+        retries=settings.HTTP_CLIENT_RETRIES,
+        limits=httpx.Limits(
+            max_connections=pool_size, max_keepalive_connections=pool_size))
+    return httpx.AsyncClient(
+        transport=transport,
+        timeout=httpx.Timeout(read, connect=connect))
+
+
+def get_async_http_client() -> httpx.AsyncClient:
+    """
+    Returns the shared AsyncClient of the running event loop.
+
+    Returns:
+        httpx.AsyncClient: The client.
+    """
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = _async_clients[loop] = build_async_client()
+    return client
+
+
+async def request_with_retries(
+    method: str, url: str, **kwargs
+) -> httpx.Response:
+    """
+    Sends a request with the shared AsyncClient, retrying idempotent
+    methods on 429/5xx responses with exponential backoff.
+
+    Args:
+        method: The HTTP method.
+        url: The URL to request.
+        **kwargs: Passed on to httpx.AsyncClient.request.
+
+    Returns:
+        httpx.Response: The last response received.
+
+    Raises:
+        httpx.HTTPError: If the request could not be sent.
+    """
+    client = get_async_http_client()
+    retries = settings.HTTP_CLIENT_RETRIES if method in RETRY_METHODS else 0
+    for attempt in range(retries + 1):
+        response = await client.request(method, url, **kwargs)
+        if response.status_code not in RETRY_STATUSES or attempt == retries:
+            return response
+        await response.aclose()
+        await asyncio.sleep(settings.HTTP_CLIENT_BACKOFF_FACTOR * 2 ** attempt)
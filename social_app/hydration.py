@@ -0,0 +1,89 @@
+'''
+This module defines the batched, cached loading of posts by id
+'''
+from typing import Dict, Iterable, List
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+from .cache import post_cache_key
+from .models import Comment, Post
+
+
+# the columns the serializers read: cached rows hold nothing else,
+# in particular no author's password hash or email
+AUTHOR_FIELDS = ('user__id', 'user__username')
+POST_FIELDS = (
+    'id', 'created_at', 'content', 'pics', 'pics_thumbnails',
+    'likes_count', 'comments_count', *AUTHOR_FIELDS)
+COMMENT_FIELDS = ('id', 'created_at', 'content', 'post_id', *AUTHOR_FIELDS)
+
+def latest_comments(
+    posts: Iterable[Post], size: int
+) -> Dict[str, List[Comment]]:
+    """
+    Returns the `size` newest comments of each post, oldest first,
+    with their authors. Every post is ranked in a single query over
+    the (post, created_at, id) index; posts without comments are
+    not queried.
+
+    Args:
+        posts: The posts to read the comments of.
+        size: The number of comments per post.
+
+    Returns:
+        Dict[str, List[Comment]]: The comments keyed by post id.
+    """
+    post_ids = [post.pk for post in posts if post.comments_count]
+    previews = {}
+    if not post_ids or size <= 0:
+        return previews
+
+    ranked = Comment.objects.filter(post_id__in=post_ids).annotate(
+        rank=Window(
+            RowNumber(), partition_by=F('post_id'),
+            order_by=[F('created_at').desc(), F('id').desc()]),
+    ).filter(rank__lte=size).select_related('user').only(
+        *COMMENT_FIELDS).order_by('post_id', 'created_at', 'id')
+    for comment in ranked:
+        previews.setdefault(str(comment.post_id), []).append(comment)
+    return previews
+
+
+def hydrate_posts(post_ids: Iterable) -> List[Post]:
+    """
+    Returns the posts with the given ids, with their authors, in the
+    order of the ids.
+
+    The posts are read with one cache multi-get; the misses are loaded
+    with a single `id__in` query, given their COMMENT_PREVIEW_SIZE
+    latest comments as `comment_preview` and written back with one
+    multi-set. Ids of posts that no longer exist are skipped.
+
+    Args:
+        post_ids: The ids of the posts, as UUIDs or strings.
+
+    Returns:
+        List[Post]: The posts found, in input order.
+    """
+    keys = {str(post_id): post_cache_key(post_id) for post_id in post_ids}
+    cached = cache.get_many(keys.values())
+    posts = {
+        post_id: cached[key] for post_id, key in keys.items() if key in cached}
+
+    missing = [post_id for post_id in keys if post_id not in posts]
+    if missing:
+        loaded = {
+            str(post.pk): post for post in
+            Post.objects.select_related('user').only(
+                *POST_FIELDS).filter(id__in=missing)}
+        previews = latest_comments(
+            loaded.values(), settings.COMMENT_PREVIEW_SIZE)
+        for post_id, post in loaded.items():
+            post.comment_preview = previews.get(post_id, [])
+        cache.set_many(
+            {keys[post_id]: post for post_id, post in loaded.items()},
+            settings.POST_CACHE_TIMEOUT)
+        posts.update(loaded)
+
+    return [posts[post_id] for post_id in keys if post_id in posts]
@@ -0,0 +1,130 @@
+'''
+This module defines the thumbnail pipeline for post and profile pictures
+'''
+import os
+from io import BytesIO
+from typing import Dict, Set
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import Storage
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+
+# (file extension, Pillow format) of every derivative written
+THUMBNAIL_FORMATS = (('webp', 'WEBP'), ('jpeg', 'JPEG'))
+
+
+def thumbnail_name(name: str, width: int, extension: str) -> str:
+    """
+    Returns the storage name of a derivative, stored next to the original.
+
+    Args:
+        name: The storage name of the original image.
+        width: The width of the derivative in pixels.
+        extension: The file extension of the derivative.
+
+    Returns:
+        str: e.g. 'images/sample_w320.webp' for 'images/sample.jpg'.
+    """
+    root, _ = os.path.splitext(name)
+    return f'{root}_w{width}.{extension}'
+
+
+def generate_thumbnails(storage: Storage, name: str) -> Dict[str, object]:
+    """
+    Writes WebP and JPEG derivatives of the image at every configured
+    width narrower than the original.
+
+    Args:
+        storage: The storage holding the original image.
+        name: The storage name of the original image.
+
+    Returns:
+        Dict: {'source': name, 'sizes': {'320': {'webp': ..., 'jpeg': ...}}}
+        with the storage names of the derivatives. 'sizes' is empty if
+        the file is not a readable image.
+    """
+    thumbnails = {'source': name, 'sizes': {}}
+    try:
+        with storage.open(name) as original:
+            image = ImageOps.exif_transpose(Image.open(original))
+            image.load()
+    except (OSError, UnidentifiedImageError, Image.DecompressionBombError):
+        return thumbnails
+
+    for width in sorted(settings.IMAGE_THUMBNAIL_WIDTHS):
+        if width >= image.width:
+            break
+        height = max(1, round(image.height * width / image.width))
+        resized = image.resize((width, height), Image.LANCZOS)
+
+        sizes = {}
+        for extension, image_format in THUMBNAIL_FORMATS:
+            if image_format == 'JPEG' and resized.mode != 'RGB':
+                encoded_image = resized.convert('RGB')
+            else:
+                encoded_image = resized
+            buffer = BytesIO()
+            encoded_image.save(buffer, image_format, quality=80)
+            sizes[extension] = storage.save(
+                thumbnail_name(name, width, extension),
+                ContentFile(buffer.getvalue()))
+        thumbnails['sizes'][str(width)] = sizes
+
+    return thumbnails
+
+
+def needs_thumbnails(image_field, thumbnails: Dict[str, object]) -> bool:
+    """
+    Returns True if the image was set or replaced since its
+    thumbnails were last generated.
+    """
+    return bool(image_field) and thumbnails.get('source') != image_field.name
+
+
+def referenced_names(name: str, thumbnails: Dict[str, object]) -> Set[str]:
+    """
+    Returns the storage names an image field holds on to: the image
+    itself and the thumbnails generated from it.
+
+    Args:
+        name: The storage name of the image, empty if unset.
+        thumbnails: The thumbnails recorded by `generate_thumbnails`.
+
+    Returns:
+        Set[str]: The referenced storage names. Thumbnails of a
+        replaced image are not included.
+    """
+    if not name:
+        return set()
+    names = {name}
+    thumbnails = thumbnails or {}
+    if thumbnails.get('source') == name:
+        for sizes in thumbnails.get('sizes', {}).values():
+            names.update(sizes.values())
+    return names
+
+
+def thumbnail_urls(
+    storage: Storage, thumbnails: Dict[str, object], request=None
+) -> Dict[str, Dict[str, str]]:
+    """
+    Maps stored thumbnail names to URLs for API responses.
+
+    Args:
+        storage: The storage holding the thumbnails.
+        thumbnails: The thumbnails recorded by `generate_thumbnails`.
+        request: If given, URLs are made absolute like ImageField's.
+
+    Returns:
+        Dict: {'320': {'webp': url, 'jpeg': url}, ...}
+    """
+    urls = {}
+    for width, sizes in (thumbnails or {}).get('sizes', {}).items():
+        urls[width] = {}
+        for extension, name in sizes.items():
+            url = storage.url(name)
+            urls[width][extension] = (
+                request.build_absolute_uri(url) if request else url)
+    return urls
+
@@ -0,0 +1,136 @@
+'''
+This module defines the cached JSON Web Key Set used to verify Google ID tokens
+'''
+import logging
+import re
+import threading
+import time
+from typing import Dict, Optional
+import jwt
+import requests
+from django.conf import settings
+from .http_client import get_http_session
+
+
+logger = logging.getLogger(__name__)
+
+MAX_AGE_RE = re.compile(r'(?:^|,)\s*max-age\s*=\s*(\d+)', re.IGNORECASE)
+
+
+class JWKSCache:
+    """
+    In-process cache of the signing keys published at a JWKS URL.
+
+    Keys are kept for the max-age of the response's Cache-Control
+    header (JWKS_DEFAULT_MAX_AGE if absent). Once expired, the cached
+    keys keep being served while a background thread refreshes them,
+    so verifying a token never waits on the network unless its key
+    id is unknown (e.g. just after a key rotation). If a fetch fails
+    the last key set stays in use and is not refetched for
+    JWKS_MIN_REFRESH_INTERVAL, so an unreachable endpoint is not hit
+    by every login.
+
+    Attributes:
+        url: The JWKS endpoint.
+    """
+
+    def __init__(self, url: str):
+        self.url = url
+        self.keys: Dict[str, jwt.PyJWK] = {}
+        self.expires_at = 0.0
+        self.fetched_at: Optional[float] = None
+        self.lock = threading.Lock()
+        # held by the background refresh thread while it runs
+        self.refreshing = threading.Lock()
+
+    def get_signing_key(self, kid: str) -> jwt.PyJWK:
+        """
+        Returns the key with the given key id.
+
+        Args:
+            kid: The 'kid' header of the token to verify.
+
+        Returns:
+            jwt.PyJWK: The signing key.
+
+        Raises:
+            ValueError: If no key with this id can be found.
+        """
+        now = time.monotonic()
+        key = self.keys.get(kid)
+        if key is not None:
+            if now >= self.expires_at:
+                self.refresh_in_background()
+            return key
+
+        # an unknown kid forces a fetch, at most once per min interval so
+        # tokens with made-up key ids cannot hammer the endpoint
+        if (self.fetched_at is None or
+                now - self.fetched_at >= settings.JWKS_MIN_REFRESH_INTERVAL):
+            self.refresh()
+        key = self.keys.get(kid)
+        if key is None:
+            raise ValueError(f"Unknown signing key {kid!r}.")
+        return key
+
+    def refresh(self) -> None:
+        """
+        Fetches the key set, keeping the cached keys for at least
+        another JWKS_MIN_REFRESH_INTERVAL if the fetch fails. The lock
+        is only held to swap the keys in, never across the fetch.
+
+        Returns:
+            None
+        """
+        with self.lock:
+            self.fetched_at = fetched_at = time.monotonic()
+        try:
+            response = get_http_session().get(self.url)
+            response.raise_for_status()
+            keys = {}
+            for data in response.json()['keys']:
+                try:
+                    keys[data['kid']] = jwt.PyJWK(data)
+                except jwt.PyJWKError:
+                    # skip key types PyJWT cannot use
+                    continue
+        except (requests.RequestException,
+                ValueError, KeyError, TypeError) as error:
+            logger.warning('Fetching %s failed: %s', self.url, error)
+            with self.lock:
+                self.expires_at = max(
+                    self.expires_at,
+                    fetched_at + settings.JWKS_MIN_REFRESH_INTERVAL)
+            return
+
+        expires_at = fetched_at + self.max_age(
+            response.headers.get('Cache-Control', ''))
+        with self.lock:
+            self.keys = keys
+            self.expires_at = expires_at
+
+    def refresh_in_background(self) -> None:
+        """
+        Starts a refresh thread unless one is already running. Never
+        blocks, so lookups of cached keys do not wait on the network.
+        """
+        if not self.refreshing.acquire(blocking=False):
+            return
+
+        def run():
+            try:
+                self.refresh()
+            finally:
+                self.refreshing.release()
+
+        threading.Thread(target=run, daemon=True).start()
+
+    @staticmethod
+    def max_age(cache_control: str) -> int:
+        """
+        Returns the max-age of a Cache-Control header in seconds.
+        """
+        match = MAX_AGE_RE.search(cache_control)
+        if match:
+            return int(match.group(1))
+        return settings.JWKS_DEFAULT_MAX_AGE
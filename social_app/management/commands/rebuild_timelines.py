@@ -0,0 +1,32 @@
+'''
+This module defines a command that rebuilds the materialized home timelines
+'''
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from social_app.models import User
+from social_app.timeline import drop_timeline, rebuild_timeline
+
+
+class Command(BaseCommand):
+    help = (
+        'Rebuilds the home timelines materialized in Redis from the '
+        'database, for the given users or for every active user.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'user_ids', nargs='*', type=int,
+            help='Ids of the users whose timelines are rebuilt.')
+
+    def handle(self, *args, **options):
+        if not settings.TIMELINE_FANOUT:
+            raise CommandError('TIMELINE_FANOUT is off; there is nothing to rebuild.')
+
+        user_ids = options['user_ids'] or list(User.objects.filter(
+            is_active=True).order_by('pk').values_list('pk', flat=True))
+
+        for user_id in user_ids:
+            drop_timeline(user_id)
+            rebuild_timeline(user_id)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt {len(user_ids)} timeline(s).'))
@@ -0,0 +1,64 @@
+'''
+This module defines a command that repairs drift in the post counters
+'''
+from django.core.management.base import BaseCommand
+from django.db.models import Count, F, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+from social_app.cache import invalidate_posts
+from social_app.models import Post, Like, Comment
+
+
+def actual_count(model) -> Coalesce:
+    """
+    Builds a correlated subquery counting the rows of `model`
+    that belong to the outer post.
+
+    Args:
+        model: The Like or Comment model.
+
+    Returns:
+        Coalesce: An expression evaluating to the row count, 0 if none.
+    """
+    counts = model.objects.filter(post=OuterRef('pk')).order_by().values(
+        'post').annotate(total=Count('pk')).values('total')
+    return Coalesce(Subquery(counts), 0)
+
+
+class Command(BaseCommand):
+    help = (
+        'Recomputes likes_count and comments_count for posts whose '
+        'denormalized counters no longer match the Like and Comment rows.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Only report drifted posts without fixing them.')
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help='Number of posts updated per UPDATE statement.')
+
+    def handle(self, *args, **options):
+        drifted = Post.objects.annotate(
+            actual_likes=actual_count(Like),
+            actual_comments=actual_count(Comment),
+        ).filter(
+            ~Q(likes_count=F('actual_likes')) |
+            ~Q(comments_count=F('actual_comments'))
+        ).values_list('pk', flat=True)
+
+        post_ids = list(drifted)
+        if options['dry_run']:
+            self.stdout.write(f'{len(post_ids)} post(s) have drifted.')
+            return
+
+        batch_size = options['batch_size']
+        for start in range(0, len(post_ids), batch_size):
+            batch = post_ids[start:start + batch_size]
+            Post.objects.filter(pk__in=batch).update(
+                likes_count=actual_count(Like),
+                comments_count=actual_count(Comment))
+            # cached posts would keep serving the drifted counters
+            invalidate_posts(batch)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Reconciled counters on {len(post_ids)} post(s).'))
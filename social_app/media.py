@@ -0,0 +1,224 @@
+'''
+This module defines the view serving uploaded media under MEDIA_URL
+'''
+import mimetypes
+import os
+import re
+import stat
+from typing import Iterator, Optional, Tuple
+from urllib.parse import quote
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import (
+    FileResponse, Http404, HttpRequest, HttpResponse, StreamingHttpResponse)
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_etags, parse_http_date_safe
+from django.views.decorators.http import require_safe
+
+
+# names written by ContentAddressedStorage, whose content never changes
+BLOB_NAME_RE = re.compile(r'^(?:[\w-]+/)?([0-9a-f]{2})/(\1[0-9a-f]{62})\.\w+$')
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+def media_etag(name: str, stat_result: os.stat_result) -> str:
+    """
+    Returns the strong ETag of a media file: its digest for
+    content-addressed blobs, its mtime and size otherwise.
+
+    Args:
+        name: The storage name of the file.
+        stat_result: The result of os.stat on the file.
+
+    Returns:
+        str: The quoted ETag.
+    """
+    match = BLOB_NAME_RE.match(name)
+    if match:
+        return f'"{match.group(2)}"'
+    return f'"{stat_result.st_mtime_ns:x}-{stat_result.st_size:x}"'
+
+
+def cache_control(name: str) -> str:
+    """
+    Returns the Cache-Control value of a media file. Blobs are
+    named by their content and can be cached forever.
+    """
+    if BLOB_NAME_RE.match(name):
+        return f'public, max-age={IMMUTABLE_MAX_AGE}, immutable'
+    return f'public, max-age={settings.MEDIA_CACHE_MAX_AGE}'
+
+
+def requested_range(
+    request: HttpRequest, size: int, etag: str, last_modified: int
+) -> Optional[Tuple[int, int]]:
+    """
+    Parses a single-range `Range` header, honouring `If-Range`.
+
+    Args:
+        request: The incoming request.
+        size: The size of the file in bytes.
+        etag: The current ETag of the file.
+        last_modified: The file's modification time as a timestamp.
+
+    Returns:
+        Optional[Tuple[int, int]]: The inclusive (first, last) byte
+        positions, (size, size) if the range cannot be satisfied,
+        or None if the whole file should be sent.
+    """
+    match = RANGE_RE.match(request.META.get('HTTP_RANGE', '').strip())
+    if not match or not (match.group(1) or match.group(2)):
+        return None
+
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if if_range:
+        if if_range.startswith(('"', 'W/')):
+            if etag not in parse_etags(if_range):
+                return None
+        elif parse_http_date_safe(if_range) != last_modified:
+            return None
+
+    first, last = match.groups()
+    if not first:
+        # a suffix range: the last N bytes
+        length = int(last)
+        if length == 0:
+            return size, size
+        return max(size - length, 0), size - 1
+    first = int(first)
+    last = min(int(last), size - 1) if last else size - 1
+    if first >= size or first > last:
+        return size, size
+    return first, last
+
+
+def read_range(path: str, first: int, last: int) -> Iterator[bytes]:
+    """
+    Yields the bytes first..last (inclusive) of a file in chunks.
+    """
+    with open(path, 'rb') as media_file:
+        media_file.seek(first)
+        remaining = last - first + 1
+        while remaining > 0:
+            chunk = media_file.read(min(STREAM_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def sendfile_response(name: str, path: str) -> HttpResponse:
+    """
+    Builds an empty response telling the front-end web server to
+    send the file itself, with MEDIA_SENDFILE_BACKEND set to 'nginx'
+    (X-Accel-Redirect to MEDIA_SENDFILE_URL) or 'xsendfile'.
+
+    Args:
+        name: The storage name of the file.
+        path: The absolute path of the file.
+
+    Returns:
+        HttpResponse: The response carrying the handoff header.
+    """
+    backend = settings.MEDIA_SENDFILE_BACKEND
+    response = HttpResponse()
+    if backend == 'nginx':
+        response['X-Accel-Redirect'] = (
+            settings.MEDIA_SENDFILE_URL + quote(name))
+    elif backend == 'xsendfile':
+        response['X-Sendfile'] = path
+    else:
+        raise ValueError(f'Unknown MEDIA_SENDFILE_BACKEND {backend!r}')
+    return response
+
+
+@require_safe
+def serve_media(request: HttpRequest, path: str) -> HttpResponse:
+    """
+    Serves a file from MEDIA_ROOT with validators and caching headers.
+
+    Conditional requests are answered with 304 before the file is
+    opened. The body is then either handed off to the web server
+    (see `sendfile_response`) or streamed from Python, in which case
+    single byte ranges are supported.
+
+    Args:
+        request: The incoming GET or HEAD request.
+        path: The storage name of the file, relative to MEDIA_ROOT.
+
+    Returns:
+        HttpResponse: The file, a part of it, or a 304/412/416 response.
+
+    Raises:
+        Http404: If the path escapes MEDIA_ROOT or is not a file.
+    """
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+        stat_result = os.stat(full_path)
+    except (SuspiciousFileOperation, OSError, ValueError):
+        raise Http404('Media file not found.')
+    if not stat.S_ISREG(stat_result.st_mode):
+        raise Http404('Media file not found.')
+
+    etag = media_etag(path, stat_result)
+    last_modified = int(stat_result.st_mtime)
+    headers = {
+        'ETag': etag,
+        'Last-Modified': http_date(last_modified),
+        'Cache-Control': cache_control(path),
+    }
+
+    response = get_conditional_response(
+        request, etag=etag, last_modified=last_modified)
+    if response is None:
+        response = build_media_response(
+            request, path, full_path, stat_result.st_size,
+            etag, last_modified)
+    for header, value in headers.items():
+        response.setdefault(header, value)
+    return response
+
+
+def build_media_response(
+    request: HttpRequest,
+    name: str,
+    full_path: str,
+    size: int,
+    etag: str,
+    last_modified: int
+) -> HttpResponse:
+    """
+    Builds the body of a media response: a sendfile handoff,
+    a 206/416 for a byte range, or the whole file.
+    """
+    content_type, encoding = mimetypes.guess_type(full_path)
+    content_type = content_type or 'application/octet-stream'
+
+    if settings.MEDIA_SENDFILE_BACKEND:
+        response = sendfile_response(name, full_path)
+        response['Content-Type'] = content_type
+        return response
+
+    byte_range = requested_range(request, size, etag, last_modified)
+    if byte_range is None:
+        response = FileResponse(
+            open(full_path, 'rb'), content_type=content_type)
+    elif byte_range == (size, size):
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+    else:
+        first, last = byte_range
+        response = StreamingHttpResponse(
+            read_range(full_path, first, last),
+            status=206, content_type=content_type)
+        response['Content-Length'] = str(last - first + 1)
+        response['Content-Range'] = f'bytes {first}-{last}/{size}'
+
+    if encoding:
+        response['Content-Encoding'] = encoding
+    response['Accept-Ranges'] = 'bytes'
+    return response
@@ -0,0 +1,89 @@
+'''
+This module defines the JWT authentication middleware for WebSocket connections
+'''
+import time
+from functools import lru_cache
+from typing import Optional, Tuple
+from urllib.parse import parse_qs
+from channels.middleware import BaseMiddleware
+from django.contrib.auth.models import AnonymousUser
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+
+# clients unable to use the query string offer ['bearer', '<token>']
+# as WebSocket subprotocols, and the socket is accepted as 'bearer'
+BEARER_SUBPROTOCOL = 'bearer'
+
+
+@lru_cache(maxsize=1024)
+def validate_token(raw_token: str) -> Optional[AccessToken]:
+    """
+    Verifies the signature and claims of an access token. Results are
+    memoized, so reconnecting sockets skip the signature check.
+
+    Args:
+        raw_token: The encoded JWT.
+
+    Returns:
+        Optional[AccessToken]: The token, or None if it is invalid.
+    """
+    try:
+        return AccessToken(raw_token)
+    except TokenError:
+        return None
+
+
+def token_from_scope(scope) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Extracts the access token of a WebSocket handshake.
+
+    Args:
+        scope: The ASGI connection scope.
+
+    Returns:
+        Tuple: The raw token (or None) and the subprotocol the socket
+        must be accepted with if the token came as a subprotocol.
+    """
+    subprotocols = scope.get('subprotocols') or []
+    if BEARER_SUBPROTOCOL in subprotocols:
+        position = subprotocols.index(BEARER_SUBPROTOCOL)
+        if position + 1 < len(subprotocols):
+            return subprotocols[position + 1], BEARER_SUBPROTOCOL
+
+    query = parse_qs(scope.get('query_string', b'').decode())
+    tokens = query.get('token')
+    return (tokens[0] if tokens else None), None
+
+
+def user_from_token(raw_token: Optional[str]):
+    """
+    Returns the TokenUser of a valid, unexpired access token,
+    or an AnonymousUser. No database query is made.
+    """
+    token = validate_token(raw_token) if raw_token else None
+    # the memoized token may have expired since it was validated
+    if token is None or token.get('exp', 0) <= time.time():
+        return AnonymousUser()
+    if api_settings.USER_ID_CLAIM not in token:
+        return AnonymousUser()
+    return api_settings.TOKEN_USER_CLASS(token)
+
+
+class JWTAuthMiddleware(BaseMiddleware):
+    """
+    Channels middleware populating scope['user'] from the access token
+    passed as `?token=` or as the subprotocol pair ['bearer', token].
+
+    The token is validated once per connection from its claims only,
+    so the event loop is never blocked on a database call.
+    """
+
+    async def __call__(self, scope, receive, send):
+        scope = dict(scope)
+        raw_token, subprotocol = token_from_scope(scope)
+        scope['user'] = user_from_token(raw_token)
+        if subprotocol:
+            scope['auth_subprotocol'] = subprotocol
+        return await super().__call__(scope, receive, send)
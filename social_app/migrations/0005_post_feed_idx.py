@@ -0,0 +1,17 @@
+# Generated by Django 4.2.10 on 2026-10-17 02:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('social_app', '0004_notification_read'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['created_at', 'id'], name='post_feed_idx'),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 4.2.10 on 2026-10-17 03:02
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def remove_duplicate_likes(apps, schema_editor):
+    """
+    Keeps the earliest like of every duplicated (post, user) pair and
+    resyncs likes_count on the posts that had duplicates.
+    """
+    Like = apps.get_model('social_app', 'Like')
+    Post = apps.get_model('social_app', 'Post')
+
+    duplicates = Like.objects.order_by().values('post', 'user').annotate(
+        total=Count('pk')).filter(total__gt=1)
+
+    for pair in duplicates:
+        likes = Like.objects.filter(
+            post=pair['post'], user=pair['user']).order_by('created_at', 'pk')
+        keep = likes.values_list('pk', flat=True).first()
+        likes.exclude(pk=keep).delete()
+        Post.objects.filter(pk=pair['post']).update(
+            likes_count=Like.objects.filter(post=pair['post']).count())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('social_app', '0006_post_counters'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_likes, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='like',
+            constraint=models.UniqueConstraint(fields=('post', 'user'), name='unique_like_per_user'),
+        ),
+    ]
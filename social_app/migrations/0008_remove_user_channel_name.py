@@ -0,0 +1,17 @@
+# Generated by Django 4.2.10 on 2026-10-17 02:46
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('social_app', '0007_unique_like_per_user'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='user',
+            name='channel_name',
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 4.2.10 on 2026-10-17 04:10
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('social_app', '0008_remove_user_channel_name'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='recipient',
+            field=models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+    ]
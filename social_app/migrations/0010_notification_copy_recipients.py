@@ -0,0 +1,45 @@
+# Generated by Django 4.2.10 on 2026-10-17 04:10
+
+from django.db import migrations
+
+
+def copy_recipients(apps, schema_editor):
+    """
+    Moves the stringified user ids into the new foreign key and drops
+    notifications whose recipient no longer exists.
+    """
+    Notification = apps.get_model('social_app', 'Notification')
+    User = apps.get_model('social_app', 'User')
+
+    user_ids = set(User.objects.values_list('pk', flat=True))
+    values = Notification.objects.values_list(
+        'created_for', flat=True).distinct()
+    for value in values:
+        notifications = Notification.objects.filter(created_for=value)
+        try:
+            user_id = int(value)
+        except (TypeError, ValueError):
+            user_id = None
+        if user_id in user_ids:
+            notifications.update(recipient_id=user_id)
+        else:
+            notifications.delete()
+
+
+def copy_recipients_back(apps, schema_editor):
+    Notification = apps.get_model('social_app', 'Notification')
+    for recipient_id in Notification.objects.values_list(
+            'recipient_id', flat=True).distinct():
+        Notification.objects.filter(recipient_id=recipient_id).update(
+            created_for=str(recipient_id))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('social_app', '0009_notification_recipient'),
+    ]
+
+    operations = [
+        migrations.RunPython(copy_recipients, copy_recipients_back),
+    ]
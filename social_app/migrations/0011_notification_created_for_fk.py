@@ -0,0 +1,33 @@
+# Generated by Django 4.2.10 on 2026-10-17 04:10
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('social_app', '0010_notification_copy_recipients'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='notification',
+            name='created_for',
+        ),
+        migrations.RenameField(
+            model_name='notification',
+            old_name='recipient',
+            new_name='created_for',
+        ),
+        migrations.AlterField(
+            model_name='notification',
+            name='created_for',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='notifications', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['created_for', 'read', 'created_at'], name='notification_inbox_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.10 on 2026-10-17 02:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('social_app', '0011_notification_created_for_fk'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='pics_thumbnails',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='profile_pic_thumbnails',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
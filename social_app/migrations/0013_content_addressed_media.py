@@ -0,0 +1,57 @@
+# Generated by Django 4.2.10 on 2026-10-17 03:01
+
+from collections import Counter
+import social_app.storage
+from django.db import migrations, models
+
+
+def backfill_blobs(apps, schema_editor):
+    Post = apps.get_model('social_app', 'Post')
+    Profile = apps.get_model('social_app', 'Profile')
+    MediaBlob = apps.get_model('social_app', 'MediaBlob')
+
+    references = Counter()
+    rows = list(Post.objects.values_list('pics', 'pics_thumbnails')) + list(
+        Profile.objects.values_list('profile_pic', 'profile_pic_thumbnails'))
+    for name, thumbnails in rows:
+        if not name:
+            continue
+        references[name] += 1
+        if (thumbnails or {}).get('source') == name:
+            for sizes in thumbnails.get('sizes', {}).values():
+                references.update(sizes.values())
+
+    MediaBlob.objects.bulk_create(
+        [MediaBlob(name=name, refcount=count)
+         for name, count in references.items()],
+        batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('social_app', '0012_image_thumbnails'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MediaBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True)),
+                ('refcount', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='post',
+            name='pics',
+            field=models.ImageField(blank=True, null=True, storage=social_app.storage.ContentAddressedStorage(), upload_to='images/'),
+        ),
+        migrations.AlterField(
+            model_name='profile',
+            name='profile_pic',
+            field=models.ImageField(blank=True, null=True, storage=social_app.storage.ContentAddressedStorage(), upload_to='profile_pics/'),
+        ),
+        migrations.RunPython(backfill_blobs, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 4.2.10 on 2026-10-17 03:25
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_followers_count(apps, schema_editor):
+    Profile = apps.get_model('social_app', 'Profile')
+    Follow = apps.get_model('social_app', 'Follow')
+
+    counts = Follow.objects.filter(following=OuterRef('user')).order_by(
+        ).values('following').annotate(total=Count('pk')).values('total')
+    Profile.objects.update(followers_count=Coalesce(Subquery(counts), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('social_app', '0014_follow_graph'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='followers_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(
+            backfill_followers_count, migrations.RunPython.noop),
+    ]
@@ -1,6 +1,9 @@
-from django.db import models
+from django.db import models, transaction, IntegrityError
+from django.db.models import F
 import uuid
+from typing import Iterable, Tuple
 from django.contrib.auth.models import AbstractUser
+from .storage import media_storage
 
 class User(AbstractUser):
     """
@@ -11,7 +14,6 @@ class User(AbstractUser):
         registration_method (str): The method used for user registration.
     """
     email = models.CharField(max_length=250, unique=True)
-    channel_name = models.CharField(max_length=100, blank=True, null=True)
     REGISTRATION_CHOICES = [
         ('email', 'Email'),
         ('google', 'Google'),
@@ -43,12 +45,61 @@ class BaseModel(models.Model):
         abstract = True
 
 
-class Post(BaseModel):
+class MediaModelMixin:
+    """
+    Saves a post or profile in one transaction with the picture it
+    uploads. The storage takes the picture's blob reference when it
+    writes the file, so if the row then fails to save, the reference
+    is rolled back with it and the file is collected unless another
+    row references it.
+
+    Attributes:
+        media_field: The name of the image field.
+    """
+
+    media_field = ''
+
+    def save(self, *args, **kwargs):
+        picture = getattr(self, self.media_field)
+        uploading = bool(picture) and not picture._committed
+        try:
+            with transaction.atomic():
+                super().save(*args, **kwargs)
+        except BaseException:
+            if uploading and picture._committed:
+                MediaBlob.objects.collect([picture.name])
+            raise
+
+
+class Post(MediaModelMixin, BaseModel):
     """
     A model representing a post with text content and optional images.
+
+    likes_count and comments_count are denormalized counters kept in
+    step with the Like and Comment tables by the signals module.
     """
+    # indexed through the composite author index below
+    user = models.ForeignKey(User, on_delete=models.CASCADE, db_index=False)
     content = models.TextField()
-    pics = models.ImageField(upload_to='images/', null=True, blank=True)
+    pics = models.ImageField(
+        upload_to='images/', storage=media_storage, null=True, blank=True)
+    # storage names of the resized copies of pics, see social_app.images
+    pics_thumbnails = models.JSONField(default=dict, blank=True)
+    likes_count = models.PositiveIntegerField(default=0)
+    comments_count = models.PositiveIntegerField(default=0)
+
+    media_field = 'pics'
+
+    class Meta(BaseModel.Meta):
+        """
+        Indexes the (created_at, id) key used by the feed's keyset
+        pagination, and the per-author key merged into home timelines.
+        """
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='post_feed_idx'),
+            models.Index(
+                fields=['user', 'created_at', 'id'], name='post_author_idx'),
+        ]
 
     def __str__(self) -> str:
         return self.content[:15]
@@ -58,29 +109,150 @@ class Comment(BaseModel):
     """
     A model representing a comment with text content.
     """
+    # indexed through the composite thread index below
     post = models.ForeignKey(
         Post,
         on_delete=models.CASCADE,
-        related_name='comments')
+        related_name='comments',
+        db_index=False)
     content = models.TextField()
 
+    class Meta(BaseModel.Meta):
+        """
+        Indexes the (post, created_at, id) key used to page through a
+        post's comments and to read its latest ones.
+        """
+        indexes = [
+            models.Index(
+                fields=['post', 'created_at', 'id'], name='comment_thread_idx'),
+        ]
+
     def __str__(self) -> str:
         return self.content[:15]
 
 
+class LikeManager(models.Manager):
+    """
+    Manager for Like providing the race-free like/unlike toggle.
+    """
+
+    def toggle(self, post: Post, user: User) -> Tuple[bool, int]:
+        """
+        Likes the post if the user has not liked it yet, otherwise
+        removes the like, all inside a single transaction.
+
+        The unique (post, user) constraint makes concurrent taps safe:
+        a duplicate insert fails and is treated as already liked.
+
+        Args:
+            post: The post being liked or unliked.
+            user: The user toggling the like.
+
+        Returns:
+            Tuple[bool, int]: Whether the post is now liked and the
+            post's likes_count after the toggle.
+        """
+        with transaction.atomic():
+            deleted, _ = self.filter(post=post, user=user).delete()
+            liked = not deleted
+            if liked:
+                try:
+                    with transaction.atomic():
+                        self.create(post=post, user=user)
+                except IntegrityError:
+                    # a concurrent request already inserted this like
+                    pass
+            likes_count = Post.objects.filter(pk=post.pk).values_list(
+                'likes_count', flat=True).get()
+        return liked, likes_count
+
+
 class Like(BaseModel):
     """
     A model representing a like on a post.
+    A user can like a given post at most once.
     """
     post = models.ForeignKey(
         Post,
         on_delete=models.CASCADE,
         related_name='likes')
 
+    objects = LikeManager()
+
+    class Meta(BaseModel.Meta):
+        """
+        Enforces a single like per (post, user) pair.
+        """
+        constraints = [
+            models.UniqueConstraint(
+                fields=['post', 'user'], name='unique_like_per_user'),
+        ]
+
+
+class FollowManager(models.Manager):
+    """
+    Manager for Follow providing the follow/unfollow toggle.
+    """
+
+    def toggle(self, user: User, following: User) -> bool:
+        """
+        Follows the user if not followed yet, otherwise unfollows.
+
+        Args:
+            user: The follower.
+            following: The user being followed or unfollowed.
+
+        Returns:
+            bool: Whether `user` now follows `following`.
+        """
+        with transaction.atomic():
+            deleted, _ = self.filter(user=user, following=following).delete()
+            if deleted:
+                return False
+            try:
+                with transaction.atomic():
+                    self.create(user=user, following=following)
+            except IntegrityError:
+                # a concurrent request already inserted this follow
+                pass
+        return True
+
+
+class Follow(BaseModel):
+    """
+    A directed edge of the follow graph: `user` follows `following`.
+    """
+    # indexed through the unique follow constraint below
+    user = models.ForeignKey(User, on_delete=models.CASCADE, db_index=False)
+    following = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='followers')
+
+    objects = FollowManager()
+
+    class Meta(BaseModel.Meta):
+        """
+        One edge per (follower, followed) pair, which also indexes a
+        user's followees; the second index serves follower lookups.
+        """
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'following'], name='unique_follow'),
+            models.CheckConstraint(
+                check=~models.Q(user=models.F('following')),
+                name='no_self_follow'),
+        ]
+        indexes = [
+            models.Index(
+                fields=['following', 'user'], name='follow_followers_idx'),
+        ]
+
 
-class Profile(models.Model):
+class Profile(MediaModelMixin, models.Model):
     """
     Represents a user profile with a one-to-one relationship to a User.
+    followers_count is a denormalized count of the user's Follow rows.
 
     Returns:
         str: The username of the associated User.
@@ -88,8 +260,14 @@ class Profile(models.Model):
 
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='profile')
     profile_pic = models.ImageField(
-        upload_to='profile_pics/', null=True, blank=True)
+        upload_to='profile_pics/', storage=media_storage,
+        null=True, blank=True)
+    profile_pic_thumbnails = models.JSONField(default=dict, blank=True)
     bio = models.TextField(null=True)
+    # kept in step with Follow rows by the signals module
+    followers_count = models.PositiveIntegerField(default=0)
+
+    media_field = 'profile_pic'
 
     def __str__(self):
         return self.user.username
@@ -100,12 +278,153 @@ class Notification(BaseModel):
     A model to represent notifications for users.
     Args:
         User:  whow is the person who created the notification
-        created_for: id of user for whom the notification is created for,
+        created_for: the user for whom the notification is created for,
         message: The content of the notification.
     """
-    created_for = models.CharField(max_length=60)
+    # indexed through the composite inbox index below
+    created_for = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='notifications',
+        db_index=False)
     message = models.TextField()
     read = models.BooleanField(default=False)
 
+    class Meta(BaseModel.Meta):
+        """
+        Indexes a user's inbox so unread lookups are index-only.
+        """
+        indexes = [
+            models.Index(
+                fields=['created_for', 'read', 'created_at'],
+                name='notification_inbox_idx'),
+        ]
+
+    def __str__(self) -> str:
+        return self.message
+
+
+class MediaBlobManager(models.Manager):
+    """
+    Manager for MediaBlob maintaining the reference counts.
+    """
+
+    def acquire(self, names: Iterable[str]) -> None:
+        """
+        Adds a reference to each of the given blobs.
+
+        Args:
+            names: The storage names of the blobs now referenced.
+
+        Returns:
+            None
+        """
+        names = set(names)
+        if not names:
+            return
+        self.bulk_create(
+            [self.model(name=name) for name in names], ignore_conflicts=True)
+        self.filter(name__in=names).update(refcount=F('refcount') + 1)
+
+    def take(self, name: str) -> None:
+        """
+        Adds a reference to a blob the storage is about to write or
+        reuse, locking its row until the current transaction ends.
+        Must be called inside a transaction.
+
+        Args:
+            name: The storage name of the blob.
+
+        Returns:
+            None
+        """
+        # the row may be deleted by a concurrent collect between the
+        # insert and the update, in which case it is inserted again
+        while not self.filter(name=name).update(refcount=F('refcount') + 1):
+            self.bulk_create([self.model(name=name)], ignore_conflicts=True)
+
+    def release(self, names: Iterable[str]) -> None:
+        """
+        Drops a reference to each of the given blobs. Blobs left
+        without references are collected once the current
+        transaction commits.
+
+        Args:
+            names: The storage names of the blobs no longer referenced.
+
+        Returns:
+            None
+        """
+        names = set(names)
+        if not names:
+            return
+        with transaction.atomic():
+            self.filter(name__in=names, refcount__gt=0).update(
+                refcount=F('refcount') - 1)
+            unreferenced = list(self.filter(
+                name__in=names, refcount=0).values_list('name', flat=True))
+        if unreferenced:
+            transaction.on_commit(lambda: self.collect(unreferenced))
+
+    def replace(
+        self,
+        old_names: Iterable[str],
+        new_names: Iterable[str],
+        held: Iterable[str] = ()
+    ) -> None:
+        """
+        Moves an object's references from its old blobs to its new ones.
+        `held` are new blobs whose reference was already taken by the
+        storage when their file was saved.
+        """
+        old_names, new_names = set(old_names), set(new_names)
+        held = set(held) & new_names
+        self.acquire(new_names - old_names - held)
+        # a held blob the object already referenced is now counted twice
+        self.release((old_names - new_names) | (held & old_names))
+
+    def collect(self, names: Iterable[str]) -> None:
+        """
+        Deletes the files of the given blobs that are still without a
+        reference, as an identical upload may have revived one.
+
+        The blobs' rows are locked, inserted first where missing, while
+        the files are deleted, so a concurrent `take` of the same name
+        waits and then writes the file anew.
+
+        Args:
+            names: The storage names of candidate blobs.
+
+        Returns:
+            None
+        """
+        names = set(names)
+        if not names:
+            return
+        with transaction.atomic():
+            self.bulk_create(
+                [self.model(name=name) for name in names],
+                ignore_conflicts=True)
+            refcounts = dict(self.select_for_update().filter(
+                name__in=names).values_list('name', 'refcount'))
+            unreferenced = {
+                name for name, refcount in refcounts.items() if refcount == 0}
+            media_storage.delete_many(unreferenced)
+            self.filter(name__in=unreferenced).delete()
+
+
+class MediaBlob(models.Model):
+    """
+    Reference count of a file in the content-addressed media storage.
+
+    Every post picture, profile picture and thumbnail holds one
+    reference to its blob; the file is deleted with the last reference.
+    """
+    name = models.CharField(max_length=255, unique=True)
+    refcount = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    objects = MediaBlobManager()
+
     def __str__(self) -> str:
-        return self.message
\ No newline at end of file
+        return self.name
@@ -0,0 +1,330 @@
+'''
+This module defines the keyset (cursor) pagination used by the list views
+'''
+import heapq
+from collections import OrderedDict
+from datetime import datetime
+from itertools import groupby, islice
+from typing import Any, Iterable, List, Optional, Tuple
+
+from django.core import signing
+from django.db import connections
+from django.db.models import Q, QuerySet
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+Position = Tuple[datetime, str]
+
+
+def encode_cursor(position: Position, reverse: bool = False) -> str:
+    """
+    Encodes a keyset position into an opaque, signed cursor string.
+
+    Args:
+        position: The (created_at, id) pair of the boundary row.
+        reverse: True if the cursor walks backwards through the listing.
+
+    Returns:
+        str: A URL-safe signed token that clients can pass back as-is.
+    """
+    created_at, pk = position
+    payload = {'c': created_at.isoformat(), 'i': str(pk), 'r': int(reverse)}
+    return signing.dumps(payload, salt=KeysetPagination.signing_salt)
+
+
+def decode_cursor(cursor: str) -> Tuple[Position, bool]:
+    """
+    Decodes and verifies a cursor created by `encode_cursor`.
+
+    Args:
+        cursor: The opaque cursor received from the client.
+
+    Returns:
+        Tuple[Position, bool]: The boundary position and the direction flag.
+
+    Raises:
+        NotFound: If the cursor was tampered with or is malformed.
+    """
+    try:
+        payload = signing.loads(cursor, salt=KeysetPagination.signing_salt)
+        position = (datetime.fromisoformat(payload['c']), payload['i'])
+        return position, bool(payload['r'])
+    except (signing.BadSignature, KeyError, TypeError, ValueError):
+        raise NotFound('Invalid cursor.')
+
+
+class KeysetPagination(BasePagination):
+    """
+    Paginates a queryset by seeking on an indexed (created_at, id) key
+    instead of using OFFSET, so every page costs the same to fetch.
+
+    The total count is optional: clients that do not need it can pass
+    `?count=false` and the COUNT(*) query is skipped entirely.
+
+    Attributes:
+        page_size: Number of rows returned per page.
+        ordering: The two key columns, prefixed with '-' for descending.
+        include_count: Whether the count is returned unless disabled.
+    """
+
+    page_size = api_settings.PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    count_query_param = 'count'
+    ordering = ('created_at', 'id')
+    include_count = True
+    signing_salt = 'social_app.pagination'
+
+    def paginate_queryset(
+        self, queryset: QuerySet, request, view=None
+    ) -> Optional[List[Any]]:
+        """
+        Returns the rows of the page selected by the request cursor.
+
+        Args:
+            queryset: The queryset to paginate.
+            request: The incoming request.
+            view: The view calling the paginator.
+
+        Returns:
+            List: The rows belonging to the requested page.
+        """
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        page_size = self.get_page_size(request)
+
+        encoded = request.query_params.get(self.cursor_query_param)
+        position, reverse = (
+            decode_cursor(encoded) if encoded else (None, False))
+
+        self.count = (
+            queryset.order_by().count()
+            if self.get_include_count(request) else None)
+
+        ordering = self.ordering
+        if reverse:
+            ordering = tuple(self._invert(field) for field in ordering)
+
+        rows = self.fetch_rows(
+            queryset, position, reverse, ordering, page_size + 1)
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+        if reverse:
+            rows.reverse()
+
+        if reverse:
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, position is not None
+
+        self.rows = rows
+        return rows
+
+    def fetch_rows(
+        self,
+        queryset: QuerySet,
+        position: Optional[Position],
+        reverse: bool,
+        ordering: Tuple[str, str],
+        limit: int
+    ) -> List[Any]:
+        """
+        Returns up to `limit` rows past the position, in `ordering`.
+
+        Args:
+            queryset: The queryset to paginate.
+            position: The boundary position, None for the first page.
+            reverse: True if walking backwards from the position.
+            ordering: The key ordering, already inverted if reverse.
+            limit: The maximum number of rows.
+
+        Returns:
+            List: The rows.
+        """
+        if position is not None:
+            queryset = queryset.filter(self._seek(position, reverse))
+        return list(queryset.order_by(*ordering)[:limit])
+
+    def get_paginated_response(self, data: List[Any]) -> Response:
+        """
+        Wraps the serialized page in the pagination envelope.
+
+        Args:
+            data: The serialized rows of the current page.
+
+        Returns:
+            Response: The page with its next and previous links.
+        """
+        envelope = OrderedDict()
+        if self.count is not None:
+            envelope['count'] = self.count
+        envelope['next'] = self.get_next_link()
+        envelope['previous'] = self.get_previous_link()
+        envelope['results'] = data
+        return Response(envelope)
+
+    def get_page_size(self, request) -> int:
+        """
+        Returns the page size, honouring a bounded client override.
+        """
+        try:
+            requested = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if requested <= 0:
+            return self.page_size
+        return min(requested, self.max_page_size)
+
+    def get_include_count(self, request) -> bool:
+        """
+        Returns whether the total count should be computed for the request.
+        """
+        value = request.query_params.get(self.count_query_param)
+        if value is None:
+            return self.include_count
+        return value.lower() not in ('0', 'false', 'no')
+
+    def get_next_link(self) -> Optional[str]:
+        if not self.has_next or not self.rows:
+            return None
+        cursor = encode_cursor(self._position(self.rows[-1]))
+        return replace_query_param(
+            self.base_url, self.cursor_query_param, cursor)
+
+    def get_previous_link(self) -> Optional[str]:
+        if not self.has_previous:
+            return None
+        if not self.rows:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        cursor = encode_cursor(self._position(self.rows[0]), reverse=True)
+        return replace_query_param(
+            self.base_url, self.cursor_query_param, cursor)
+
+    def _position(self, row: Any) -> Position:
+        fields = [field.lstrip('-') for field in self.ordering]
+        return getattr(row, fields[0]), getattr(row, fields[1])
+
+    def _seek(self, position: Position, reverse: bool) -> Q:
+        """
+        Builds the keyset predicate selecting rows past the position.
+        """
+        first, second = (field.lstrip('-') for field in self.ordering)
+        descending = self.ordering[0].startswith('-')
+        lookup = 'gt' if descending == reverse else 'lt'
+        created_at, pk = position
+        return (
+            Q(**{f'{first}__{lookup}': created_at}) |
+            Q(**{first: created_at, f'{second}__{lookup}': pk}))
+
+    @staticmethod
+    def _invert(field: str) -> str:
+        return field[1:] if field.startswith('-') else f'-{field}'
+
+
+class NotificationPagination(KeysetPagination):
+    """
+    Newest-first keyset pagination for a user's notification inbox.
+    The inbox never reports a total; unread totals have their own endpoint.
+    """
+
+    ordering = ('-created_at', '-id')
+    include_count = False
+
+
+class CommentPagination(KeysetPagination):
+    """
+    Oldest-first keyset pagination through one post's comments,
+    seeking on the (post, created_at, id) index. The post's
+    comments_count already gives the total, so no count is run.
+    """
+
+    ordering = ('created_at', 'id')
+    include_count = False
+
+
+class MergedKeysetPagination(KeysetPagination):
+    """
+    Newest-first keyset pagination over rows whose `merge_field` takes
+    one of a few values, e.g. the posts of the authors a user follows.
+
+    Rather than one query filtering the whole table on
+    `merge_field IN (...)`, each value's page-sized range is read from
+    a (merge_field, created_at, id) index and the ranges are merged,
+    so a page costs as many index ranges as there are values no
+    matter how large the table is. Only the keys of the ranges are
+    read; the rows of the page are then loaded with a single query.
+
+    The view supplies the values through `get_merge_values()`.
+    """
+
+    ordering = ('-created_at', '-id')
+    include_count = False
+    merge_field = 'user_id'
+
+    def paginate_queryset(
+        self, queryset: QuerySet, request, view=None
+    ) -> Optional[List[Any]]:
+        self.merge_values = list(view.get_merge_values())
+        return super().paginate_queryset(queryset, request, view)
+
+    def fetch_rows(self, queryset, position, reverse, ordering, limit):
+        ranges = self.get_key_ranges(
+            queryset, position, reverse, ordering, limit)
+        merged = heapq.merge(*ranges, reverse=ordering[0].startswith('-'))
+        # a key may come from more than one range; being sorted, its
+        # copies are adjacent
+        unique = (key for key, _ in groupby(merged))
+        return self.load_rows(
+            queryset, [pk for _, pk in islice(unique, limit)])
+
+    def load_rows(self, queryset, page_keys: List[Any]) -> List[Any]:
+        """
+        Returns the rows with the given primary keys, in order.
+        """
+        rows = queryset.in_bulk(page_keys)
+        return [rows[pk] for pk in page_keys if pk in rows]
+
+    def get_key_ranges(
+        self, queryset, position, reverse, ordering, limit
+    ) -> List[Iterable[Position]]:
+        """
+        Returns the sorted (created_at, id) ranges to merge.
+        """
+        return self.value_key_ranges(
+            self.merge_values, queryset, position, reverse, ordering, limit)
+
+    def value_key_ranges(
+        self, values, queryset, position, reverse, ordering, limit
+    ) -> List[Iterable[Position]]:
+        """
+        Returns one key range per merge value, or a single pre-merged
+        range where the database can UNION ALL LIMITed queries in one
+        round trip.
+        """
+        ranges = [
+            self._key_range(queryset, value, position, reverse, ordering, limit)
+            for value in values]
+        features = connections[queryset.db].features
+        if len(ranges) > 1 and features.supports_slicing_ordering_in_compound:
+            first, *rest = ranges
+            return [sorted(
+                first.union(*rest, all=True),
+                reverse=ordering[0].startswith('-'))]
+        return ranges
+
+    def _key_range(
+        self, queryset, value, position, reverse, ordering, limit
+    ) -> QuerySet:
+        """
+        Returns the unevaluated (created_at, id) range of one merge value.
+        """
+        queryset = queryset.filter(**{self.merge_field: value})
+        if position is not None:
+            queryset = queryset.filter(self._seek(position, reverse))
+        keys = [field.lstrip('-') for field in ordering]
+        return queryset.order_by(*ordering).values_list(*keys)[:limit]
@@ -1,5 +1,6 @@
 from rest_framework import serializers
 from .models import Post, Comment, User, Notification
+from .images import thumbnail_urls
 
 
 class UserSerialiser(serializers.ModelSerializer):
@@ -30,18 +31,37 @@ class BaseSerialiser(serializers.ModelSerializer):
 class PostSerialiser(BaseSerialiser):
     """
     Serializer for Post model data including 'id', 'created_at', 
-    'content', 'pics', 'user', 'likes_count', 'comments_count'.
+    'content', 'pics', 'thumbnails', 'user', 'likes_count',
+    'comments_count' and 'latest_comments'.
     """
 
     likes_count = serializers.IntegerField(read_only=True)
     comments_count = serializers.IntegerField(read_only=True)
+    thumbnails = serializers.SerializerMethodField()
+    latest_comments = serializers.SerializerMethodField()
 
     class Meta:
         model = Post
-        fields = ['id', 'created_at', 'content',
-                  'pics', 'user', 'likes_count', 'comments_count']
+        fields = ['id', 'created_at', 'content', 'pics', 'thumbnails',
+                  'user', 'likes_count', 'comments_count', 'latest_comments']
         ordering = ['id']
 
+    def get_thumbnails(self, post: Post) -> dict:
+        """
+        Returns the URLs of the resized copies of the post's picture,
+        keyed by width and then format; empty until they are generated.
+        """
+        return thumbnail_urls(
+            post.pics.storage, post.pics_thumbnails,
+            self.context.get('request'))
+
+    def get_latest_comments(self, post: Post) -> list:
+        """
+        Returns the preview of the post's newest comments, oldest first,
+        attached by `hydrate_posts`; empty for posts loaded otherwise.
+        """
+        return CommentSerialiser(
+            getattr(post, 'comment_preview', []), many=True).data
 
 
 class CommentSerialiser(BaseSerialiser):
@@ -65,11 +85,16 @@ class InputSerializer(serializers.Serializer):
         state = serializers.CharField(required=False)
 
 
-class NotificationSerialiser(serializers.Serializer):
-     """
-    Serializer for Notification model data including all fields.
+class NotificationSerialiser(BaseSerialiser):
+    """
+    Serializer for Notification model data including 'id',
+    'created_at', 'message', 'read' and the 'user' who triggered it,
+    plus 'timestamp', the exact ISO 8601 creation time clients pass
+    back as `since` to resume the notification socket.
     """
 
-     class Meta:
-          model = Notification
-          fields = '__all__'
+    timestamp = serializers.DateTimeField(source='created_at', read_only=True)
+
+    class Meta:
+        model = Notification
+        fields = ['id', 'created_at', 'timestamp', 'message', 'read', 'user']
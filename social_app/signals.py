@@ -1,12 +1,23 @@
 from .models import Profile
 from .models import (
-    User, Comment, Like, Notification)
-from django.db.models.signals import post_save
+    User, Post, Comment, Like, Notification, MediaBlob, Follow)
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import (
+    post_init, pre_save, post_save, pre_delete, post_delete)
 from django.dispatch import receiver
-from typing import Union, List
-from channels.layers import get_channel_layer
-from asgiref.sync import async_to_sync
-from .serialiser import NotificationSerialiser
+from typing import Set, Union
+from .tasks import (
+    enqueue, record_event,
+    generate_post_thumbnails, generate_profile_thumbnails)
+from .timeline import (
+    drop_author_timelines, drop_timeline, fan_out_post,
+    remove_post_from_timelines)
+from .images import needs_thumbnails, referenced_names
+from .cache import (
+    invalidate_feed, invalidate_posts, invalidate_unread_count,
+    invalidate_auth_user)
 
 
 @receiver(post_save, sender=User)
@@ -21,121 +32,436 @@ def create_profile(sender, instance, created, **kwargs):
     if created:
         profile = Profile.objects.create(user=instance)
 
-def send_notification(
-    notifications: List[Notification],
-    channel_name: str,
-    many: bool = False
-) -> None:
+COUNTER_FIELDS = {
+    Like: 'likes_count',
+    Comment: 'comments_count',
+}
+
+
+def update_post_counter(post_id: str, field: str, delta: int) -> None:
     """
-    Sends notifications to a specified channel using the 
-    provided list of notifications.
+    Atomically adjusts a denormalized counter on a post with an
+    F() expression so concurrent writers never lose an update.
 
     Args:
-        notifications: A list of Notification instances to be sent.
-        channel_name: The name of the channel to send the notifications to.
-        many: A boolean indicating if multiple notifications are being sent.
+        post_id: The id of the post whose counter changes.
+        field: The counter column, 'likes_count' or 'comments_count'.
+        delta: The amount to add, negative to decrement.
+
     Returns:
         None
     """
-
-    channel_layer = get_channel_layer()
-    async_to_sync(channel_layer.send)(
-            channel_name,
-            {
-                "type": "send_notification",
-                "message": NotificationSerialiser(notifications, many=many).data
-            }
-        )
+    posts = Post.objects.filter(pk=post_id)
+    if delta < 0:
+        # never drive a drifted counter below zero
+        posts = posts.filter(**{f'{field}__gte': -delta})
+    posts.update(**{field: F(field) + delta})
 
 
-def create_notification(instance: Union[Comment, Like], message: str) -> None:
+def update_followers_count(user_id: int, delta: int) -> None:
     """
-    Creates a notification based on the provided instance and message.
+    Atomically adjusts the denormalized followers_count of a profile,
+    and drops the timelines holding the author's posts when the
+    change crosses TIMELINE_FANOUT_MAX_FOLLOWERS.
 
     Args:
-        instance: The instance (Comment or Like) for which the notification is created.
-        message: The message content for the notification.
+        user_id: The id of the followed user.
+        delta: The amount to add, negative to decrement.
 
     Returns:
         None
     """
-    whose_post = instance.post.user.id
-    who_created = instance.user
+    profiles = Profile.objects.filter(user_id=user_id)
+    if delta < 0:
+        profiles = profiles.filter(followers_count__gte=-delta)
+    profiles.update(followers_count=F('followers_count') + delta)
 
-    if who_created.id != whose_post:
-        message = f"{who_created.username} {message}"
-        return Notification.objects.create(
-                user=who_created,
-                created_for=whose_post,
-                message=message)
-    
-    
+    if settings.TIMELINE_FANOUT:
+        threshold = settings.TIMELINE_FANOUT_MAX_FOLLOWERS
+        count = Profile.objects.filter(user_id=user_id).values_list(
+            'followers_count', flat=True).first()
+        crossed = threshold + 1 if delta > 0 else threshold
+        if count == crossed:
+            # the author just became, or stopped being, a celebrity
+            enqueue('default', drop_author_timelines, user_id)
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, **kwargs):
+    """
+    Counts the new follower and drops the follower's materialized
+    timeline, which no longer matches the users they follow.
+
+    Returns:
+        None
+    """
+
+    if created:
+        update_followers_count(instance.following_id, 1)
+        drop_follower_timeline(instance.user_id)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    """
+    Uncounts the follower and drops the follower's materialized timeline.
+
+    Returns:
+        None
+    """
+
+    update_followers_count(instance.following_id, -1)
+    drop_follower_timeline(instance.user_id)
+
+
+def drop_follower_timeline(user_id: int) -> None:
+    if settings.TIMELINE_FANOUT:
+        transaction.on_commit(lambda: drop_timeline(user_id))
+
+
+@receiver(post_save, sender=Post)
+def fan_out_created_post(sender, instance, created, **kwargs):
+    """
+    Queues the push of a new post onto its followers' timelines.
+
+    Returns:
+        None
+    """
+
+    if created and settings.TIMELINE_FANOUT:
+        enqueue('default', fan_out_post, instance.pk)
+
+
+@receiver(post_delete, sender=Post)
+def remove_deleted_post(sender, instance, **kwargs):
+    """
+    Queues the removal of a deleted post from the timelines.
+
+    Returns:
+        None
+    """
+
+    if settings.TIMELINE_FANOUT:
+        enqueue(
+            'default', remove_post_from_timelines,
+            instance.pk, instance.user_id)
+
+
+@receiver(post_save, sender=Like)
 @receiver(post_save, sender=Comment)
-def created_comment(sender, instance, created, **kwargs):
+def increment_post_counter(sender, instance, created, **kwargs):
     """
-    Handles the signal when a Comment instance is created.
+    Increments the post's like or comment counter when a
+    Like or Comment instance is created.
 
-    Args:
-        sender: The sender of the signal.
-        instance: The Comment instance that triggered the signal.
-        created: A boolean indicating if the instance was created.
-        **kwargs: Additional keyword arguments.
+    Returns:
+        None
+    """
+
+    if created:
+        update_post_counter(instance.post_id, COUNTER_FIELDS[sender], 1)
+
+
+@receiver(post_delete, sender=Like)
+@receiver(post_delete, sender=Comment)
+def decrement_post_counter(sender, instance, **kwargs):
+    """
+    Decrements the post's like or comment counter when a
+    Like or Comment instance is deleted.
 
     Returns:
         None
     """
 
-    if not created:
-        return
+    update_post_counter(instance.post_id, COUNTER_FIELDS[sender], -1)
 
-    notifications = create_notification(instance, 'commented on your post')
-    if not notifications:
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def invalidate_cached_post(sender, instance, **kwargs):
+    """
+    Drops the cached post when a post is created, edited or deleted,
+    and the feed pages, which only list post ids, when the set of
+    posts changes.
+
+    Returns:
+        None
+    """
+
+    invalidate_posts([instance.pk])
+    if kwargs.get('created') is not False:
+        invalidate_feed()
+
+
+@receiver(post_save, sender=Like)
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Like)
+@receiver(post_delete, sender=Comment)
+def invalidate_cached_post_counters(sender, instance, **kwargs):
+    """
+    Drops the cached post when a like or comment changes its counters.
+
+    Returns:
+        None
+    """
+
+    if kwargs.get('created') is False:
         return
+    invalidate_posts([instance.post_id])
+
 
-    user = User.objects.filter(id=int(notifications.created_for)).first()
-    if not user or not user.channel_name:
+@receiver(post_init, sender=User)
+def remember_username(sender, instance, **kwargs):
+    """
+    Records the username a User was loaded with, unless it was
+    deferred, so renames can be told apart from other saves.
+
+    Returns:
+        None
+    """
+
+    instance._loaded_username = instance.__dict__.get('username')
+
+
+@receiver(post_save, sender=User)
+def invalidate_cached_author(sender, instance, created, update_fields, **kwargs):
+    """
+    Drops the cached posts of a renamed user, since every cached post
+    embeds its author, and the posts whose comment preview may
+    include the user. Other saves, e.g. of last_login, are ignored.
+
+    Returns:
+        None
+    """
+
+    loaded_username = instance._loaded_username
+    instance._loaded_username = instance.username
+    if created or (update_fields and 'username' not in update_fields):
         return
+    if loaded_username == instance.username:
+        return
+    post_ids = Post.objects.filter(user=instance).values_list('pk', flat=True)
+    commented = Comment.objects.filter(user=instance).values_list(
+        'post_id', flat=True).distinct()
+    invalidate_posts({*post_ids, *commented})
 
-    send_notification(notifications, user.channel_name)
-        
 
-@receiver(post_save, sender=Like)
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_cached_auth_user(sender, instance, **kwargs):
+    """
+    Drops the User cached by CachedJWTAuthentication when the user
+    is created, updated (e.g. deactivated) or deleted.
+
+    Returns:
+        None
+    """
+
+    invalidate_auth_user(instance.pk)
+
+
+@receiver(post_save, sender=Post)
+def create_post_thumbnails(sender, instance, **kwargs):
+    """
+    Queues thumbnail generation when a post's picture is set.
+
+    Returns:
+        None
+    """
+
+    if (picture_changed(instance, instance.pics) and
+            needs_thumbnails(instance.pics, instance.pics_thumbnails)):
+        enqueue('default', generate_post_thumbnails, instance.pk)
+
+
+@receiver(post_save, sender=Profile)
+def create_profile_thumbnails(sender, instance, **kwargs):
+    """
+    Queues thumbnail generation when a profile picture is set or replaced.
+
+    Returns:
+        None
+    """
+
+    if (picture_changed(instance, instance.profile_pic) and
+            needs_thumbnails(
+                instance.profile_pic, instance.profile_pic_thumbnails)):
+        enqueue('default', generate_profile_thumbnails, instance.pk)
+
+
+def picture_changed(instance, picture) -> bool:
+    """
+    Returns True if a post or profile was saved with a picture its
+    row did not hold before, so saves made while its thumbnails are
+    still pending do not queue them again.
+
+    Args:
+        instance: The saved Post or Profile.
+        picture: Its image field.
+
+    Returns:
+        bool: Whether the picture was set or replaced by this save.
+    """
+    return bool(picture) and picture.name not in instance._stored_media
+
+
+MEDIA_FIELDS = {
+    Post: ('pics', 'pics_thumbnails'),
+    Profile: ('profile_pic', 'profile_pic_thumbnails'),
+}
+
+
+def stored_media_references(sender, pk) -> Set[str]:
+    """
+    Returns the media blobs referenced by the saved row of a post or
+    profile, read from the database rather than from an instance
+    that may predate its thumbnails.
+
+    Args:
+        sender: Post or Profile.
+        pk: The primary key of the row.
+
+    Returns:
+        Set[str]: The storage names of the referenced blobs.
+    """
+    stored = sender.objects.filter(pk=pk).values_list(
+        *MEDIA_FIELDS[sender]).first()
+    return referenced_names(*stored) if stored else set()
+
+
+@receiver(pre_save, sender=Post)
+@receiver(pre_save, sender=Profile)
+@receiver(pre_delete, sender=Post)
+@receiver(pre_delete, sender=Profile)
+def remember_media_references(sender, instance, **kwargs):
+    """
+    Records the blobs referenced before a post or profile is
+    saved or deleted, and whether a new picture is being uploaded,
+    in which case the storage takes its reference.
+
+    Returns:
+        None
+    """
+
+    instance._stored_media = (
+        set() if instance._state.adding
+        else stored_media_references(sender, instance.pk))
+    picture = getattr(instance, MEDIA_FIELDS[sender][0])
+    instance._uploading_media = bool(picture) and not picture._committed
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_save, sender=Profile)
+def update_media_references(sender, instance, **kwargs):
+    """
+    Moves the references of a post or profile to its current picture,
+    releasing a replaced picture and its thumbnails.
+
+    Returns:
+        None
+    """
+
+    image_field, thumbnails_field = MEDIA_FIELDS[sender]
+    picture = getattr(instance, image_field)
+    current = referenced_names(
+        picture.name, getattr(instance, thumbnails_field))
+    held = {picture.name} if getattr(
+        instance, '_uploading_media', False) else set()
+    MediaBlob.objects.replace(
+        getattr(instance, '_stored_media', set()), current, held)
+
+
+@receiver(post_delete, sender=Post)
+@receiver(post_delete, sender=Profile)
+def release_media_references(sender, instance, **kwargs):
+    """
+    Releases the blobs of a deleted post or profile, so pictures
+    no one else references are removed from disk.
+
+    Returns:
+        None
+    """
+
+    MediaBlob.objects.release(getattr(instance, '_stored_media', set()))
+
+
+@receiver(post_save, sender=Notification)
+def count_unread_notification(sender, instance, created, **kwargs):
+    """
+    Drops the recipient's cached unread count when an unread
+    Notification instance is created.
+
+    Returns:
+        None
+    """
+
+    if created and not instance.read:
+        invalidate_unread_count(instance.created_for_id)
+
+
+@receiver(post_delete, sender=Notification)
+def uncount_unread_notification(sender, instance, **kwargs):
+    """
+    Drops the recipient's cached unread count when an unread
+    Notification instance is deleted.
+
+    Returns:
+        None
+    """
+
+    if not instance.read:
+        invalidate_unread_count(instance.created_for_id)
+
+
+def create_notification(instance: Union[Comment, Like], message: str) -> None:
+    """
+    Records a notification event for the owner of the post the
+    instance belongs to. Events are coalesced and delivered by the
+    notifications worker, off the request path.
+
+    Args:
+        instance: The instance (Comment or Like) for which the notification is created.
+        message: The message content for the notification.
+
+    Returns:
+        None
+    """
+    whose_post = instance.post.user_id
+    who_created = instance.user
+
+    if who_created.id != whose_post:
+        record_event(
+            whose_post, instance.post_id,
+            who_created.id, who_created.username, message)
+
+
+@receiver(post_save, sender=Comment)
 def created_comment(sender, instance, created, **kwargs):
     """
-    Handles the signal when a Like instance is created.
+    Handles the signal when a Comment instance is created.
 
     Args:
         sender: The sender of the signal.
-        instance: The Like instance that triggered the signal.
+        instance: The Comment instance that triggered the signal.
         created: A boolean indicating if the instance was created.
         **kwargs: Additional keyword arguments.
 
     Returns:
         None
     """
-    if not created:
-        return
-
-    notifications = create_notification(instance, 'liked your post')
-    if not notifications:
-        return
 
-    user = User.objects.filter(id=int(notifications.created_for)).first()
-    if not user or not user.channel_name:
-        return
-
-    send_notification(notifications, user.channel_name)
+    if created:
+        create_notification(instance, 'commented on your post')
 
 
-@receiver(post_save, sender=User)
-def send_unread_notification(sender, instance, created, **kwargs):
+@receiver(post_save, sender=Like)
+def created_like(sender, instance, created, **kwargs):
     """
-    Sends unread notifications to a user's channel when a 
-    new User instance is created.
+    Handles the signal when a Like instance is created.
 
     Args:
         sender: The sender of the signal.
-        instance: The User instance that triggered the signal.
+        instance: The Like instance that triggered the signal.
         created: A boolean indicating if the instance was created.
         **kwargs: Additional keyword arguments.
 
@@ -143,7 +469,6 @@ def send_unread_notification(sender, instance, created, **kwargs):
         None
     """
 
-    if created and instance.channel_name:
-        notifications = Notification.objects.filter(
-            created_for=instance.id, read=False)
-        send_notification(notifications, instance.channel_name, many=True)
\ No newline at end of file
+    if created:
+        create_notification(instance, 'liked your post')
+
@@ -0,0 +1,106 @@
+'''
+This module defines the content-addressed storage used for uploaded media
+'''
+import hashlib
+import os
+import tempfile
+from typing import Iterable
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.utils.deconstruct import deconstructible
+
+
+def blob_name(prefix: str, digest: str, extension: str) -> str:
+    """
+    Returns the storage name of a blob, sharded by the first two
+    characters of its digest so no directory grows unbounded.
+
+    Args:
+        prefix: The upload directory, e.g. 'images'.
+        digest: The hex SHA-256 digest of the content.
+        extension: The file extension including the dot, e.g. '.jpg'.
+
+    Returns:
+        str: e.g. 'images/3f/3fa9...e1.jpg'.
+    """
+    return '/'.join(
+        part for part in (prefix, digest[:2], digest + extension.lower())
+        if part)
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    File system storage that names every file after the SHA-256 of its
+    content. The digest is computed while the upload is streamed into
+    a temporary file, which is then atomically renamed into place, so
+    identical uploads share one file on disk and a stored file never
+    changes once written.
+
+    Reference counts of the stored blobs are kept by MediaBlob. Every
+    save takes one reference on behalf of the caller, in the same
+    transaction that writes or reuses the file, so a concurrent
+    MediaBlob collection cannot delete a file that was just handed out.
+    """
+
+    def get_available_name(self, name: str, max_length=None) -> str:
+        # the final name is only known once the content is hashed and
+        # an existing blob with that name is the file itself
+        return name
+
+    def _save(self, name: str, content) -> str:
+        prefix = name.split('/', 1)[0] if '/' in name else ''
+        _, extension = os.path.splitext(name)
+        directory = self.path(prefix)
+        os.makedirs(directory, exist_ok=True)
+
+        digest = hashlib.sha256()
+        with tempfile.NamedTemporaryFile(
+                dir=directory, prefix='.upload-', delete=False) as temporary:
+            try:
+                for chunk in content.chunks():
+                    digest.update(chunk)
+                    temporary.write(chunk)
+            except BaseException:
+                os.unlink(temporary.name)
+                raise
+
+        name = blob_name(prefix, digest.hexdigest(), extension)
+        path = self.path(name)
+        # imported here as the models use this storage
+        from .models import MediaBlob
+        try:
+            with transaction.atomic():
+                # the reference is taken, locking the blob's row, before
+                # the file is looked at: a concurrent collect either
+                # deleted it already or will find it referenced
+                MediaBlob.objects.take(name)
+                if os.path.exists(path):
+                    os.unlink(temporary.name)
+                    return name
+
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                if self.file_permissions_mode is not None:
+                    os.chmod(temporary.name, self.file_permissions_mode)
+                os.replace(temporary.name, path)
+        except BaseException:
+            if os.path.exists(temporary.name):
+                os.unlink(temporary.name)
+            raise
+        return name
+
+    def delete_many(self, names: Iterable[str]) -> None:
+        """
+        Deletes the given blobs, ignoring those already gone.
+
+        Args:
+            names: The storage names of the blobs.
+
+        Returns:
+            None
+        """
+        for name in names:
+            self.delete(name)
+
+
+media_storage = ContentAddressedStorage()
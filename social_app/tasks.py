@@ -0,0 +1,343 @@
+'''
+This module defines the background jobs executed by the django-rq workers
+'''
+import json
+from datetime import timedelta
+from typing import Any, Callable, Dict, List, Union
+import django_rq
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.db import transaction
+from rq import Retry
+from .consumers import user_group_name
+from .cache import invalidate_posts, invalidate_unread_count
+from .images import generate_thumbnails, referenced_names
+from .models import MediaBlob, Notification, Post, Profile
+from .serialiser import NotificationSerialiser
+
+
+NOTIFICATIONS_QUEUE = 'notifications'
+# times a failed flush is retried before its events wait for the next one
+FLUSH_RETRIES = 3
+
+
+def queue_is_async(queue_name: str) -> bool:
+    """
+    Returns False if the queue is configured to run its jobs inline.
+
+    Args:
+        queue_name: The name of the queue in settings.RQ_QUEUES.
+
+    Returns:
+        bool: Whether jobs go through Redis and a worker.
+    """
+    return settings.RQ_QUEUES[queue_name].get('ASYNC', True)
+
+
+def enqueue(queue_name: str, func: Callable, *args) -> None:
+    """
+    Runs `func(*args)` on the named RQ queue once the current
+    transaction commits, so the worker always sees the committed rows.
+
+    When the queue is configured with 'ASYNC': False (as it is under
+    the test runner) the job runs inline instead, without Redis.
+
+    Args:
+        queue_name: The name of the queue in settings.RQ_QUEUES.
+        func: The job function, importable by the worker.
+        *args: Picklable positional arguments for the job.
+
+    Returns:
+        None
+    """
+
+    if not queue_is_async(queue_name):
+        func(*args)
+        return
+
+    queue = django_rq.get_queue(queue_name)
+    transaction.on_commit(lambda: queue.enqueue(func, *args))
+
+
+def send_notification(
+    notifications: Union[Notification, List[Notification]],
+    user_id: int,
+    many: bool = False
+) -> None:
+    """
+    Sends notifications to every open socket of a user through
+    the user's channel-layer group.
+
+    Args:
+        notifications: A list of Notification instances to be sent.
+        user_id: The id of the user to send the notifications to.
+        many: A boolean indicating if multiple notifications are being sent.
+    Returns:
+        None
+    """
+
+    channel_layer = get_channel_layer()
+    async_to_sync(channel_layer.group_send)(
+            user_group_name(user_id),
+            {
+                "type": "send_notification",
+                "message": NotificationSerialiser(notifications, many=many).data
+            }
+        )
+
+
+def pending_events_key(recipient_id: int) -> str:
+    return f'notifications:pending:{recipient_id}'
+
+
+def flush_scheduled_key(recipient_id: int) -> str:
+    return f'notifications:flush-scheduled:{recipient_id}'
+
+
+def record_event(
+    recipient_id: int,
+    post_id: str,
+    actor_id: int,
+    actor_name: str,
+    verb: str
+) -> None:
+    """
+    Records that `actor` did `verb` on the recipient's post. Events are
+    buffered per recipient in Redis for NOTIFICATION_COALESCE_SECONDS
+    and then delivered together by `flush_notifications`, so a burst
+    of likes becomes one row and one push per post.
+
+    When the notifications queue runs inline the event is delivered
+    immediately instead.
+
+    Args:
+        recipient_id: The id of the post owner being notified.
+        post_id: The id of the post the event happened on.
+        actor_id: The id of the user who triggered the event.
+        actor_name: The username of that user.
+        verb: What happened, e.g. 'liked your post'.
+
+    Returns:
+        None
+    """
+
+    event = {
+        'recipient': recipient_id,
+        'post': str(post_id),
+        'actor': actor_id,
+        'actor_name': actor_name,
+        'verb': verb,
+    }
+    if not queue_is_async(NOTIFICATIONS_QUEUE):
+        deliver_events([event])
+        return
+
+    transaction.on_commit(lambda: buffer_event(event))
+
+
+def buffer_event(event: Dict[str, Any]) -> None:
+    """
+    Appends an event to its recipient's buffer and schedules a flush
+    if none is pending for that recipient yet.
+
+    Args:
+        event: The event built by `record_event`.
+
+    Returns:
+        None
+    """
+
+    recipient_id = event['recipient']
+    connection = django_rq.get_connection(NOTIFICATIONS_QUEUE)
+    connection.rpush(pending_events_key(recipient_id), json.dumps(event))
+    schedule_flush(connection, recipient_id)
+
+
+def schedule_flush(connection, recipient_id: int) -> None:
+    """
+    Schedules a flush of a recipient's buffer in
+    NOTIFICATION_COALESCE_SECONDS unless one is already pending.
+
+    Args:
+        connection: The Redis connection of the notifications queue.
+        recipient_id: The id of the user whose events are flushed.
+
+    Returns:
+        None
+    """
+
+    window = settings.NOTIFICATION_COALESCE_SECONDS
+    # the marker outlives the window so a lost job cannot block
+    # flushing for this recipient forever
+    scheduled = connection.set(
+        flush_scheduled_key(recipient_id), 1, nx=True, ex=window * 10)
+    if scheduled:
+        django_rq.get_queue(NOTIFICATIONS_QUEUE).enqueue_in(
+            timedelta(seconds=window), flush_notifications, recipient_id,
+            retry=Retry(max=FLUSH_RETRIES, interval=window))
+
+
+def flush_notifications(recipient_id: int) -> None:
+    """
+    Job that delivers a recipient's buffered events as coalesced
+    notifications, then drops them from the buffer.
+
+    Events are only removed once delivered, so a failed delivery
+    leaves them for the job's retry; delivery is thus at least once.
+    Events buffered meanwhile are kept and flushed by a new job.
+
+    Args:
+        recipient_id: The id of the user whose events are flushed.
+
+    Returns:
+        None
+    """
+
+    connection = django_rq.get_connection(NOTIFICATIONS_QUEUE)
+    key = pending_events_key(recipient_id)
+    raw_events = connection.lrange(key, 0, -1)
+    if raw_events:
+        deliver_events([json.loads(raw) for raw in raw_events])
+
+    pipeline = connection.pipeline()
+    pipeline.ltrim(key, len(raw_events), -1)
+    pipeline.delete(flush_scheduled_key(recipient_id))
+    pipeline.llen(key)
+    *_, remaining = pipeline.execute()
+    if remaining:
+        schedule_flush(connection, recipient_id)
+
+
+def coalesce_message(actor_names: List[str], verb: str) -> str:
+    """
+    Builds the text of a coalesced notification.
+
+    Args:
+        actor_names: Distinct usernames, most recent first.
+        verb: What they did, e.g. 'liked your post'.
+
+    Returns:
+        str: e.g. 'alice and 41 others liked your post'.
+    """
+
+    if len(actor_names) == 1:
+        return f"{actor_names[0]} {verb}"
+    if len(actor_names) == 2:
+        return f"{actor_names[0]} and {actor_names[1]} {verb}"
+    return f"{actor_names[0]} and {len(actor_names) - 1} others {verb}"
+
+
+def deliver_events(events: List[Dict[str, Any]]) -> None:
+    """
+    Aggregates events per recipient, post and verb, stores one
+    notification per aggregate with a single bulk insert and pushes
+    each recipient's notifications in a single message.
+
+    Args:
+        events: Events in the order they happened.
+
+    Returns:
+        None
+    """
+
+    actors = {}
+    for event in reversed(events):
+        group = (event['recipient'], event['post'], event['verb'])
+        names = actors.setdefault(group, {})
+        names.setdefault(event['actor'], event['actor_name'])
+
+    notifications = [
+        Notification(
+            user_id=next(iter(names)),
+            created_for_id=recipient_id,
+            message=coalesce_message(list(names.values()), verb))
+        for (recipient_id, _, verb), names in reversed(actors.items())
+    ]
+    Notification.objects.bulk_create(notifications)
+
+    per_recipient = {}
+    for notification in notifications:
+        per_recipient.setdefault(
+            notification.created_for_id, []).append(notification)
+    for recipient_id, received in per_recipient.items():
+        invalidate_unread_count(recipient_id)
+        send_notification(received, recipient_id, many=True)
+
+
+def record_thumbnails(
+    model, pk, image_field: str, name: str, thumbnails: Dict[str, object]
+) -> bool:
+    """
+    Stores generated thumbnails on the row and moves its blob
+    references to them, unless the picture was replaced meanwhile,
+    in which case the references the storage took are released.
+
+    Args:
+        model: Post or Profile.
+        pk: The primary key of the row.
+        image_field: The name of the image field on the model.
+        name: The storage name of the picture the thumbnails are of.
+        thumbnails: The thumbnails returned by `generate_thumbnails`.
+
+    Returns:
+        bool: True if the thumbnails were recorded.
+    """
+
+    thumbnails_field = f'{image_field}_thumbnails'
+    # the storage took a reference to each file it saved
+    generated = referenced_names(name, thumbnails) - {name}
+    with transaction.atomic():
+        stored = model.objects.select_for_update().filter(
+            pk=pk, **{image_field: name}).values_list(
+                thumbnails_field, flat=True).first()
+        if stored is None:
+            MediaBlob.objects.release(generated)
+            return False
+
+        model.objects.filter(pk=pk).update(**{thumbnails_field: thumbnails})
+        MediaBlob.objects.replace(
+            referenced_names(name, stored) - {name}, generated, generated)
+    return True
+
+
+def generate_post_thumbnails(post_id: str) -> None:
+    """
+    Job generating the thumbnails of a post's picture.
+
+    Args:
+        post_id: The id of the post.
+
+    Returns:
+        None
+    """
+
+    post = Post.objects.filter(pk=post_id).only('pics').first()
+    if post is None or not post.pics:
+        return
+
+    thumbnails = generate_thumbnails(post.pics.storage, post.pics.name)
+    if record_thumbnails(Post, post_id, 'pics', post.pics.name, thumbnails):
+        invalidate_posts([post_id])
+
+
+def generate_profile_thumbnails(profile_id: int) -> None:
+    """
+    Job generating the thumbnails of a user's profile picture.
+
+    Args:
+        profile_id: The id of the profile.
+
+    Returns:
+        None
+    """
+
+    profile = Profile.objects.filter(pk=profile_id).only('profile_pic').first()
+    if profile is None or not profile.profile_pic:
+        return
+
+    thumbnails = generate_thumbnails(
+        profile.profile_pic.storage, profile.profile_pic.name)
+    record_thumbnails(
+        Profile, profile_id, 'profile_pic', profile.profile_pic.name,
+        thumbnails)
@@ -0,0 +1,82 @@
+'''
+This module defines the test case mixins shared by the social_app tests
+'''
+import shutil
+import tempfile
+from unittest.mock import patch
+import fakeredis
+from django.test import override_settings
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+from social_app.models import User
+
+
+def access_token(user: User) -> str:
+    """
+    Returns an access token of `user`, as sent by API and socket clients.
+    """
+    return str(AccessToken.for_user(user))
+
+
+class AuthenticatedClientMixin:
+    """
+    Creates `self.user` from the class's `username` and `email`, and
+    an APIClient sending the user's access token as `self.client`.
+    """
+
+    username = 'tester'
+    email = 'tester@gmail.com'
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username=self.username, password='12345', email=self.email)
+        self.authenticate(self.user)
+
+    def authenticate(self, user: User) -> None:
+        """
+        Makes `self.client` send the access token of `user`.
+        """
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f'Bearer {access_token(user)}')
+
+
+class FakeRedisMixin:
+    """
+    Runs code that talks to Redis against an in-process fake server,
+    empty for every test.
+    """
+
+    def use_fake_redis(self, target: str) -> fakeredis.FakeRedis:
+        """
+        Patches `target`, a function returning a Redis connection, to
+        return a fresh fake connection for the rest of the test.
+
+        Args:
+            target: The dotted path of the function to patch.
+
+        Returns:
+            fakeredis.FakeRedis: The connection it now returns.
+        """
+        connection = fakeredis.FakeRedis(server=fakeredis.FakeServer())
+        patcher = patch(target, return_value=connection)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return connection
+
+
+class TemporaryMediaMixin:
+    """
+    Points MEDIA_ROOT at a temporary directory, `cls.media_root`, for
+    the whole test class, set up data included, and removes it after.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.media_root = tempfile.mkdtemp()
+        cls.addClassCleanup(shutil.rmtree, cls.media_root, ignore_errors=True)
+        media = override_settings(MEDIA_ROOT=cls.media_root)
+        media.enable()
+        cls.addClassCleanup(media.disable)
+        super().setUpClass()
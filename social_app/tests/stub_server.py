@@ -0,0 +1,102 @@
+'''
+A local HTTP server standing in for external services in tests
+'''
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+
+class StubResponse:
+    """
+    A canned response: status, JSON or raw body, headers and an
+    optional delay before it is sent.
+    """
+
+    def __init__(self, status=200, body=None, headers=None, delay=0):
+        self.status = status
+        self.body = body
+        self.headers = headers or {}
+        self.delay = delay
+
+    def encode(self) -> bytes:
+        if isinstance(self.body, bytes):
+            return self.body
+        return json.dumps(self.body if self.body is not None else {}).encode()
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def handle_request(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else b''
+        path = urlsplit(self.path).path
+        self.server.stub.requests.append({
+            'method': self.command,
+            'path': self.path,
+            'body': body,
+            'client_port': self.client_address[1],
+        })
+
+        responses = self.server.stub.routes.get(path) or [StubResponse(404)]
+        response = responses.pop(0) if len(responses) > 1 else responses[0]
+        if response.delay:
+            time.sleep(response.delay)
+
+        payload = response.encode()
+        try:
+            self.send_response(response.status)
+            headers = {'Content-Type': 'application/json', **response.headers}
+            for header, value in headers.items():
+                self.send_header(header, value)
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+        except (BrokenPipeError, ConnectionResetError):
+            # the client gave up waiting, e.g. on a read timeout
+            self.close_connection = True
+
+    do_GET = do_POST = handle_request
+
+    def log_message(self, *args):
+        pass
+
+
+class StubServer:
+    """
+    Serves canned responses on 127.0.0.1 from a background thread.
+
+    Usage:
+        with StubServer() as stub:
+            stub.route('/token', StubResponse(503), StubResponse(200, {...}))
+            requests.get(stub.url('/token'))
+            stub.requests  # what was received, in order
+
+    Responses of a route are consumed in order, the last one repeats.
+    """
+
+    def __init__(self):
+        self.routes = {}
+        self.requests = []
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+        self.server.daemon_threads = True
+        self.server.stub = self
+        self.thread = threading.Thread(
+            target=self.server.serve_forever, daemon=True)
+
+    def route(self, path: str, *responses: StubResponse) -> None:
+        self.routes[path] = list(responses)
+
+    def url(self, path: str) -> str:
+        host, port = self.server.server_address
+        return f'http://{host}:{port}{path}'
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.server.shutdown()
+        self.server.server_close()
@@ -0,0 +1,92 @@
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient, APIRequestFactory
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+from social_app.authentication import CachedJWTAuthentication
+from social_app.google_login_flow import generate_tokens_for_user
+from social_app.models import Comment, Post, User
+
+
+class StatelessReadTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username='reader', password='12345', email='reader@gmail.com')
+        access_token, _ = generate_tokens_for_user(self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {access_token}')
+        self.post = Post.objects.create(content='read me', user=self.user)
+
+    def test_tokens_carry_the_username(self):
+        access_token, refresh_token = generate_tokens_for_user(self.user)
+        self.assertEqual(access_token['username'], 'reader')
+        self.assertEqual(refresh_token['username'], 'reader')
+
+    def test_reads_do_not_load_the_user(self):
+        url = reverse('view_comments', kwargs={'post_id': self.post.id})
+        # only the comments are queried
+        with self.assertNumQueries(1):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIsInstance(response.wsgi_request.user, TokenUser)
+        self.assertEqual(response.wsgi_request.user.username, 'reader')
+
+    def test_writes_get_the_full_user(self):
+        url = reverse('create_comment', kwargs={'post_id': self.post.id})
+        response = self.client.post(url, {'content': 'hello'})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Comment.objects.get().user, self.user)
+
+    def test_reads_still_require_a_token(self):
+        self.client.credentials()
+        response = self.client.get(reverse('all_posts'))
+        self.assertEqual(response.status_code, 401)
+
+
+@override_settings(AUTH_USER_CACHE_TIMEOUT=30)
+class CachedJWTAuthenticationTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='cachedauth', password='12345', email='ca@gmail.com')
+        token = AccessToken.for_user(self.user)
+        self.request = APIRequestFactory().get(
+            '/', HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.authentication = CachedJWTAuthentication()
+
+    def test_user_is_loaded_once(self):
+        with self.assertNumQueries(1):
+            self.authentication.authenticate(self.request)
+        with self.assertNumQueries(0):
+            user, _ = self.authentication.authenticate(self.request)
+        self.assertEqual(user, self.user)
+
+    def test_saving_the_user_drops_the_cache(self):
+        self.authentication.authenticate(self.request)
+        self.user.is_active = False
+        self.user.save()
+
+        with self.assertRaises(AuthenticationFailed):
+            self.authentication.authenticate(self.request)
+
+    @override_settings(AUTH_USER_CACHE_TIMEOUT=0)
+    def test_cache_can_be_disabled(self):
+        self.authentication.authenticate(self.request)
+        with self.assertNumQueries(1):
+            self.authentication.authenticate(self.request)
+
+    def test_authenticated_views_use_the_cache(self):
+        client = APIClient()
+        refresh = RefreshToken.for_user(self.user)
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {refresh.access_token}')
+        url = reverse('unread_notifications_count')
+        client.get(url)
+        # the unread count is cached too
+        with self.assertNumQueries(0):
+            response = client.get(url)
+        self.assertEqual(response.data, {'unread': 0})
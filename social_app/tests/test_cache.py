@@ -0,0 +1,81 @@
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+from social_app.cache import post_cache_key
+from social_app.models import Post, Like, Comment, User
+from social_app.tests.base import AuthenticatedClientMixin
+
+
+class PostCacheTest(AuthenticatedClientMixin, TestCase):
+    username = 'cached'
+    email = 'cached@gmail.com'
+
+    def setUp(self):
+        cache.clear()
+        super().setUp()
+        self.other = User.objects.create_user(
+            username='other', password='12345', email='other@gmail.com')
+        self.post = Post.objects.create(content='cached post', user=self.user)
+        self.detail_url = reverse('view_a_post', kwargs={'post_id': self.post.id})
+
+    def test_post_detail_is_cached(self):
+        self.client.get(self.detail_url)
+        self.assertIsNotNone(cache.get(post_cache_key(self.post.id)))
+
+        # reads are authenticated from the token claims alone
+        with self.assertNumQueries(0):
+            response = self.client.get(self.detail_url)
+        self.assertEqual(response.data['content'], 'cached post')
+
+    def test_like_and_comment_invalidate_post_detail(self):
+        self.client.get(self.detail_url)
+        with self.captureOnCommitCallbacks(execute=True):
+            Like.objects.create(post=self.post, user=self.other)
+            Comment.objects.create(
+                post=self.post, user=self.other, content='hey')
+            # a read before the commit cannot re-cache the old counters
+            self.assertIsNotNone(cache.get(post_cache_key(self.post.id)))
+
+        response = self.client.get(self.detail_url)
+        self.assertEqual(response.data['likes_count'], 1)
+        self.assertEqual(response.data['comments_count'], 1)
+
+    def test_feed_page_is_cached_until_posts_change(self):
+        url = reverse('all_posts')
+        self.client.get(url)
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertEqual(len(response.data['results']), 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Post.objects.create(content='fresh post', user=self.other)
+        response = self.client.get(url)
+        self.assertEqual(len(response.data['results']), 2)
+
+    def test_like_keeps_feed_page_and_refreshes_its_post(self):
+        url = reverse('all_posts')
+        self.client.get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            Like.objects.create(post=self.post, user=self.other)
+
+        # the page's ids are still cached; only the post is reloaded
+        with self.assertNumQueries(1):
+            response = self.client.get(url)
+        self.assertEqual(response.data['results'][0]['likes_count'], 1)
+
+    def test_username_change_invalidates_authored_posts(self):
+        self.client.get(self.detail_url)
+        self.user.username = 'renamed'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.save()
+
+        response = self.client.get(self.detail_url)
+        self.assertEqual(response.data['user']['username'], 'renamed')
+
+    def test_saves_without_a_rename_keep_authored_posts(self):
+        self.client.get(self.detail_url)
+        with self.assertNumQueries(1):
+            self.user.save(update_fields=['last_login'])
+        with self.assertNumQueries(1):
+            self.user.save()
+        self.assertIsNotNone(cache.get(post_cache_key(self.post.id)))
@@ -0,0 +1,41 @@
+from io import StringIO
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase
+from social_app.cache import post_cache_key
+from social_app.hydration import hydrate_posts
+from social_app.models import User, Post, Like, Comment
+
+
+class ReconcilePostCountersTest(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='counter', password='12345', email='counter@gmail.com')
+        self.post = Post.objects.create(user=self.user, content='drifting')
+        Like.objects.create(post=self.post, user=self.user)
+        Comment.objects.create(post=self.post, user=self.user, content='hi')
+        Post.objects.filter(pk=self.post.pk).update(
+            likes_count=7, comments_count=0)
+
+    def test_dry_run_only_reports(self):
+        out = StringIO()
+        call_command('reconcile_post_counters', '--dry-run', stdout=out)
+        self.assertIn('1 post(s) have drifted', out.getvalue())
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.likes_count, 7)
+
+    def test_fixes_drifted_counters(self):
+        out = StringIO()
+        call_command('reconcile_post_counters', stdout=out)
+        self.assertIn('Reconciled counters on 1 post(s)', out.getvalue())
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.likes_count, 1)
+        self.assertEqual(self.post.comments_count, 1)
+
+    def test_drops_cached_drifted_posts(self):
+        cache.clear()
+        hydrate_posts([self.post.id])
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('reconcile_post_counters', stdout=StringIO())
+        self.assertIsNone(cache.get(post_cache_key(self.post.id)))
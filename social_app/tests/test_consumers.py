@@ -0,0 +1,206 @@
+from datetime import timedelta
+from unittest.mock import patch
+from urllib.parse import urlencode
+from channels.layers import get_channel_layer
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.contrib.auth.models import AnonymousUser
+from django.test import TestCase, TransactionTestCase
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import AccessToken
+from social_app.consumers import NotificationConsumer, user_group_name
+from social_app.middleware import JWTAuthMiddleware, validate_token
+from social_app.models import User, Notification
+from social_app.routing import websocket_urlpatterns
+from social_app.tests.base import access_token
+
+
+class NotificationConsumerTest(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='socket', password='12345', email='socket@gmail.com')
+
+    def communicator(self, user):
+        communicator = WebsocketCommunicator(
+            NotificationConsumer.as_asgi(), '/ws/notify/')
+        communicator.scope['user'] = user
+        return communicator
+
+    async def test_authenticated_user_connects(self):
+        communicator = self.communicator(self.user)
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        await communicator.disconnect()
+
+    async def test_anonymous_user_is_rejected(self):
+        communicator = self.communicator(AnonymousUser())
+        connected, _ = await communicator.connect()
+        self.assertFalse(connected)
+
+    async def test_notification_reaches_every_connection(self):
+        first = self.communicator(self.user)
+        second = self.communicator(self.user)
+        await first.connect()
+        await second.connect()
+
+        await get_channel_layer().group_send(user_group_name(self.user.id), {
+            'type': 'send_notification',
+            'message': {'message': 'john liked your post'},
+        })
+        for communicator in (first, second):
+            response = await communicator.receive_json_from()
+            self.assertEqual(
+                response, {'message': {'message': 'john liked your post'}})
+
+        await first.disconnect()
+        await second.disconnect()
+
+    async def test_disconnected_socket_leaves_group(self):
+        communicator = self.communicator(self.user)
+        await communicator.connect()
+        await communicator.disconnect()
+
+        await get_channel_layer().group_send(user_group_name(self.user.id), {
+            'type': 'send_notification',
+            'message': {'message': 'too late'},
+        })
+        self.assertTrue(await communicator.receive_nothing())
+
+
+class JWTAuthMiddlewareTest(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='jwtsocket', password='12345', email='jwt@gmail.com')
+        self.token = access_token(self.user)
+        self.application = JWTAuthMiddleware(URLRouter(websocket_urlpatterns))
+
+    async def test_token_in_query_string(self):
+        communicator = WebsocketCommunicator(
+            self.application, f'/ws/notify/?token={self.token}')
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+
+        await get_channel_layer().group_send(user_group_name(self.user.id), {
+            'type': 'send_notification',
+            'message': {'message': 'hello'},
+        })
+        response = await communicator.receive_json_from()
+        self.assertEqual(response, {'message': {'message': 'hello'}})
+        await communicator.disconnect()
+
+    async def test_token_as_subprotocol(self):
+        communicator = WebsocketCommunicator(
+            self.application, '/ws/notify/',
+            subprotocols=['bearer', self.token])
+        connected, subprotocol = await communicator.connect()
+        self.assertTrue(connected)
+        self.assertEqual(subprotocol, 'bearer')
+        await communicator.disconnect()
+
+    async def test_invalid_token_is_rejected(self):
+        communicator = WebsocketCommunicator(
+            self.application, f'/ws/notify/?token={self.token}x')
+        connected, _ = await communicator.connect()
+        self.assertFalse(connected)
+
+    async def test_missing_token_is_rejected(self):
+        communicator = WebsocketCommunicator(self.application, '/ws/notify/')
+        connected, _ = await communicator.connect()
+        self.assertFalse(connected)
+
+    async def test_expired_memoized_token_is_rejected(self):
+        token = AccessToken.for_user(self.user)
+        token.set_exp(lifetime=timedelta(seconds=5))
+        raw = str(token)
+        self.assertIsNotNone(validate_token(raw))
+
+        with patch('social_app.middleware.time.time',
+                   return_value=token['exp'] + 1):
+            communicator = WebsocketCommunicator(
+                self.application, f'/ws/notify/?token={raw}')
+            connected, _ = await communicator.connect()
+        self.assertFalse(connected)
+
+
+class NotificationReplayTest(TransactionTestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='offline', password='12345', email='offline@gmail.com')
+        self.actor = User.objects.create_user(
+            username='actor', password='12345', email='actor@gmail.com')
+        self.old = Notification.objects.create(
+            user=self.actor, created_for=self.user, message='seen before')
+        Notification.objects.filter(pk=self.old.pk).update(
+            created_at=timezone.now() - timedelta(hours=1))
+        self.missed = [
+            Notification.objects.create(
+                user=self.actor, created_for=self.user, message=f'missed {i}')
+            for i in range(5)]
+        Notification.objects.create(
+            user=self.actor, created_for=self.user, message='already read',
+            read=True)
+
+    def communicator(self, query=''):
+        communicator = WebsocketCommunicator(
+            NotificationConsumer.as_asgi(), f'/ws/notify/{query}')
+        communicator.scope['user'] = self.user
+        return communicator
+
+    async def receive_all(self, communicator):
+        messages = []
+        while not await communicator.receive_nothing():
+            response = await communicator.receive_json_from()
+            messages.append([n['message'] for n in response['message']])
+        return messages
+
+    async def test_replays_unread_since_last_seen_in_batches(self):
+        since = (timezone.now() - timedelta(minutes=30)).isoformat()
+        communicator = self.communicator(f'?{urlencode({"since": since})}')
+        with patch.object(NotificationConsumer, 'replay_batch_size', 2):
+            await communicator.connect()
+            batches = await self.receive_all(communicator)
+        self.assertEqual(batches, [
+            ['missed 4', 'missed 3'], ['missed 2', 'missed 1'], ['missed 0']])
+        await communicator.disconnect()
+
+    async def test_replays_every_unread_without_timestamp(self):
+        communicator = self.communicator()
+        await communicator.connect()
+        batches = await self.receive_all(communicator)
+        self.assertEqual(
+            batches, [[f'missed {i}' for i in range(4, -1, -1)] + ['seen before']])
+        await communicator.disconnect()
+
+    async def test_malformed_timestamp_replays_nothing(self):
+        for since in ('garbage', '2024-13-45T99:00:00Z'):
+            communicator = self.communicator(f'?{urlencode({"since": since})}')
+            connected, _ = await communicator.connect()
+            self.assertTrue(connected)
+            self.assertTrue(await communicator.receive_nothing())
+            await communicator.disconnect()
+
+    async def test_replay_is_capped(self):
+        communicator = self.communicator()
+        with patch.object(NotificationConsumer, 'replay_batch_size', 2), \
+                patch.object(NotificationConsumer, 'replay_limit', 3):
+            await communicator.connect()
+            batches = await self.receive_all(communicator)
+        self.assertEqual(batches, [['missed 4', 'missed 3'], ['missed 2']])
+        await communicator.disconnect()
+
+    async def test_replay_resumes_from_a_pushed_timestamp(self):
+        communicator = self.communicator()
+        with patch.object(NotificationConsumer, 'replay_limit', 3):
+            await communicator.connect()
+            response = await communicator.receive_json_from()
+        await communicator.disconnect()
+        since = response['message'][-1]['timestamp']
+
+        communicator = self.communicator(f'?{urlencode({"since": since})}')
+        await communicator.connect()
+        batches = await self.receive_all(communicator)
+        self.assertEqual(batches, [['missed 4', 'missed 3']])
+        await communicator.disconnect()
@@ -0,0 +1,158 @@
+import time
+from unittest.mock import patch
+import requests
+from django.test import SimpleTestCase, override_settings
+from social_app.google_login_flow import (
+    GoogleAccessTokens, GoogleRawLoginFlowService)
+from social_app.http_client import build_session, get_http_session
+from social_app.tests.stub_server import StubResponse, StubServer
+
+
+@override_settings(
+    HTTP_CLIENT_TIMEOUT=(1, 0.5),
+    HTTP_CLIENT_RETRIES=2,
+    HTTP_CLIENT_BACKOFF_FACTOR=0)
+class HttpSessionTest(SimpleTestCase):
+
+    def setUp(self):
+        self.stub = StubServer().__enter__()
+        self.addCleanup(self.stub.__exit__)
+        self.session = build_session()
+        self.addCleanup(self.session.close)
+
+    def test_get_is_retried_on_transient_errors(self):
+        self.stub.route(
+            '/info', StubResponse(503), StubResponse(502),
+            StubResponse(200, {'ok': True}))
+        response = self.session.get(self.stub.url('/info'))
+
+        self.assertEqual(response.json(), {'ok': True})
+        self.assertEqual(len(self.stub.requests), 3)
+
+    def test_post_is_not_retried_after_it_was_sent(self):
+        self.stub.route('/token', StubResponse(503), StubResponse(200))
+        response = self.session.post(self.stub.url('/token'), data={'a': 1})
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(len(self.stub.requests), 1)
+
+    def test_read_timeout(self):
+        self.stub.route('/slow', StubResponse(200, delay=2))
+        started = time.monotonic()
+        with self.assertRaises(requests.exceptions.ReadTimeout):
+            self.session.post(self.stub.url('/slow'))
+        self.assertLess(time.monotonic() - started, 1.5)
+
+    def test_connections_are_kept_alive(self):
+        self.stub.route('/info', StubResponse(200))
+        for _ in range(3):
+            self.session.get(self.stub.url('/info'))
+
+        ports = {request['client_port'] for request in self.stub.requests}
+        self.assertEqual(len(ports), 1)
+
+    def test_session_is_shared(self):
+        self.assertIs(get_http_session(), get_http_session())
+
+
+class GoogleRawLoginFlowServiceTest(SimpleTestCase):
+
+    def setUp(self):
+        environ = patch.dict('os.environ', {
+            'GOOGLE_OAUTH2_CLIENT_ID': 'client-id',
+            'GOOGLE_OAUTH2_CLIENT_SECRET': 'client-secret'})
+        environ.start()
+        self.addCleanup(environ.stop)
+        self.stub = StubServer().__enter__()
+        self.addCleanup(self.stub.__exit__)
+        self.service = GoogleRawLoginFlowService()
+        self.service.GOOGLE_ACCESS_TOKEN_OBTAIN_URL = self.stub.url('/token')
+        self.service.GOOGLE_USER_INFO_URL = self.stub.url('/userinfo')
+
+    def test_get_tokens(self):
+        self.stub.route('/token', StubResponse(
+            200, {'id_token': 'id', 'access_token': 'access'}))
+        tokens = self.service.get_tokens(code='the-code')
+
+        self.assertEqual(tokens, GoogleAccessTokens('id', 'access'))
+        self.assertIn(b'code=the-code', self.stub.requests[0]['body'])
+
+    def test_get_tokens_failure(self):
+        self.stub.route('/token', StubResponse(400, {'error': 'invalid_grant'}))
+        with self.assertRaises(ValueError):
+            self.service.get_tokens(code='used-code')
+
+    def test_get_user_info(self):
+        self.stub.route('/userinfo', StubResponse(
+            200, {'email': 'me@example.com'}))
+        info = self.service.get_user_info(
+            google_tokens=GoogleAccessTokens('id', 'access'))
+
+        self.assertEqual(info, {'email': 'me@example.com'})
+        self.assertEqual(
+            self.stub.requests[0]['path'], '/userinfo?access_token=access')
+
+    def test_unreachable_google_is_a_value_error(self):
+        self.stub.__exit__()
+        with self.assertRaises(ValueError):
+            self.service.get_user_info(
+                google_tokens=GoogleAccessTokens('id', 'access'))
+
+
+class AsyncGoogleRawLoginFlowServiceTest(SimpleTestCase):
+
+    def setUp(self):
+        environ = patch.dict('os.environ', {
+            'GOOGLE_OAUTH2_CLIENT_ID': 'client-id',
+            'GOOGLE_OAUTH2_CLIENT_SECRET': 'client-secret'})
+        environ.start()
+        self.addCleanup(environ.stop)
+        self.stub = StubServer().__enter__()
+        self.addCleanup(self.stub.__exit__)
+        self.service = GoogleRawLoginFlowService()
+        self.service.GOOGLE_ACCESS_TOKEN_OBTAIN_URL = self.stub.url('/token')
+        self.service.GOOGLE_USER_INFO_URL = self.stub.url('/userinfo')
+
+    async def test_aget_tokens_without_id_token(self):
+        self.stub.route('/token', StubResponse(200, {'access_token': 'access'}))
+        with self.assertRaisesMessage(
+                ValueError, 'Failed to obtain access token from Google.'):
+            await self.service.aget_tokens(code='the-code')
+
+    async def test_aget_tokens_with_a_non_json_body(self):
+        self.stub.route('/token', StubResponse(200, b'<html>oops</html>'))
+        with self.assertRaisesMessage(
+                ValueError, 'Failed to obtain access token from Google.'):
+            await self.service.aget_tokens(code='the-code')
+
+    async def test_aget_tokens(self):
+        self.stub.route('/token', StubResponse(
+            200, {'id_token': 'id', 'access_token': 'access'}))
+        tokens = await self.service.aget_tokens(code='the-code')
+
+        self.assertEqual(tokens, GoogleAccessTokens('id', 'access'))
+        self.assertIn(b'code=the-code', self.stub.requests[0]['body'])
+
+    @override_settings(HTTP_CLIENT_BACKOFF_FACTOR=0)
+    async def test_aget_tokens_is_not_retried(self):
+        self.stub.route('/token', StubResponse(503), StubResponse(200))
+        with self.assertRaises(ValueError):
+            await self.service.aget_tokens(code='the-code')
+        self.assertEqual(len(self.stub.requests), 1)
+
+    @override_settings(HTTP_CLIENT_BACKOFF_FACTOR=0)
+    async def test_aget_user_info_retries_transient_errors(self):
+        self.stub.route(
+            '/userinfo', StubResponse(503),
+            StubResponse(200, {'email': 'me@example.com'}))
+        info = await self.service.aget_user_info(
+            google_tokens=GoogleAccessTokens('id', 'access'))
+
+        self.assertEqual(info, {'email': 'me@example.com'})
+        self.assertEqual(len(self.stub.requests), 2)
+
+    async def test_unreachable_google_is_a_value_error(self):
+        self.stub.__exit__()
+        with self.assertRaises(ValueError):
+            await self.service.aget_user_info(
+                google_tokens=GoogleAccessTokens('id', 'access'))
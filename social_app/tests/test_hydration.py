@@ -0,0 +1,59 @@
+import uuid
+from django.core.cache import cache
+from django.test import TestCase
+from social_app.cache import post_cache_key
+from social_app.hydration import hydrate_posts
+from social_app.models import Comment, Like, Post, User
+
+
+class HydratePostsTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='hydrated', password='12345', email='hydrated@gmail.com')
+        self.posts = [
+            Post.objects.create(content=f'post {i}', user=self.user)
+            for i in range(4)]
+
+    def test_preserves_order_and_skips_missing(self):
+        ids = [self.posts[2].id, uuid.uuid4(), str(self.posts[0].id),
+               self.posts[3].id]
+        posts = hydrate_posts(ids)
+        self.assertEqual(
+            [post.pk for post in posts],
+            [self.posts[2].id, self.posts[0].id, self.posts[3].id])
+
+    def test_loads_misses_with_one_query_and_writes_them_back(self):
+        hydrate_posts([self.posts[0].id])
+        ids = [post.id for post in self.posts]
+
+        with self.assertNumQueries(1):
+            posts = hydrate_posts(ids)
+        self.assertTrue(all(
+            cache.get(post_cache_key(post_id)) for post_id in ids))
+
+        # authors come with the posts
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                [post.user.username for post in posts], ['hydrated'] * 4)
+            hydrate_posts(ids)
+
+    def test_cached_rows_hold_only_the_serialized_columns(self):
+        Comment.objects.create(
+            post=self.posts[0], user=self.user, content='first')
+        hydrate_posts([self.posts[0].id])
+
+        post = cache.get(post_cache_key(self.posts[0].id))
+        comment, = post.comment_preview
+        for user in (post.user, comment.user):
+            self.assertEqual(user.username, 'hydrated')
+            self.assertNotIn('password', user.__dict__)
+            self.assertNotIn('email', user.__dict__)
+
+    def test_invalidated_post_is_reloaded(self):
+        hydrate_posts([self.posts[0].id])
+        with self.captureOnCommitCallbacks(execute=True):
+            Like.objects.create(post=self.posts[0], user=self.user)
+        post, = hydrate_posts([self.posts[0].id])
+        self.assertEqual(post.likes_count, 1)
@@ -0,0 +1,77 @@
+from io import BytesIO
+from unittest.mock import patch
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+from social_app.models import Post
+from social_app.tasks import generate_post_thumbnails
+from social_app.tests.base import AuthenticatedClientMixin, TemporaryMediaMixin
+
+
+def make_image(width, height, name='photo.png'):
+    buffer = BytesIO()
+    Image.new('RGBA', (width, height), (255, 0, 0, 128)).save(buffer, 'PNG')
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/png')
+
+
+@override_settings(IMAGE_THUMBNAIL_WIDTHS=[160, 320, 640])
+class ThumbnailTest(TemporaryMediaMixin, AuthenticatedClientMixin, TestCase):
+    username = 'photographer'
+    email = 'photo@gmail.com'
+
+    def setUp(self):
+        cache.clear()
+        super().setUp()
+
+    def test_post_picture_gets_narrower_thumbnails(self):
+        post = Post.objects.create(
+            content='wide', user=self.user, pics=make_image(500, 250))
+        post.refresh_from_db()
+
+        sizes = post.pics_thumbnails['sizes']
+        self.assertEqual(sorted(sizes), ['160', '320'])
+        self.assertEqual(post.pics_thumbnails['source'], post.pics.name)
+        with post.pics.storage.open(sizes['320']['webp']) as thumbnail:
+            self.assertEqual(Image.open(thumbnail).size, (320, 160))
+        with post.pics.storage.open(sizes['160']['jpeg']) as thumbnail:
+            self.assertEqual(Image.open(thumbnail).format, 'JPEG')
+
+    def test_thumbnails_are_exposed_by_the_post_api(self):
+        post = Post.objects.create(
+            content='wide', user=self.user, pics=make_image(400, 400))
+        response = self.client.get(
+            reverse('view_a_post', kwargs={'post_id': post.id}))
+
+        thumbnails = response.data['thumbnails']
+        self.assertEqual(sorted(thumbnails), ['160', '320'])
+        self.assertRegex(
+            thumbnails['160']['webp'], r'/media/images/[0-9a-f]{2}/\w+\.webp$')
+
+    def test_pending_thumbnails_are_queued_once(self):
+        with patch('social_app.signals.enqueue') as enqueue:
+            post = Post.objects.create(
+                content='wide', user=self.user, pics=make_image(500, 250))
+            post.content = 'edited'
+            post.save()
+        jobs = [call.args[1] for call in enqueue.call_args_list]
+        self.assertEqual(jobs.count(generate_post_thumbnails), 1)
+
+    def test_unreadable_picture_has_no_thumbnails(self):
+        image_file = SimpleUploadedFile(
+            'broken.jpg', b'file_content', content_type='image/jpeg')
+        post = Post.objects.create(content='bad', user=self.user, pics=image_file)
+        post.refresh_from_db()
+        self.assertEqual(post.pics_thumbnails['sizes'], {})
+
+    def test_profile_picture_thumbnails(self):
+        url = reverse('edit_profile', kwargs={'user_id': self.user.id})
+        self.client.put(
+            url, {'profile_pic': make_image(700, 350)}, format='multipart')
+
+        response = self.client.get(
+            reverse('view_profile', kwargs={'user_id': self.user.id}))
+        self.assertEqual(
+            sorted(response.data['profile_pic_thumbnails']),
+            ['160', '320', '640'])
@@ -0,0 +1,171 @@
+import time
+from unittest.mock import patch
+import jwt
+from cryptography.hazmat.primitives.asymmetric import rsa
+from django.test import SimpleTestCase, override_settings
+from jwt.algorithms import RSAAlgorithm
+from social_app.google_login_flow import GoogleAccessTokens
+from social_app.jwks import JWKSCache
+from social_app.tests.stub_server import StubResponse, StubServer
+
+
+def make_key(kid):
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    jwk = RSAAlgorithm.to_jwk(private_key.public_key(), as_dict=True)
+    jwk.update({'kid': kid, 'alg': 'RS256', 'use': 'sig'})
+    return private_key, jwk
+
+
+def sign(private_key, kid, **claims):
+    now = int(time.time())
+    payload = {
+        'iss': 'https://accounts.google.com',
+        'aud': 'client-id',
+        'iat': now,
+        'exp': now + 3600,
+        'email': 'me@example.com',
+        **claims,
+    }
+    return jwt.encode(
+        payload, private_key, algorithm='RS256', headers={'kid': kid})
+
+
+@override_settings(JWKS_DEFAULT_MAX_AGE=3600, JWKS_MIN_REFRESH_INTERVAL=60)
+class JWKSCacheTest(SimpleTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.private_key, cls.jwk = make_key('key-1')
+        cls.rotated_key, cls.rotated_jwk = make_key('key-2')
+
+    def setUp(self):
+        self.stub = StubServer().__enter__()
+        self.addCleanup(self.stub.__exit__)
+        self.jwks = JWKSCache(self.stub.url('/certs'))
+        patcher = patch('social_app.google_login_flow.google_jwks', self.jwks)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def serve(self, *jwks, cache_control='public, max-age=600'):
+        self.stub.route('/certs', StubResponse(
+            200, {'keys': list(jwks)}, {'Cache-Control': cache_control}))
+
+    def decode(self, token):
+        return GoogleAccessTokens(token, 'access').decode_id_token('client-id')
+
+    def test_valid_token_is_decoded(self):
+        self.serve(self.jwk)
+        claims = self.decode(sign(self.private_key, 'key-1'))
+        self.assertEqual(claims['email'], 'me@example.com')
+
+    def test_keys_are_fetched_once_within_max_age(self):
+        self.serve(self.jwk)
+        for _ in range(3):
+            self.decode(sign(self.private_key, 'key-1'))
+
+        self.assertEqual(len(self.stub.requests), 1)
+        self.assertAlmostEqual(
+            self.jwks.expires_at - self.jwks.fetched_at, 600)
+
+    def test_forged_signature_is_rejected(self):
+        self.serve(self.jwk)
+        with self.assertRaisesMessage(ValueError, 'Invalid ID token.'):
+            self.decode(sign(self.rotated_key, 'key-1'))
+
+    def test_wrong_audience_and_issuer_are_rejected(self):
+        self.serve(self.jwk)
+        with self.assertRaisesMessage(ValueError, 'Invalid audience.'):
+            self.decode(sign(self.private_key, 'key-1', aud='someone-else'))
+        with self.assertRaises(ValueError):
+            self.decode(sign(self.private_key, 'key-1', iss='evil.example'))
+
+    def test_unsigned_token_is_rejected(self):
+        self.serve(self.jwk)
+        token = jwt.encode(
+            {'aud': 'client-id'}, key=None, algorithm='none',
+            headers={'kid': 'key-1'})
+        with self.assertRaises(ValueError):
+            self.decode(token)
+
+    def test_rotated_key_triggers_a_fetch(self):
+        self.serve(self.jwk)
+        self.decode(sign(self.private_key, 'key-1'))
+        self.jwks.fetched_at -= 60
+
+        self.serve(self.jwk, self.rotated_jwk)
+        claims = self.decode(sign(self.rotated_key, 'key-2'))
+        self.assertEqual(claims['email'], 'me@example.com')
+        self.assertEqual(len(self.stub.requests), 2)
+
+    def test_unknown_kids_are_rate_limited(self):
+        self.serve(self.jwk)
+        self.decode(sign(self.private_key, 'key-1'))
+        for _ in range(3):
+            with self.assertRaises(ValueError):
+                self.decode(sign(self.private_key, 'made-up'))
+        self.assertEqual(len(self.stub.requests), 1)
+
+    def test_expired_keys_are_served_while_refreshing(self):
+        self.serve(self.jwk)
+        self.decode(sign(self.private_key, 'key-1'))
+        self.jwks.expires_at = 0
+
+        with patch.object(self.jwks, 'refresh_in_background') as refresh:
+            self.decode(sign(self.private_key, 'key-1'))
+        refresh.assert_called_once_with()
+
+    def test_background_refresh_updates_the_keys(self):
+        self.serve(self.jwk, cache_control='no-cache')
+        self.jwks.refresh()
+        self.assertAlmostEqual(
+            self.jwks.expires_at - self.jwks.fetched_at, 3600)
+
+        self.serve(self.jwk, self.rotated_jwk)
+        self.jwks.refresh_in_background()
+        deadline = time.monotonic() + 5
+        while 'key-2' not in self.jwks.keys and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertIn('key-2', self.jwks.keys)
+
+    def test_failed_fetch_keeps_cached_keys(self):
+        self.serve(self.jwk)
+        self.jwks.refresh()
+        self.stub.route('/certs', StubResponse(404))
+        with self.assertLogs('social_app.jwks', 'WARNING'):
+            self.jwks.refresh()
+
+        self.assertIn('key-1', self.jwks.keys)
+        claims = self.decode(sign(self.private_key, 'key-1'))
+        self.assertEqual(claims['email'], 'me@example.com')
+
+    def test_failed_refresh_is_not_retried_within_min_interval(self):
+        self.serve(self.jwk)
+        self.jwks.refresh()
+        self.jwks.expires_at = 0
+        self.stub.route('/certs', StubResponse(500))
+        with self.assertLogs('social_app.jwks', 'WARNING'):
+            self.jwks.refresh()
+
+        with patch.object(self.jwks, 'refresh_in_background') as refresh:
+            for _ in range(3):
+                self.decode(sign(self.private_key, 'key-1'))
+        refresh.assert_not_called()
+        self.assertAlmostEqual(
+            self.jwks.expires_at - self.jwks.fetched_at, 60)
+
+    def test_cached_keys_do_not_wait_on_a_slow_refresh(self):
+        self.serve(self.jwk)
+        self.jwks.refresh()
+        self.jwks.expires_at = 0
+        self.stub.route('/certs', StubResponse(
+            200, {'keys': [self.jwk]}, delay=1))
+
+        started = time.monotonic()
+        for _ in range(3):
+            self.jwks.get_signing_key('key-1')
+        self.assertLess(time.monotonic() - started, 0.5)
+
+        self.assertTrue(self.jwks.refreshing.acquire(timeout=5))
+        self.jwks.refreshing.release()
+        self.assertEqual(len(self.stub.requests), 2)
@@ -0,0 +1,109 @@
+import os
+from django.core.files.base import ContentFile
+from django.test import TestCase, override_settings
+from django.utils.http import http_date
+from social_app.storage import media_storage
+from social_app.tests.base import TemporaryMediaMixin
+
+
+CONTENT = bytes(range(256)) * 4
+
+
+@override_settings(MEDIA_SENDFILE_BACKEND=None)
+class ServeMediaTest(TemporaryMediaMixin, TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.blob = media_storage.save('images/a.png', ContentFile(CONTENT))
+        with open(os.path.join(cls.media_root, 'legacy.png'), 'wb') as legacy:
+            legacy.write(CONTENT)
+
+    def test_blob_is_served_with_immutable_caching(self):
+        response = self.client.get(f'/media/{self.blob}')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), CONTENT)
+        self.assertEqual(response['Content-Type'], 'image/png')
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        digest = self.blob.rsplit('/', 1)[1].split('.')[0]
+        self.assertEqual(response['ETag'], f'"{digest}"')
+        self.assertIn('immutable', response['Cache-Control'])
+
+    def test_other_files_are_revalidated(self):
+        response = self.client.get('/media/legacy.png')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('immutable', response['Cache-Control'])
+        self.assertIn('Last-Modified', response)
+        response.close()
+
+    def test_matching_etag_is_not_modified(self):
+        etag = self.client.get(f'/media/{self.blob}')['ETag']
+        response = self.client.get(
+            f'/media/{self.blob}', HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual(response.content, b'')
+
+    def test_if_modified_since_is_not_modified(self):
+        mtime = os.stat(os.path.join(self.media_root, 'legacy.png')).st_mtime
+        response = self.client.get(
+            '/media/legacy.png', HTTP_IF_MODIFIED_SINCE=http_date(mtime))
+        self.assertEqual(response.status_code, 304)
+
+    def test_byte_range(self):
+        response = self.client.get(
+            f'/media/{self.blob}', HTTP_RANGE='bytes=10-19')
+
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b''.join(response.streaming_content), CONTENT[10:20])
+        self.assertEqual(
+            response['Content-Range'], f'bytes 10-19/{len(CONTENT)}')
+        self.assertEqual(response['Content-Length'], '10')
+
+    def test_suffix_range(self):
+        response = self.client.get(
+            f'/media/{self.blob}', HTTP_RANGE='bytes=-5')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b''.join(response.streaming_content), CONTENT[-5:])
+
+    def test_unsatisfiable_range(self):
+        response = self.client.get(
+            f'/media/{self.blob}', HTTP_RANGE=f'bytes={len(CONTENT)}-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], f'bytes */{len(CONTENT)}')
+
+    def test_stale_if_range_sends_whole_file(self):
+        response = self.client.get(
+            f'/media/{self.blob}', HTTP_RANGE='bytes=0-9',
+            HTTP_IF_RANGE='"stale"')
+        self.assertEqual(response.status_code, 200)
+        response.close()
+
+    def test_path_traversal_is_not_found(self):
+        response = self.client.get('/media/../manage.py')
+        self.assertEqual(response.status_code, 404)
+        response = self.client.get('/media/images')
+        self.assertEqual(response.status_code, 404)
+
+    def test_only_safe_methods(self):
+        response = self.client.post(f'/media/{self.blob}')
+        self.assertEqual(response.status_code, 405)
+
+    @override_settings(
+        MEDIA_SENDFILE_BACKEND='nginx', MEDIA_SENDFILE_URL='/protected/')
+    def test_nginx_handoff(self):
+        response = self.client.get(f'/media/{self.blob}')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Accel-Redirect'], f'/protected/{self.blob}')
+        self.assertEqual(response.content, b'')
+        self.assertIn('immutable', response['Cache-Control'])
+
+    @override_settings(MEDIA_SENDFILE_BACKEND='xsendfile')
+    def test_xsendfile_handoff(self):
+        response = self.client.get('/media/legacy.png')
+        self.assertEqual(
+            response['X-Sendfile'], os.path.join(self.media_root, 'legacy.png'))
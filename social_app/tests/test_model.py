@@ -3,7 +3,6 @@ from social_app.models import User
 from django.core.files.uploadedfile import SimpleUploadedFile
 from social_app.models import Post, Comment, Like, Profile, Notification
 from django.db.utils import IntegrityError
-from django.db.transaction import TransactionManagementError
 import uuid
 from django.db.utils import IntegrityError
 from .test_views import get_temporary_image
@@ -51,7 +50,9 @@ class BaseModelTest(TestCase):
         # Test required fields
         with self.assertRaises(IntegrityError):
             Post.objects.create(content=None, user=self.user)
-        with self.assertRaises(TransactionManagementError):
+        # each save runs in its own savepoint, so a failed one leaves
+        # the test's transaction usable
+        with self.assertRaises(IntegrityError):
             Post.objects.create(content="Valid content", user=None)
 
 
@@ -127,6 +128,26 @@ class LikeModelTest(TestCase):
         """
         self.assertEqual(self.post.content, "Sample post content")
 
+    def test_user_can_like_post_only_once(self):
+        """
+        Test that a second like by the same user violates the constraint.
+        """
+        with self.assertRaises(IntegrityError):
+            Like.objects.create(post=self.post, user=self.user)
+
+    def test_toggle_removes_existing_like(self):
+        """
+        Test that toggling an existing like deletes it and updates the counter.
+        """
+        liked, likes_count = Like.objects.toggle(self.post, self.user)
+        self.assertFalse(liked)
+        self.assertEqual(likes_count, 0)
+        self.assertFalse(Like.objects.filter(pk=self.like.pk).exists())
+
+        liked, likes_count = Like.objects.toggle(self.post, self.user)
+        self.assertTrue(liked)
+        self.assertEqual(likes_count, 1)
+
 
 class ProfileModelTest(TestCase):
 
@@ -171,16 +192,16 @@ class NotificationModelTest(TestCase):
     def test_notification_creation(self):
         notification = Notification.objects.create(
             user=self.user,
-            created_for=self.user.id,
+            created_for=self.user,
             message='This is a test notification'
         )
-        self.assertEqual(notification.created_for, self.user.id)
+        self.assertEqual(notification.created_for, self.user)
         self.assertEqual(notification.message, 'This is a test notification')
     
     def test_string_representation(self):
         notification = Notification.objects.create(
             user=self.user,
-            created_for=self.user.id,
+            created_for=self.user,
             message='This is another test notification'
         )
         # Check the string representation of the notification
@@ -190,7 +211,15 @@ class NotificationModelTest(TestCase):
         with self.assertRaises(IntegrityError):
             Notification.objects.create(
                 user=self.user,
-                created_for=self.user.username,
+                created_for=self.user,
                 message=None
             )
 
+    def test_inbox_relation(self):
+        notification = Notification.objects.create(
+            user=self.user,
+            created_for=self.user,
+            message='Inbox notification'
+        )
+        self.assertIn(notification, self.user.notifications.filter(read=False))
+
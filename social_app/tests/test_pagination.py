@@ -0,0 +1,62 @@
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+from social_app.models import Post
+from social_app.tests.base import AuthenticatedClientMixin
+
+
+class KeysetPaginationTest(AuthenticatedClientMixin, TestCase):
+    username = 'pager'
+    email = 'pager@gmail.com'
+
+    def setUp(self):
+        cache.clear()
+        super().setUp()
+        self.posts = [
+            Post.objects.create(content=f'post {i}', user=self.user)
+            for i in range(5)]
+        self.url = reverse('all_posts')
+
+    def contents(self, response):
+        return [post['content'] for post in response.json()['results']]
+
+    def test_walks_forward_through_pages(self):
+        response = self.client.get(self.url, {'page_size': 2})
+        self.assertEqual(self.contents(response), ['post 0', 'post 1'])
+        self.assertIsNone(response.json()['previous'])
+
+        response = self.client.get(response.json()['next'])
+        self.assertEqual(self.contents(response), ['post 2', 'post 3'])
+
+        response = self.client.get(response.json()['next'])
+        self.assertEqual(self.contents(response), ['post 4'])
+        self.assertIsNone(response.json()['next'])
+
+    def test_previous_link_returns_earlier_page(self):
+        response = self.client.get(self.url, {'page_size': 2})
+        response = self.client.get(response.json()['next'])
+        response = self.client.get(response.json()['previous'])
+        self.assertEqual(self.contents(response), ['post 0', 'post 1'])
+
+    def test_posts_sharing_a_timestamp_are_not_skipped(self):
+        Post.objects.update(created_at=self.posts[0].created_at)
+        seen = []
+        url = f'{self.url}?page_size=2'
+        while url:
+            data = self.client.get(url).json()
+            seen.extend(post['id'] for post in data['results'])
+            url = data['next']
+        self.assertEqual(len(seen), 5)
+        self.assertEqual(len(set(seen)), 5)
+
+    def test_count_can_be_skipped(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.json()['count'], 5)
+
+        response = self.client.get(self.url, {'count': 'false'})
+        self.assertNotIn('count', response.json())
+        self.assertEqual(len(response.json()['results']), 5)
+
+    def test_tampered_cursor_is_rejected(self):
+        response = self.client.get(self.url, {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 404)
@@ -0,0 +1,97 @@
+from typing import Callable, Iterable, Optional
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from social_app.models import Comment, Follow, Notification, Post, User
+from social_app.tests.base import AuthenticatedClientMixin
+
+
+class QueryCountTestCase(TestCase):
+    """
+    Asserts that an endpoint runs the same number of SQL statements
+    however many rows it returns, so an N+1 shows up as a failure.
+    """
+
+    sizes = (1, 5, 20)
+
+    def count_queries(
+        self, get: Callable[[int], object], size: int,
+        prepare: Optional[Callable[[int], None]] = None
+    ) -> int:
+        if prepare is not None:
+            prepare(size)
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = get(size)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def assertConstantQueries(
+        self,
+        get: Callable[[int], object],
+        prepare: Optional[Callable[[int], None]] = None,
+        sizes: Iterable[int] = None
+    ) -> None:
+        """
+        Calls `get(size)` for each size, after `prepare(size)` if given,
+        and fails if the query counts differ.
+        """
+        sizes = sizes or self.sizes
+        counts = {
+            size: self.count_queries(get, size, prepare) for size in sizes}
+        self.assertEqual(
+            len(set(counts.values())), 1,
+            f'query count grows with the result size: {counts}')
+
+
+class ListEndpointQueryCountTest(AuthenticatedClientMixin, QueryCountTestCase):
+    username = 'reader'
+    email = 'reader@gmail.com'
+
+    def setUp(self):
+        super().setUp()
+        self.authors = [
+            User.objects.create(username=f'author{i}', email=f'au{i}@gmail.com')
+            for i in range(5)]
+        for author in self.authors:
+            Follow.objects.create(user=self.user, following=author)
+        for i in range(40):
+            author = self.authors[i % len(self.authors)]
+            post = Post.objects.create(content=f'post {i}', user=author)
+            for j in range(1 + i % 4):
+                # previews of the latest comments are embedded per post
+                Comment.objects.create(
+                    content=f'comment {j}', post=post, user=self.user)
+            Notification.objects.create(
+                user=author, created_for=self.user, message=f'note {i}')
+        self.post = Post.objects.create(content='busy', user=self.user)
+
+    def test_post_feed(self):
+        url = reverse('all_posts')
+        self.assertConstantQueries(
+            lambda size: self.client.get(f'{url}?page_size={size}'))
+
+    def test_timeline(self):
+        url = reverse('timeline')
+        self.assertConstantQueries(
+            lambda size: self.client.get(f'{url}?page_size={size}'))
+
+    def test_notifications(self):
+        url = reverse('notifications')
+        self.assertConstantQueries(
+            lambda size: self.client.get(f'{url}?page_size={size}'))
+
+    def test_comments(self):
+        url = f'/api/view-comments/{self.post.id}/'
+
+        def prepare(size):
+            Comment.objects.filter(post=self.post).delete()
+            for i in range(size):
+                Comment.objects.create(
+                    content=f'comment {i}', post=self.post,
+                    user=self.authors[i % len(self.authors)])
+
+        self.assertConstantQueries(
+            lambda size: self.client.get(f'{url}?page_size={size}'), prepare)
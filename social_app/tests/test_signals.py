@@ -1,5 +1,11 @@
-from django.test import TestCase
+import json
+from datetime import timedelta
+from unittest.mock import ANY, patch
+from django.test import TestCase, override_settings
 from social_app.models import User
+from social_app.tests.base import FakeRedisMixin
+from social_app.tasks import (
+    buffer_event, deliver_events, flush_notifications, pending_events_key)
 from social_app.models import Profile, Notification, Like, Comment, Post
 from django.db.utils import IntegrityError
 
@@ -38,6 +44,7 @@ class NotificationTests(TestCase):
         self.assertEqual(len(notification), 1)
         self.assertEqual(notification[0].user, self.user2)
         self.assertEqual(notification[0].message, 'user2 commented on your post')
+        self.assertEqual(notification[0].created_for, self.user1)
 
     def test_like_notification_creation(self):
         like = Like.objects.create(post=self.post, user=self.user2)
@@ -57,3 +64,150 @@ class NotificationTests(TestCase):
         notifications = Notification.objects.all()
         self.assertEqual(notifications.count(), 0)
 
+
+
+class PostCounterTests(TestCase):
+
+    def setUp(self):
+        self.user1 = User.objects.create_user(
+            email='c@gmail.com', username='user1', password='testpassword1')
+        self.user2 = User.objects.create_user(
+            email='cd@gmail.com', username='user2', password='testpassword2')
+        self.post = Post.objects.create(user=self.user1, content='Counted post')
+
+    def test_like_increments_and_decrements_count(self):
+        like = Like.objects.create(post=self.post, user=self.user2)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.likes_count, 1)
+
+        like.delete()
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.likes_count, 0)
+
+    def test_comment_increments_and_decrements_count(self):
+        Comment.objects.create(post=self.post, user=self.user2, content='a')
+        comment = Comment.objects.create(
+            post=self.post, user=self.user1, content='b')
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 2)
+
+        comment.delete()
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 1)
+
+    def test_counter_never_goes_negative(self):
+        like = Like.objects.create(post=self.post, user=self.user2)
+        Post.objects.filter(pk=self.post.pk).update(likes_count=0)
+        like.delete()
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.likes_count, 0)
+
+
+class NotificationQueueTests(FakeRedisMixin, TestCase):
+
+    def setUp(self):
+        self.user1 = User.objects.create_user(
+            email='q@gmail.com', username='user1', password='testpassword1')
+        self.user2 = User.objects.create_user(
+            email='qd@gmail.com', username='user2', password='testpassword2')
+        self.post = Post.objects.create(user=self.user1, content='Queued post')
+
+    def event(self, actor, verb='liked your post', post=None):
+        return {
+            'recipient': self.user1.id,
+            'post': str((post or self.post).id),
+            'actor': actor.id,
+            'actor_name': actor.username,
+            'verb': verb,
+        }
+
+    @override_settings(RQ_QUEUES={'notifications': {'ASYNC': True}})
+    @patch('social_app.tasks.buffer_event')
+    def test_event_is_buffered_after_commit(self, mock_buffer_event):
+        with self.captureOnCommitCallbacks(execute=True):
+            Like.objects.create(post=self.post, user=self.user2)
+            mock_buffer_event.assert_not_called()
+
+        mock_buffer_event.assert_called_once_with(self.event(self.user2))
+        self.assertEqual(Notification.objects.count(), 0)
+
+    @override_settings(NOTIFICATION_COALESCE_SECONDS=10)
+    @patch('social_app.tasks.django_rq')
+    def test_buffer_schedules_one_flush_per_window(self, mock_django_rq):
+        connection = mock_django_rq.get_connection.return_value
+        connection.set.side_effect = [True, None]
+
+        buffer_event(self.event(self.user2))
+        buffer_event(self.event(self.user1))
+
+        self.assertEqual(connection.rpush.call_count, 2)
+        mock_django_rq.get_queue.return_value.enqueue_in.assert_called_once_with(
+            timedelta(seconds=10), flush_notifications, self.user1.id,
+            retry=ANY)
+
+    def buffered(self, *events):
+        connection = self.use_fake_redis(
+            'social_app.tasks.django_rq.get_connection')
+        patcher = patch('social_app.tasks.django_rq.get_queue')
+        queue = patcher.start().return_value
+        self.addCleanup(patcher.stop)
+        for event in events:
+            buffer_event(event)
+        return connection, queue
+
+    def test_flush_delivers_buffered_events(self):
+        connection, _ = self.buffered(self.event(self.user2))
+
+        flush_notifications(self.user1.id)
+
+        self.assertEqual(
+            Notification.objects.get().message, 'user2 liked your post')
+        self.assertEqual(connection.llen(pending_events_key(self.user1.id)), 0)
+
+    def test_failed_delivery_keeps_the_buffer(self):
+        connection, _ = self.buffered(self.event(self.user2))
+
+        with patch('social_app.tasks.send_notification',
+                   side_effect=ConnectionError), \
+                self.assertRaises(ConnectionError):
+            flush_notifications(self.user1.id)
+
+        self.assertEqual(connection.llen(pending_events_key(self.user1.id)), 1)
+
+    def test_events_buffered_during_delivery_are_flushed_later(self):
+        connection, queue = self.buffered(self.event(self.user2))
+        late = self.event(self.user2, 'commented on your post')
+
+        with patch('social_app.tasks.deliver_events',
+                   side_effect=lambda events: buffer_event(late)):
+            flush_notifications(self.user1.id)
+
+        key = pending_events_key(self.user1.id)
+        self.assertEqual(
+            [json.loads(raw) for raw in connection.lrange(key, 0, -1)], [late])
+        self.assertEqual(queue.enqueue_in.call_count, 2)
+
+    @patch('social_app.tasks.send_notification')
+    def test_events_are_coalesced_per_post(self, mock_send_notification):
+        actors = [
+            User.objects.create(
+                email=f'a{i}@gmail.com', username=f'actor{i}')
+            for i in range(42)]
+        events = [self.event(actor) for actor in actors]
+        events.append(self.event(actors[0]))
+        events.append(self.event(self.user2, 'commented on your post'))
+
+        with self.assertNumQueries(1):
+            deliver_events(events)
+
+        messages = list(Notification.objects.values_list('message', flat=True))
+        self.assertCountEqual(messages, [
+            'actor0 and 41 others liked your post',
+            'user2 commented on your post'])
+        mock_send_notification.assert_called_once()
+        self.assertEqual(len(mock_send_notification.call_args.args[0]), 2)
+
+    def test_two_actors_are_named(self):
+        deliver_events([self.event(self.user2), self.event(self.user1)])
+        self.assertEqual(
+            Notification.objects.get().message, 'user1 and user2 liked your post')
@@ -0,0 +1,137 @@
+import os
+from io import BytesIO
+from django.core.files.base import ContentFile
+from django.db import IntegrityError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from PIL import Image
+from social_app.models import MediaBlob, Post, User
+from social_app.storage import media_storage
+from social_app.tests.base import TemporaryMediaMixin
+
+
+def make_image(width=100, height=100, color='red', name='photo.png'):
+    buffer = BytesIO()
+    Image.new('RGB', (width, height), color).save(buffer, 'PNG')
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/png')
+
+
+@override_settings(IMAGE_THUMBNAIL_WIDTHS=[40])
+class ContentAddressedStorageTest(TemporaryMediaMixin, TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='storer', password='12345', email='store@gmail.com')
+
+    def refcounts(self):
+        return dict(MediaBlob.objects.values_list('name', 'refcount'))
+
+    def test_name_is_the_content_digest(self):
+        name = media_storage.save('images/a.JPG', ContentFile(b'same bytes'))
+        again = media_storage.save('images/b.jpg', ContentFile(b'same bytes'))
+
+        self.assertEqual(name, again)
+        self.assertRegex(name, r'^images/([0-9a-f]{2})/\1[0-9a-f]{62}\.jpg$')
+        self.assertEqual(
+            os.listdir(os.path.dirname(media_storage.path(name))),
+            [os.path.basename(name)])
+
+    def test_identical_uploads_share_one_blob(self):
+        first = Post.objects.create(
+            content='one', user=self.user, pics=make_image())
+        second = Post.objects.create(
+            content='two', user=self.user, pics=make_image())
+
+        self.assertEqual(first.pics.name, second.pics.name)
+        refcounts = self.refcounts()
+        self.assertEqual(refcounts[first.pics.name], 2)
+        # the 40px thumbnails are shared as well
+        self.assertEqual(len(refcounts), 3)
+        self.assertEqual(set(refcounts.values()), {2})
+
+    def test_blob_is_collected_with_its_last_reference(self):
+        first = Post.objects.create(
+            content='one', user=self.user, pics=make_image())
+        second = Post.objects.create(
+            content='two', user=self.user, pics=make_image())
+        names = list(self.refcounts())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertTrue(all(media_storage.exists(name) for name in names))
+        self.assertEqual(set(self.refcounts().values()), {1})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+        self.assertFalse(any(media_storage.exists(name) for name in names))
+        self.assertFalse(MediaBlob.objects.exists())
+
+    def test_replaced_profile_picture_is_collected(self):
+        profile = self.user.profile
+        profile.profile_pic = make_image(color='blue')
+        profile.save()
+        profile.refresh_from_db()
+        old_names = list(self.refcounts())
+        self.assertEqual(len(old_names), 3)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            profile.profile_pic = make_image(color='green')
+            profile.save()
+
+        self.assertFalse(any(media_storage.exists(name) for name in old_names))
+        self.assertNotIn(profile.profile_pic.name, old_names)
+        self.assertEqual(self.refcounts()[profile.profile_pic.name], 1)
+
+    def test_revived_blob_is_not_deleted(self):
+        post = Post.objects.create(
+            content='one', user=self.user, pics=make_image())
+        name = post.pics.name
+
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            post.delete()
+        Post.objects.create(content='two', user=self.user, pics=make_image())
+        for callback in callbacks:
+            callback()
+
+        self.assertTrue(media_storage.exists(name))
+        self.assertEqual(self.refcounts()[name], 1)
+
+    def test_save_takes_a_reference(self):
+        name = media_storage.save('images/a.jpg', ContentFile(b'held'))
+        self.assertEqual(self.refcounts()[name], 1)
+        media_storage.save('images/b.jpg', ContentFile(b'held'))
+        self.assertEqual(self.refcounts()[name], 2)
+
+    def test_collected_blob_is_written_again(self):
+        post = Post.objects.create(
+            content='one', user=self.user, pics=make_image())
+        name = post.pics.name
+        with self.captureOnCommitCallbacks(execute=True):
+            post.delete()
+        self.assertFalse(media_storage.exists(name))
+
+        again = Post.objects.create(
+            content='two', user=self.user, pics=make_image())
+        self.assertEqual(again.pics.name, name)
+        self.assertTrue(media_storage.exists(name))
+        self.assertEqual(self.refcounts()[name], 1)
+
+    def test_resaving_the_same_picture_keeps_one_reference(self):
+        post = Post.objects.create(
+            content='one', user=self.user, pics=make_image())
+        post.pics = make_image()
+        post.save()
+        self.assertEqual(self.refcounts()[post.pics.name], 1)
+
+    def stored_files(self):
+        return {
+            name for _, _, names in os.walk(self.media_root) for name in names}
+
+    def test_failed_save_releases_the_upload(self):
+        before = self.stored_files()
+        with self.assertRaises(IntegrityError):
+            Post.objects.create(
+                content='orphan', user_id=None, pics=make_image(color='teal'))
+
+        self.assertEqual(self.refcounts(), {})
+        self.assertEqual(self.stored_files(), before)
@@ -0,0 +1,228 @@
+import unittest
+from datetime import timedelta
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, connection
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from social_app.models import Follow, Post, Profile, User
+from social_app.tests.base import AuthenticatedClientMixin, FakeRedisMixin
+from social_app.timeline import (
+    from_score, rebuild_timeline, timeline_key, to_score)
+
+
+class FollowTest(AuthenticatedClientMixin, TestCase):
+    username = 'follower'
+    email = 'follower@gmail.com'
+
+    def setUp(self):
+        super().setUp()
+        self.other = User.objects.create_user(
+            username='followed', password='12345', email='followed@gmail.com')
+
+    def test_toggle_follow(self):
+        url = reverse('toggle_follow', kwargs={'user_id': self.other.id})
+
+        response = self.client.post(url)
+        self.assertEqual(response.data, {'following': True})
+        self.assertTrue(Follow.objects.filter(
+            user=self.user, following=self.other).exists())
+
+        response = self.client.post(url)
+        self.assertEqual(response.data, {'following': False})
+        self.assertFalse(Follow.objects.exists())
+
+    def test_cannot_follow_self(self):
+        url = reverse('toggle_follow', kwargs={'user_id': self.user.id})
+        response = self.client.post(url)
+        self.assertEqual(response.status_code, 400)
+        with self.assertRaises(IntegrityError):
+            Follow.objects.create(user=self.user, following=self.user)
+
+    def test_followers_count_follows_the_follow_rows(self):
+        follow = Follow.objects.create(user=self.user, following=self.other)
+        self.assertEqual(
+            Profile.objects.get(user=self.other).followers_count, 1)
+
+        follow.delete()
+        self.assertEqual(
+            Profile.objects.get(user=self.other).followers_count, 0)
+
+    def test_follow_is_unique(self):
+        Follow.objects.create(user=self.user, following=self.other)
+        with self.assertRaises(IntegrityError):
+            Follow.objects.create(user=self.user, following=self.other)
+
+
+class TimelineTest(AuthenticatedClientMixin, TestCase):
+    username = 'reader'
+    email = 'reader@gmail.com'
+
+    def setUp(self):
+        cache.clear()
+        super().setUp()
+        self.authors = [
+            User.objects.create(username=f'author{i}', email=f'au{i}@gmail.com')
+            for i in range(3)]
+        self.stranger = User.objects.create(
+            username='stranger', email='stranger@gmail.com')
+        for author in self.authors[:2]:
+            Follow.objects.create(user=self.user, following=author)
+
+        start = timezone.now() - timedelta(days=1)
+        self.posts = []
+        for minute, author in enumerate(
+                [self.user, *self.authors, self.stranger] * 5):
+            post = Post.objects.create(content=f'post {minute}', user=author)
+            Post.objects.filter(pk=post.pk).update(
+                created_at=start + timedelta(minutes=minute))
+            self.posts.append(post)
+        self.url = reverse('timeline')
+
+    def expected(self):
+        visible = {self.user.id, self.authors[0].id, self.authors[1].id}
+        return [
+            str(post.id) for post in reversed(self.posts)
+            if post.user_id in visible]
+
+    def test_timeline_pages_followed_posts_newest_first(self):
+        seen = []
+        url = f'{self.url}?page_size=4'
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn('count', response.data)
+            seen.extend(post['id'] for post in response.data['results'])
+            url = response.data['next']
+
+        self.assertEqual(seen, self.expected())
+
+    def test_previous_page(self):
+        first = self.client.get(f'{self.url}?page_size=4').data
+        second = self.client.get(first['next']).data
+        back = self.client.get(second['previous']).data
+        self.assertEqual(back['results'], first['results'])
+
+    def key_range_queries(self, authors: int) -> int:
+        # one UNION ALL of the ranges where the backend can, e.g.
+        # PostgreSQL, otherwise one query per author, e.g. SQLite
+        if connection.features.supports_slicing_ordering_in_compound:
+            return 1
+        return authors
+
+    def test_query_count_follows_the_follow_count(self):
+        # follows, the authors' key ranges and the page's rows
+        with self.assertNumQueries(1 + self.key_range_queries(3) + 1):
+            response = self.client.get(self.url)
+        self.assertEqual(len(response.data['results']), 10)
+
+        Follow.objects.create(user=self.user, following=self.authors[2])
+        with self.assertNumQueries(1 + self.key_range_queries(4) + 1):
+            self.client.get(self.url)
+
+    def test_unfollowed_timeline_has_own_posts(self):
+        Follow.objects.all().delete()
+        response = self.client.get(self.url)
+        self.assertEqual(
+            {post['id'] for post in response.data['results']},
+            {str(post.id) for post in self.posts if post.user_id == self.user.id})
+
+
+class TimelineScoreTest(unittest.TestCase):
+
+    def test_score_round_trips_to_the_microsecond(self):
+        created_at = timezone.now().replace(microsecond=123457)
+        score = to_score(created_at)
+        self.assertIsInstance(score, int)
+        self.assertEqual(from_score(float(score)), created_at)
+
+
+class RebuildTimelinesCommandTest(TestCase):
+
+    def test_refuses_without_fanout(self):
+        with self.assertRaises(CommandError):
+            call_command('rebuild_timelines')
+
+
+@override_settings(TIMELINE_FANOUT=True, TIMELINE_MAX_LENGTH=6)
+class MaterializedTimelineTest(FakeRedisMixin, TimelineTest):
+    """
+    Runs the timeline tests against the sorted sets of an in-process
+    fake Redis, with a timeline short enough that later pages fall
+    back to the database.
+    """
+
+    def setUp(self):
+        self.connection = self.use_fake_redis(
+            'social_app.timeline.get_connection')
+        super().setUp()
+        rebuild_timeline(self.user.id)
+
+    def test_rebuild_keeps_the_newest_posts(self):
+        stored = [
+            member.decode() for member in
+            self.connection.zrevrange(timeline_key(self.user.id), 0, -1)]
+        self.assertEqual(stored, self.expected()[:6])
+
+    def test_new_post_is_fanned_out(self):
+        post = Post.objects.create(content='fresh', user=self.authors[0])
+        response = self.client.get(self.url)
+        self.assertEqual(response.data['results'][0]['id'], str(post.id))
+
+    def test_celebrity_posts_are_merged_at_read_time(self):
+        Profile.objects.filter(user=self.authors[0]).update(
+            followers_count=10)
+        with self.settings(TIMELINE_FANOUT_MAX_FOLLOWERS=5):
+            post = Post.objects.create(content='famous', user=self.authors[0])
+            self.assertIsNone(self.connection.zscore(
+                timeline_key(self.user.id), str(post.id)))
+            response = self.client.get(self.url)
+        self.assertEqual(response.data['results'][0]['id'], str(post.id))
+
+    def page_through(self, url):
+        seen = []
+        while url:
+            response = self.client.get(url)
+            seen.extend(post['id'] for post in response.data['results'])
+            url = response.data['next']
+        return seen
+
+    def stored(self):
+        return {
+            member.decode() for member in
+            self.connection.zrange(timeline_key(self.user.id), 0, -1)}
+
+    def test_fanned_out_posts_of_a_new_celebrity_are_not_repeated(self):
+        Profile.objects.filter(user=self.authors[0]).update(
+            followers_count=10)
+        with self.settings(TIMELINE_FANOUT_MAX_FOLLOWERS=5):
+            self.assertEqual(
+                self.page_through(f'{self.url}?page_size=4'), self.expected())
+
+    def test_crossing_the_celebrity_threshold_drops_timelines(self):
+        celebrity_posts = {
+            str(post.id) for post in self.posts
+            if post.user_id == self.authors[0].id}
+        fan = User.objects.create(username='fan', email='fan@gmail.com')
+
+        with self.settings(TIMELINE_FANOUT_MAX_FOLLOWERS=1):
+            Follow.objects.create(user=fan, following=self.authors[0])
+            self.assertFalse(self.connection.exists(
+                timeline_key(self.user.id)))
+            self.assertEqual(
+                self.page_through(f'{self.url}?page_size=4'), self.expected())
+            self.assertFalse(self.stored() & celebrity_posts)
+
+            Follow.objects.filter(user=fan).delete()
+            self.assertFalse(self.connection.exists(
+                timeline_key(self.user.id)))
+            self.assertEqual(
+                self.page_through(f'{self.url}?page_size=4'), self.expected())
+            self.assertTrue(self.stored() & celebrity_posts)
+
+    def test_query_count_follows_the_follow_count(self):
+        # follows, celebrities, and the page's rows
+        with self.assertNumQueries(3):
+            response = self.client.get(f'{self.url}?page_size=4')
+        self.assertEqual(len(response.data['results']), 4)
@@ -0,0 +1,66 @@
+from io import BytesIO
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+from social_app.models import Post
+from social_app.tests.base import AuthenticatedClientMixin, TemporaryMediaMixin
+from social_app.uploads import is_image_header
+
+
+def make_upload(size=(50, 50), image_format='PNG', name='upload.png'):
+    buffer = BytesIO()
+    Image.new('L', size).save(buffer, image_format)
+    return SimpleUploadedFile(name, buffer.getvalue())
+
+
+@override_settings(
+    IMAGE_UPLOAD_MAX_BYTES=200 * 1024,
+    IMAGE_UPLOAD_MAX_PIXELS=1_000_000)
+class BoundedUploadTest(TemporaryMediaMixin, AuthenticatedClientMixin, TestCase):
+    username = 'uploader'
+    email = 'up@gmail.com'
+
+    def setUp(self):
+        super().setUp()
+        self.url = reverse('create_post')
+
+    def post_picture(self, upload):
+        return self.client.post(
+            self.url, {'content': 'pic', 'pics': upload}, format='multipart')
+
+    def test_valid_image_is_accepted(self):
+        response = self.post_picture(make_upload())
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Post.objects.count(), 1)
+
+    def test_too_many_bytes_is_rejected(self):
+        upload = SimpleUploadedFile(
+            'big.png', b'\x89PNG\r\n\x1a\n' + b'0' * 300 * 1024)
+        response = self.post_picture(upload)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('larger than', response.data['error'])
+        self.assertEqual(Post.objects.count(), 0)
+
+    def test_unknown_format_is_rejected(self):
+        upload = SimpleUploadedFile('fake.png', b'#!/bin/sh\necho pwned\n')
+        response = self.post_picture(upload)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('not a supported image', response.data['error'])
+
+    def test_too_many_pixels_is_rejected(self):
+        response = self.post_picture(make_upload(size=(2000, 2000)))
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('pixels', response.data['error'])
+
+    def test_profile_picture_is_bounded(self):
+        url = reverse('edit_profile', kwargs={'user_id': self.user.id})
+        response = self.client.put(
+            url, {'profile_pic': make_upload(size=(2000, 2000))},
+            format='multipart')
+        self.assertEqual(response.status_code, 400)
+
+    def test_header_sniffing(self):
+        self.assertTrue(is_image_header(b'\xff\xd8\xff\xe0' + b'\0' * 8))
+        self.assertTrue(is_image_header(b'RIFF\0\0\0\0WEBP'))
+        self.assertFalse(is_image_header(b'RIFF\0\0\0\0WAVE'))
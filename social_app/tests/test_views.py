@@ -1,7 +1,8 @@
 from django.test import TestCase
 from rest_framework.test import APIClient
 from social_app.models import (
-    Post, Like, Comment, User)
+    Post, Like, Comment, User, Notification)
+from django.core.cache import cache
 from django.urls import reverse
 from django.core.files.uploadedfile import SimpleUploadedFile
 from rest_framework.test import APITestCase
@@ -11,6 +12,7 @@ from django.test import TestCase
 from django.test import override_settings
 from unittest.mock import patch, MagicMock
 from rest_framework_simplejwt.tokens import RefreshToken
+from social_app.tests.base import AuthenticatedClientMixin
 
 
 def get_temporary_image():
@@ -262,7 +264,7 @@ class ViewCommentsTest(TestCase):
         response = self.client.get(url)
 
         self.assertEqual(response.status_code, 200)
-        comments_data = response.json()
+        comments_data = response.json()['results']
         self.assertEqual(len(comments_data), 2)
         self.assertIn('id', comments_data[0])
         self.assertIn('content', comments_data[0])
@@ -288,7 +290,7 @@ class ViewCommentsTest(TestCase):
         response = self.client.get(url)
 
         self.assertEqual(response.status_code, 200)
-        self.assertEqual(response.data, [])
+        self.assertEqual(response.data['results'], [])
 
     def test_with_no_uuid_id(self):
         false_id = 'string_id'
@@ -297,6 +299,38 @@ class ViewCommentsTest(TestCase):
 
         self.assertEqual(response.status_code, 400)
 
+    def test_comments_are_paged_oldest_first(self):
+        for i in range(5):
+            Comment.objects.create(
+                content=f'comment {i}', user=self.user_john, post=self.post)
+        url = f'/api/view-comments/{self.post.id}/?page_size=3'
+
+        seen = []
+        while url:
+            response = self.client.get(url)
+            self.assertNotIn('count', response.data)
+            seen.extend(comment['content'] for comment in response.data['results'])
+            url = response.data['next']
+        self.assertEqual(
+            seen,
+            [self.comment_1.content, self.comment_2.content,
+             *(f'comment {i}' for i in range(5))])
+
+    @override_settings(COMMENT_PREVIEW_SIZE=2)
+    def test_posts_embed_their_latest_comments(self):
+        cache.clear()
+        third = Comment.objects.create(
+            content='latest', user=self.user_john, post=self.post)
+        Post.objects.create(content='quiet', user=self.user_john)
+
+        response = self.client.get(reverse('all_posts'))
+        previews = {
+            post['content']: [comment['id'] for comment in post['latest_comments']]
+            for post in response.data['results']}
+        self.assertEqual(previews, {
+            'Test content': [str(self.comment_2.id), str(third.id)],
+            'quiet': []})
+
 
 class CreateCommentTestCase(APITestCase):
 
@@ -374,6 +408,15 @@ class LikesViewTestCase(APITestCase):
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response.data, self.post.likes.count())
 
+    def test_toggle_twice_restores_count(self):
+        response = self.client.post(self.url)
+        self.assertEqual(response.data, 1)
+        self.assertTrue(Like.objects.filter(post=self.post, user=self.user).exists())
+
+        response = self.client.post(self.url)
+        self.assertEqual(response.data, 0)
+        self.assertFalse(Like.objects.filter(post=self.post, user=self.user).exists())
+
     def test_wrong_string_id(self):
         self.url = reverse('toggele-like', args=['wrong id'])
         response = self.client.post(self.url)
@@ -502,25 +545,164 @@ class GoogleLoginApiTest(TestCase):
             'code': 'valid_code'})
         self.assertEqual(response.status_code, 400)
 
-    @unittest.skip
-    @patch('social_app.views.os.getenv')
-    @patch('social_app.google_login_flow.GoogleRawLoginFlowService.get_tokens')
-    @patch('social_app.views.generate_tokens_for_user')
-    def test_google_login_success(self, mock_generate_tokens, mockGetTokens, mockosgetenv):
-        mockosgetenv.return_value = True 
+    @patch.dict('os.environ', {
+        'GOOGLE_OAUTH2_CLIENT_ID': 'client-id',
+        'GOOGLE_OAUTH2_CLIENT_SECRET': 'client-secret'})
+    @patch('social_app.google_login_flow.GoogleRawLoginFlowService.aget_tokens')
+    def test_google_login_success(self, mockGetTokens):
         googleacesstoken = MagicMock()
-        mock_generate_tokens.return_value = {'access_token': '12312', 'refresh_token': 'qqqqq'}
         mockGetTokens.return_value = googleacesstoken
-        googleacesstoken.decode_id_token.return_value = {'email': 'test@example.com', 'name': 'Test User', }
+        googleacesstoken.decode_id_token.return_value = {
+            'email': 'test@example.com', 'name': 'Test User',
+            'given_name': 'Test', 'family_name': 'User'}
 
         response = self.client.get(reverse('google_auth2'), {'code': 'refresh_token', 'state': 'valid_state'})
 
         self.assertEqual(response.status_code, 200)
-        mock_generate_tokens.assert_called_once()
-        mockGetTokens.assert_called_once()
-        googleacesstoken.decode_id_token.assert_called_once()
-        mockosgetenv.assert_called()
-        mockGetTokens.assert_called_with(code='refresh_token')
-        self.assertEqual(response.data['user'], 'test@example.com')
-        self.assertEqual(response.data['access_token'], 'access_token' )
-        self.assertEqual(response.data['refresh_token'], 'refresh_token')
\ No newline at end of file
+        mockGetTokens.assert_called_once_with(code='refresh_token')
+        googleacesstoken.decode_id_token.assert_called_once_with(
+            client_id='client-id')
+        self.assertEqual(response.json()['user'], 'test@example.com')
+        self.assertIn('access_token', response.json())
+        self.assertIn('refresh_token', response.json())
+
+        user = User.objects.get(email='test@example.com')
+        self.assertEqual(user.username, 'test')
+        self.assertEqual(user.registration_method, 'google')
+
+    @patch.dict('os.environ', {
+        'GOOGLE_OAUTH2_CLIENT_ID': 'client-id',
+        'GOOGLE_OAUTH2_CLIENT_SECRET': 'client-secret'})
+    @patch('social_app.google_login_flow.GoogleRawLoginFlowService.aget_tokens')
+    def test_google_login_existing_user_in_one_query(self, mockGetTokens):
+        user = User.objects.create_user(
+            username='existing', password='12345', email='test@example.com')
+        mockGetTokens.return_value = MagicMock()
+        mockGetTokens.return_value.decode_id_token.return_value = {
+            'email': 'test@example.com'}
+
+        with self.assertNumQueries(1):
+            response = self.client.get(
+                reverse('google_auth2'), {'code': 'code', 'state': 'state'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(User.objects.filter(email='test@example.com').count(), 1)
+        self.assertEqual(User.objects.get(email='test@example.com'), user)
+
+    @patch.dict('os.environ', {
+        'GOOGLE_OAUTH2_CLIENT_ID': 'client-id',
+        'GOOGLE_OAUTH2_CLIENT_SECRET': 'client-secret'})
+    @patch('social_app.google_login_flow.GoogleRawLoginFlowService.aget_tokens')
+    def test_google_login_picks_a_free_username(self, mockGetTokens):
+        User.objects.create_user(
+            username='john', password='12345', email='john@gmail.com')
+        mockGetTokens.return_value = MagicMock()
+        mockGetTokens.return_value.decode_id_token.return_value = {
+            'email': 'john@yahoo.com'}
+
+        response = self.client.get(
+            reverse('google_auth2'), {'code': 'code', 'state': 'state'})
+
+        self.assertEqual(response.status_code, 200)
+        user = User.objects.get(email='john@yahoo.com')
+        self.assertRegex(user.username, r'^john_\d{6}$')
+
+    @patch.dict('os.environ', {
+        'GOOGLE_OAUTH2_CLIENT_ID': 'client-id',
+        'GOOGLE_OAUTH2_CLIENT_SECRET': 'client-secret'})
+    @patch('social_app.google_login_flow.GoogleRawLoginFlowService.aget_tokens')
+    def test_google_login_failure(self, mockGetTokens):
+        mockGetTokens.side_effect = ValueError(
+            'Failed to obtain access token from Google.')
+        response = self.client.get(
+            reverse('google_auth2'), {'code': 'code', 'state': 'state'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(
+            response.json(),
+            {'error': 'Failed to obtain access token from Google.'})
+
+class NotificationViewsTest(AuthenticatedClientMixin, TestCase):
+    username = 'inbox'
+    email = 'inbox@gmail.com'
+
+    def setUp(self):
+        cache.clear()
+        super().setUp()
+        self.actor = User.objects.create_user(
+            username='actor', password='12345', email='actor@gmail.com')
+        self.notifications = [
+            Notification.objects.create(
+                user=self.actor, created_for=self.user, message=f'note {i}')
+            for i in range(3)]
+        Notification.objects.create(
+            user=self.user, created_for=self.actor, message='not mine')
+
+    def test_inbox_lists_own_notifications_newest_first(self):
+        response = self.client.get(reverse('notifications'))
+        self.assertEqual(response.status_code, 200)
+        messages = [n['message'] for n in response.data['results']]
+        self.assertEqual(messages, ['note 2', 'note 1', 'note 0'])
+        self.assertEqual(response.data['results'][0]['user']['username'], 'actor')
+        self.assertNotIn('count', response.data)
+
+    def test_inbox_is_cursor_paginated(self):
+        response = self.client.get(reverse('notifications'), {'page_size': 2})
+        self.assertEqual(len(response.data['results']), 2)
+        response = self.client.get(response.data['next'])
+        messages = [n['message'] for n in response.data['results']]
+        self.assertEqual(messages, ['note 0'])
+
+    def test_unread_count_is_cached_and_tracks_new_notifications(self):
+        url = reverse('unread_notifications_count')
+        self.assertEqual(self.client.get(url).data, {'unread': 3})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Notification.objects.create(
+                user=self.actor, created_for=self.user, message='note 3')
+        self.assertEqual(self.client.get(url).data, {'unread': 4})
+
+    @override_settings(UNREAD_COUNT_CACHE_TIMEOUT=0)
+    def test_unread_count_expires(self):
+        url = reverse('unread_notifications_count')
+        self.assertEqual(self.client.get(url).data, {'unread': 3})
+
+        # the invalidation never runs, as when a read races the commit
+        Notification.objects.create(
+            user=self.actor, created_for=self.user, message='note 3')
+        self.assertEqual(self.client.get(url).data, {'unread': 4})
+
+    def test_unread_count_tracks_deleted_notifications(self):
+        url = reverse('unread_notifications_count')
+        self.assertEqual(self.client.get(url).data, {'unread': 3})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.notifications[0].delete()
+        self.assertEqual(self.client.get(url).data, {'unread': 2})
+
+    def test_mark_selected_notifications_read(self):
+        url = reverse('mark_notifications_read')
+        ids = [str(self.notifications[0].id)]
+        with self.assertNumQueries(2), \
+                self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(url, {'ids': ids}, format='json')
+        self.assertEqual(response.data, {'marked': 1})
+        self.assertEqual(
+            self.client.get(reverse('unread_notifications_count')).data,
+            {'unread': 2})
+
+    def test_mark_all_read(self):
+        self.client.get(reverse('unread_notifications_count'))
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                reverse('mark_notifications_read'), format='json')
+        self.assertEqual(response.data, {'marked': 3})
+        self.assertEqual(
+            self.client.get(reverse('unread_notifications_count')).data,
+            {'unread': 0})
+        response = self.client.get(reverse('notifications'), {'unread': 'true'})
+        self.assertEqual(response.data['results'], [])
+
+    def test_mark_read_rejects_non_list_ids(self):
+        response = self.client.post(
+            reverse('mark_notifications_read'), {'ids': 'abc'}, format='json')
+        self.assertEqual(response.status_code, 400)
@@ -0,0 +1,386 @@
+'''
+This module defines the home timelines materialized in Redis by fan-out on write
+'''
+import heapq
+import uuid
+from datetime import datetime, timedelta, timezone as dt_timezone
+from itertools import islice
+from typing import Any, Iterable, List, Optional, Set
+import django_rq
+from django.conf import settings
+from django.db.models import QuerySet
+from .hydration import hydrate_posts
+from .models import Follow, Post, Profile
+from .pagination import MergedKeysetPagination, Position
+from .tasks import enqueue
+
+
+TIMELINE_QUEUE = 'default'
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+FANOUT_BATCH_SIZE = 500
+
+
+def timeline_key(user_id: int) -> str:
+    return f'timeline:{user_id}'
+
+
+def timeline_warm_key(user_id: int) -> str:
+    return f'timeline:{user_id}:warm'
+
+
+def to_score(created_at: datetime) -> int:
+    """
+    Returns the sorted-set score of a post: its creation time in whole
+    microseconds since the epoch, exact where a float timestamp is not.
+    """
+    delta = created_at - EPOCH
+    return (delta.days * 86400 + delta.seconds) * 10**6 + delta.microseconds
+
+
+def from_score(score: float) -> datetime:
+    """
+    Returns the creation time encoded by `to_score`.
+    """
+    return EPOCH + timedelta(microseconds=int(score))
+
+
+def get_connection():
+    return django_rq.get_connection(TIMELINE_QUEUE)
+
+
+def timeline_authors(user_id: int) -> List[int]:
+    """
+    Returns the ids of the authors whose posts make up a user's
+    timeline: the user and everyone they follow.
+
+    Args:
+        user_id: The id of the timeline's owner.
+
+    Returns:
+        List[int]: The author ids, the owner first.
+    """
+    following = Follow.objects.filter(user_id=user_id).order_by(
+        ).values_list('following_id', flat=True)
+    return [user_id, *following]
+
+
+def celebrity_ids(author_ids: Iterable[int]) -> Set[int]:
+    """
+    Returns the authors with more than TIMELINE_FANOUT_MAX_FOLLOWERS
+    followers. Their posts are not fanned out but merged into the
+    timelines at read time.
+
+    Args:
+        author_ids: The ids of the authors to check.
+
+    Returns:
+        Set[int]: The ids of the celebrity authors among them.
+    """
+    return set(Profile.objects.filter(
+        user_id__in=list(author_ids),
+        followers_count__gt=settings.TIMELINE_FANOUT_MAX_FOLLOWERS,
+    ).values_list('user_id', flat=True))
+
+
+def push_to_timelines(
+    user_ids: Iterable[int], post_id: str, score: int
+) -> None:
+    """
+    Adds a post to the warm timelines among the given users, trimming
+    each to TIMELINE_MAX_LENGTH. Cold timelines are left alone; they
+    are rebuilt from the database when next read.
+
+    Args:
+        user_ids: The owners of the timelines.
+        post_id: The id of the post.
+        score: The post's score, see `to_score`.
+
+    Returns:
+        None
+    """
+    connection = get_connection()
+    user_ids = list(user_ids)
+    for start in range(0, len(user_ids), FANOUT_BATCH_SIZE):
+        batch = user_ids[start:start + FANOUT_BATCH_SIZE]
+        pipeline = connection.pipeline(transaction=False)
+        for user_id in batch:
+            pipeline.exists(timeline_warm_key(user_id))
+        warm = [
+            user_id for user_id, exists in zip(batch, pipeline.execute())
+            if exists]
+
+        pipeline = connection.pipeline(transaction=False)
+        for user_id in warm:
+            key = timeline_key(user_id)
+            pipeline.zadd(key, {str(post_id): score})
+            pipeline.zremrangebyrank(key, 0, -settings.TIMELINE_MAX_LENGTH - 1)
+        pipeline.execute()
+
+
+def fan_out_post(post_id: str) -> None:
+    """
+    Job pushing a new post onto the timelines of its author and the
+    author's followers, unless the author is a celebrity.
+
+    Args:
+        post_id: The id of the post.
+
+    Returns:
+        None
+    """
+    post = Post.objects.filter(pk=post_id).values_list(
+        'user_id', 'created_at').first()
+    if post is None:
+        return
+    author_id, created_at = post
+    if celebrity_ids([author_id]):
+        return
+
+    followers = Follow.objects.filter(following_id=author_id).order_by(
+        ).values_list('user_id', flat=True).iterator()
+    push_to_timelines(
+        [author_id, *followers], post_id, to_score(created_at))
+
+
+def remove_post_from_timelines(post_id: str, author_id: int) -> None:
+    """
+    Job removing a deleted post from the timelines it was pushed to.
+
+    Args:
+        post_id: The id of the deleted post.
+        author_id: The id of its author.
+
+    Returns:
+        None
+    """
+    followers = Follow.objects.filter(following_id=author_id).order_by(
+        ).values_list('user_id', flat=True)
+    user_ids = [author_id, *followers]
+    connection = get_connection()
+    for start in range(0, len(user_ids), FANOUT_BATCH_SIZE):
+        pipeline = connection.pipeline(transaction=False)
+        for user_id in user_ids[start:start + FANOUT_BATCH_SIZE]:
+            pipeline.zrem(timeline_key(user_id), str(post_id))
+        pipeline.execute()
+
+
+def drop_timeline(user_id: int) -> None:
+    """
+    Deletes a user's materialized timeline, e.g. after they follow or
+    unfollow someone, so it is rebuilt on the next read.
+    """
+    get_connection().delete(timeline_key(user_id), timeline_warm_key(user_id))
+
+
+def drop_author_timelines(author_id: int) -> None:
+    """
+    Job dropping the timelines of an author and their followers after
+    the author became or stopped being a celebrity, so no timeline
+    keeps fanned-out posts that are now merged at read time, or
+    misses posts that are fanned out again from now on.
+
+    Args:
+        author_id: The id of the author.
+
+    Returns:
+        None
+    """
+    followers = Follow.objects.filter(following_id=author_id).order_by(
+        ).values_list('user_id', flat=True)
+    user_ids = [author_id, *followers]
+    connection = get_connection()
+    for start in range(0, len(user_ids), FANOUT_BATCH_SIZE):
+        keys = []
+        for user_id in user_ids[start:start + FANOUT_BATCH_SIZE]:
+            keys += [timeline_key(user_id), timeline_warm_key(user_id)]
+        connection.delete(*keys)
+
+
+def rebuild_timeline(user_id: int) -> None:
+    """
+    Job materializing a user's timeline from the newest posts of the
+    non-celebrity authors they follow.
+
+    The timeline is marked warm before the posts are read, so a post
+    committed meanwhile is either read here or pushed by its fan-out
+    job; both only ever add to the sorted set.
+
+    Args:
+        user_id: The id of the timeline's owner.
+
+    Returns:
+        None
+    """
+    key = timeline_key(user_id)
+    max_length = settings.TIMELINE_MAX_LENGTH
+    ttl = settings.TIMELINE_TTL
+    connection = get_connection()
+    connection.set(timeline_warm_key(user_id), 1, ex=ttl)
+
+    authors = timeline_authors(user_id)
+    celebrities = celebrity_ids(authors)
+    ranges = [
+        Post.objects.filter(user_id=author_id).order_by(
+            '-created_at', '-id').values_list('created_at', 'id')[:max_length]
+        for author_id in authors if author_id not in celebrities]
+    newest = islice(heapq.merge(*ranges, reverse=True), max_length)
+    entries = {str(pk): to_score(created_at) for created_at, pk in newest}
+
+    pipeline = connection.pipeline()
+    if entries:
+        pipeline.zadd(key, entries)
+        pipeline.zremrangebyrank(key, 0, -max_length - 1)
+    pipeline.expire(key, ttl)
+    pipeline.expire(timeline_warm_key(user_id), ttl)
+    pipeline.execute()
+
+
+class MaterializedTimeline:
+    """
+    A warm timeline sorted set, read newest first by (created_at, id).
+
+    Attributes:
+        user_id: The id of the timeline's owner.
+        length: The number of posts in the sorted set.
+        oldest: The score of the oldest post, None if empty.
+    """
+
+    def __init__(
+        self, user_id: int, length: int, oldest: Optional[int], connection
+    ):
+        self.user_id = user_id
+        self.length = length
+        self.oldest = oldest
+        self.connection = connection
+
+    @classmethod
+    def load(cls, user_id: int) -> Optional['MaterializedTimeline']:
+        """
+        Returns the user's timeline, extending its TTL, or None if it is
+        cold and has to be rebuilt.
+        """
+        connection = get_connection()
+        ttl = settings.TIMELINE_TTL
+        pipeline = connection.pipeline(transaction=False)
+        pipeline.exists(timeline_warm_key(user_id))
+        pipeline.zcard(timeline_key(user_id))
+        pipeline.zrange(timeline_key(user_id), 0, 0, withscores=True)
+        pipeline.expire(timeline_key(user_id), ttl)
+        pipeline.expire(timeline_warm_key(user_id), ttl)
+        warm, length, oldest, *_ = pipeline.execute()
+        if not warm:
+            return None
+        return cls(
+            user_id, length, int(oldest[0][1]) if oldest else None, connection)
+
+    @property
+    def truncated(self) -> bool:
+        """
+        True if older posts may have been trimmed off the sorted set.
+        """
+        return self.length >= settings.TIMELINE_MAX_LENGTH
+
+    def covers(
+        self, position: Optional[Position], reverse: bool, found: int,
+        limit: int
+    ) -> bool:
+        """
+        Returns False if a page read from the sorted set may be missing
+        posts that were trimmed off it: when it starts before the
+        oldest post kept, or ends short of the limit going back in time.
+        """
+        if not self.truncated:
+            return True
+        if position is not None and to_score(position[0]) < self.oldest:
+            return False
+        return reverse or found >= limit
+
+    def key_range(
+        self, position: Optional[Position], reverse: bool, limit: int
+    ) -> List[Position]:
+        """
+        Returns up to `limit` (created_at, id) keys past `position`,
+        newest first unless `reverse`.
+
+        Posts created in the same microsecond share a score, so those
+        at the boundary score are read too and filtered by id.
+
+        Args:
+            position: The boundary key, or None for the first page.
+            reverse: True to walk towards newer posts.
+            limit: The maximum number of keys returned.
+
+        Returns:
+            List[Position]: The keys, in the pagination's order.
+        """
+        key = timeline_key(self.user_id)
+        if position is None:
+            read = self.connection.zrange if reverse else self.connection.zrevrange
+            entries = read(key, 0, limit - 1, withscores=True)
+        else:
+            score = to_score(position[0])
+            ties = self.connection.zcount(key, score, score)
+            if reverse:
+                entries = self.connection.zrangebyscore(
+                    key, score, '+inf', start=0, num=limit + ties,
+                    withscores=True)
+            else:
+                entries = self.connection.zrevrangebyscore(
+                    key, score, '-inf', start=0, num=limit + ties,
+                    withscores=True)
+
+        keys = [
+            (from_score(score), uuid.UUID(member.decode()))
+            for member, score in entries]
+        if position is not None:
+            boundary = (position[0], uuid.UUID(str(position[1])))
+            keys = [
+                entry for entry in keys
+                if (entry > boundary if reverse else entry < boundary)]
+        return keys[:limit]
+
+
+class TimelinePagination(MergedKeysetPagination):
+    """
+    MergedKeysetPagination reading from the user's materialized
+    timeline when TIMELINE_FANOUT is on.
+
+    A warm timeline is read with one sorted-set range and merged with
+    the index ranges of the celebrity authors only, whose posts are
+    not fanned out. A cold timeline is rebuilt in the background while
+    the page is served by merging every author's range; so is a page
+    past the posts a trimmed timeline still holds.
+
+    The posts of a page are hydrated through the per-post cache.
+    """
+
+    def paginate_queryset(
+        self, queryset: QuerySet, request, view=None
+    ) -> Optional[List[Any]]:
+        self.timeline = None
+        if settings.TIMELINE_FANOUT:
+            self.timeline = MaterializedTimeline.load(request.user.id)
+            if self.timeline is None:
+                enqueue(TIMELINE_QUEUE, rebuild_timeline, request.user.id)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_key_ranges(
+        self, queryset, position, reverse, ordering, limit
+    ) -> List[Iterable[Position]]:
+        if self.timeline is None:
+            return super().get_key_ranges(
+                queryset, position, reverse, ordering, limit)
+
+        materialized = self.timeline.key_range(position, reverse, limit)
+        if not self.timeline.covers(
+                position, reverse, len(materialized), limit):
+            return super().get_key_ranges(
+                queryset, position, reverse, ordering, limit)
+
+        celebrities = celebrity_ids(self.merge_values)
+        return [materialized, *self.value_key_ranges(
+            [value for value in self.merge_values if value in celebrities],
+            queryset, position, reverse, ordering, limit)]
+
+    def load_rows(self, queryset, page_keys: List[Any]) -> List[Post]:
+        return hydrate_posts(page_keys)
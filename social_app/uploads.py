@@ -0,0 +1,120 @@
+'''
+This module defines the bounded, streaming upload handler for images
+'''
+from django.conf import settings
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from PIL import Image, UnidentifiedImageError
+
+
+# leading bytes of the image formats accepted for upload
+IMAGE_SIGNATURES = (
+    b'\xff\xd8\xff',            # JPEG
+    b'\x89PNG\r\n\x1a\n',       # PNG
+    b'GIF87a',                  # GIF
+    b'GIF89a',                  # GIF
+)
+SNIFF_LENGTH = 12
+
+
+class UploadRejected(ValueError):
+    """
+    Raised when an upload exceeds a limit or is not a supported image.
+    """
+
+
+def is_image_header(header: bytes) -> bool:
+    """
+    Checks the first bytes of a file against the supported image formats.
+
+    Args:
+        header: At least the first SNIFF_LENGTH bytes of the file.
+
+    Returns:
+        bool: True if the file starts like a JPEG, PNG, GIF or WebP.
+    """
+    if header[:4] == b'RIFF' and header[8:12] == b'WEBP':
+        return True
+    return header.startswith(IMAGE_SIGNATURES)
+
+
+class BoundedImageUploadHandler(TemporaryFileUploadHandler):
+    """
+    Streams every uploaded file chunk by chunk into a temporary file,
+    so no upload is ever held in memory, while enforcing:
+
+    - IMAGE_UPLOAD_MAX_BYTES, checked as the bytes arrive,
+    - a supported image signature, sniffed from the first chunk,
+    - IMAGE_UPLOAD_MAX_PIXELS, read from the image header on completion
+      without decoding the pixel data.
+    """
+
+    def __init__(self, request=None):
+        super().__init__(request)
+        self.max_bytes = settings.IMAGE_UPLOAD_MAX_BYTES
+        self.max_pixels = settings.IMAGE_UPLOAD_MAX_PIXELS
+
+    def new_file(self, field_name, file_name, content_type,
+                 content_length, *args, **kwargs):
+        if content_length and content_length > self.max_bytes:
+            raise UploadRejected(
+                f'{file_name} is larger than {self.max_bytes} bytes.')
+        super().new_file(
+            field_name, file_name, content_type, content_length,
+            *args, **kwargs)
+        self.received = 0
+        self.header = b''
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received > self.max_bytes:
+            self.reject(f'{self.file_name} is larger than {self.max_bytes} bytes.')
+
+        if len(self.header) < SNIFF_LENGTH:
+            self.header += raw_data[:SNIFF_LENGTH - len(self.header)]
+            if len(self.header) == SNIFF_LENGTH:
+                self.check_header()
+
+        self.file.write(raw_data)
+
+    def file_complete(self, file_size):
+        if len(self.header) < SNIFF_LENGTH:
+            self.check_header()
+
+        self.file.seek(0)
+        try:
+            # Image.open only parses the header; pixels are not decoded
+            with Image.open(self.file) as image:
+                width, height = image.size
+        except (OSError, UnidentifiedImageError, Image.DecompressionBombError):
+            self.reject(f'{self.file_name} is not a valid image.')
+        if width * height > self.max_pixels:
+            self.reject(
+                f'{self.file_name} has more than {self.max_pixels} pixels.')
+
+        return super().file_complete(file_size)
+
+    def check_header(self):
+        if not is_image_header(self.header):
+            self.reject(f'{self.file_name} is not a supported image.')
+
+    def reject(self, message: str):
+        """
+        Discards the partial temporary file and aborts the upload.
+        """
+        self.upload_interrupted()
+        raise UploadRejected(message)
+
+
+def use_bounded_upload_handlers(request) -> None:
+    """
+    Makes the request parse its multipart body with
+    BoundedImageUploadHandler. Must be called before the request's
+    data or files are accessed.
+
+    Args:
+        request: The incoming request.
+
+    Returns:
+        None
+    """
+    request.upload_handlers = [BoundedImageUploadHandler(request)]
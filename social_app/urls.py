@@ -1,8 +1,9 @@
 from django.urls import path
 from .views import (
-    PostView, PostDetails,
-    CommentView, LikesView,
-    ProfileView, GoogleLoginApi, GoogleLoginRedirectApi
+    PostView, PostDetails, TimelineView,
+    CommentView, LikesView, FollowView,
+    ProfileView, GoogleLoginApi, GoogleLoginRedirectApi,
+    NotificationView, UnreadNotificationCountView, MarkNotificationsReadView
 )
 
 
@@ -19,6 +20,7 @@ urlpatterns = [
 
     # posts urls
     path('view-posts/', PostView.as_view(), name='all_posts'),
+    path('timeline/', TimelineView.as_view(), name='timeline'),
     path(
         'view-post/<str:post_id>/',
         PostDetails.as_view(),
@@ -45,6 +47,23 @@ urlpatterns = [
         LikesView.as_view(),
         name='toggele-like'),
 
+    # follow and unfollow
+    path(
+        'toggle-follow/<str:user_id>/',
+        FollowView.as_view(),
+        name='toggle_follow'),
+
+    # notifications
+    path('notifications/', NotificationView.as_view(), name='notifications'),
+    path(
+        'notifications/unread-count/',
+        UnreadNotificationCountView.as_view(),
+        name='unread_notifications_count'),
+    path(
+        'notifications/mark-read/',
+        MarkNotificationsReadView.as_view(),
+        name='mark_notifications_read'),
+
     # loging with google
     path('google-oauth2/login/raw/callback/', GoogleLoginApi.as_view(), name='google_auth2'),
     path('google-oauth2/login-raw/redirect/', GoogleLoginRedirectApi.as_view(), name='google-oauth2-login-raw-redirect'),
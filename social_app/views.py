@@ -1,33 +1,93 @@
-from django.http import HttpRequest
+from django.http import Http404, HttpRequest, JsonResponse
+from django.views import View
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from .decorator import class_exception_handler
-from .models import Post, Comment, Like, User
+from .authentication import StatelessReadMixin
+from .models import Post, Comment, Like, User, Notification, Follow
 from rest_framework.generics import ListAPIView
 from .serialiser import (
-    PostSerialiser, CommentSerialiser, InputSerializer)
+    PostSerialiser, CommentSerialiser, InputSerializer,
+    NotificationSerialiser)
 from django.shortcuts import get_object_or_404
 from rest_framework import status
-from django.db.models import Count
-from .google_login_flow import GoogleRawLoginFlowService, generate_tokens_for_user
+from .google_login_flow import (
+    GoogleRawLoginFlowService, generate_tokens_for_user,
+    get_or_create_google_user)
+from .hydration import hydrate_posts
+from .images import thumbnail_urls
+from .uploads import use_bounded_upload_handlers
+from .pagination import (
+    CommentPagination, KeysetPagination, NotificationPagination)
+from .timeline import TimelinePagination, timeline_authors
+from .cache import (
+    feed_page_cache_key,
+    get_unread_count, invalidate_unread_count)
 from rest_framework import  status
-import os
 from django.shortcuts import redirect
 
 
 
-class PostView(ListAPIView):
+class PostView(StatelessReadMixin, ListAPIView):
     """
     A view class for listing posts using a specific queryset and serializer.
+    Pages are fetched by seeking on (created_at, id) rather than by offset.
     """
-    queryset = Post.objects.annotate(
-        likes_count=Count('likes'), comments_count=Count(
-            'comments')).order_by('created_at').all()
+    queryset = Post.objects.order_by('created_at').all()
     serializer_class = PostSerialiser
+    pagination_class = KeysetPagination
+
+    def list(self, request: HttpRequest, *args, **kwargs) -> Response:
+        """
+        Returns the requested feed page. The page's post ids are cached
+        until the feed changes and the posts themselves are hydrated
+        from the per-post cache, so a like or an edit does not throw
+        the cached pages away.
+
+        Args:
+            request: The HTTP request object.
+
+        Returns:
+            Response: The paginated, serialized posts.
+        """
+        key = feed_page_cache_key(request)
+        page = cache.get(key)
+        if page is None:
+            queryset = self.filter_queryset(self.get_queryset())
+            rows = self.paginate_queryset(queryset.only('id', 'created_at'))
+            page = self.get_paginated_response(
+                [row.pk for row in rows]).data
+            cache.set(key, page, settings.FEED_CACHE_TIMEOUT)
+
+        posts = hydrate_posts(page['results'])
+        return Response(
+            dict(page, results=self.get_serializer(posts, many=True).data))
+
+
+class TimelineView(StatelessReadMixin, ListAPIView):
+    """
+    The authenticated user's home timeline: their own posts and those
+    of the users they follow, newest first. Pages are read from the
+    timeline materialized in Redis, or by merging the authors'
+    recent-post ranges of the (user, created_at, id) index.
+    """
+    serializer_class = PostSerialiser
+    pagination_class = TimelinePagination
+
+    queryset = Post.objects.all()
+
+    def get_merge_values(self):
+        """
+        Returns the ids of the authors whose posts make up the timeline.
+        """
+        return timeline_authors(self.request.user.id)
 
 
 @class_exception_handler
-class PostDetails(APIView):
+class PostDetails(StatelessReadMixin, APIView):
     def get(self, request: HttpRequest, post_id: str) -> Response:
         """
         Handles GET requests to retrieve a specific post by
@@ -42,13 +102,10 @@ class PostDetails(APIView):
             Response: The serialized data of the retrieved post.
         """
 
-        post = get_object_or_404(
-            Post.objects.annotate(
-                likes_count=Count('likes'),
-                comments_count=Count('comments')), id=post_id)
-
-        post_serialised = PostSerialiser(post).data
-        return Response(post_serialised)
+        posts = hydrate_posts([post_id])
+        if not posts:
+            raise Http404('No Post matches the given query.')
+        return Response(PostSerialiser(posts[0]).data)
 
     def post(self, request: HttpRequest):
         """
@@ -61,6 +118,7 @@ class PostDetails(APIView):
         Returns:
             Response: The serialized data of the newly created post.
         """
+        use_bounded_upload_handlers(request)
         data = {
             'content': request.data.get('content'),
             'pics': request.FILES.get('pics')
@@ -74,22 +132,27 @@ class PostDetails(APIView):
 
 
 @class_exception_handler
-class CommentView(APIView):
+class CommentView(StatelessReadMixin, APIView):
 
     def get(self, request: HttpRequest, post_id):
         """
-        Retrieves comments related to a specific post.
+        Retrieves a page of the comments of a specific post, oldest
+        first, using keyset pagination.
 
         Args:
             request: HttpRequest object representing the request.
             post_id: ID of the post to retrieve comments for.
 
         Returns:
-            CommentSerialiser: A serialized representation of the
-            comments related to the specified post.
+            Response: The serialized comments of the page with the
+            next and previous links.
         """
-        comments = Comment.objects.filter(post_id=post_id)
-        return Response(CommentSerialiser(comments, many=True).data)
+        paginator = CommentPagination()
+        comments = paginator.paginate_queryset(
+            Comment.objects.filter(post_id=post_id).select_related('user'),
+            request, self)
+        return paginator.get_paginated_response(
+            CommentSerialiser(comments, many=True).data)
 
     def post(self, request: HttpRequest, post_id: str) -> Response:
         """
@@ -143,12 +206,32 @@ class LikesView(APIView):
             Response: The number of likes the post currently has
             after the like/unlike operation.
         """
-        post = get_object_or_404(Post, id=post_id)
-        like, created = Like.objects.get_or_create(
-            post=post, user=request.user)
-        if not created:
-            like.delete()
-        return Response(post.likes.count())
+        post = get_object_or_404(Post.objects.only('id', 'user_id'), id=post_id)
+        _, likes_count = Like.objects.toggle(post, request.user)
+        return Response(likes_count)
+
+
+@class_exception_handler
+class FollowView(APIView):
+    def post(self, request: HttpRequest, user_id: str) -> Response:
+        """
+        Follows the user if the authenticated user does not follow
+        them yet, otherwise unfollows them.
+
+        Args:
+            request: HttpRequest object representing the request.
+            user_id: ID of the user to follow or unfollow.
+
+        Returns:
+            Response: Whether the user is now followed.
+        """
+        following = get_object_or_404(User.objects.only('id'), id=user_id)
+        if following.id == request.user.id:
+            return Response(
+                {'error': 'You cannot follow yourself.'},
+                status=status.HTTP_400_BAD_REQUEST)
+        return Response(
+            {'following': Follow.objects.toggle(request.user, following)})
 
 
 @class_exception_handler
@@ -164,7 +247,7 @@ class ProfileView(APIView):
 
         Returns:
             Response: A response containing the user's
-            username, email, profile picture, and bio.
+            username, email, profile picture and its thumbnails, and bio.
         """
 
         user = get_object_or_404(
@@ -175,6 +258,9 @@ class ProfileView(APIView):
              'profile_pice': (
                  user.profile.profile_pic.url if
                  user.profile.profile_pic else None),
+             'profile_pic_thumbnails': thumbnail_urls(
+                 user.profile.profile_pic.storage,
+                 user.profile.profile_pic_thumbnails),
              'bio': user.profile.bio
              }
         )
@@ -192,6 +278,7 @@ class ProfileView(APIView):
             information including username, email, profile picture, and bio.
         """
 
+        use_bounded_upload_handlers(request)
         user = get_object_or_404(
             User.objects.select_related('profile'), id=user_id)
         profile = user.profile
@@ -209,11 +296,83 @@ class ProfileView(APIView):
                 'email': user.email,
                 'profile_pic': (
                     profile.profile_pic.url if profile.profile_pic else None),
+                'profile_pic_thumbnails': thumbnail_urls(
+                    profile.profile_pic.storage,
+                    profile.profile_pic_thumbnails),
                 'bio': profile.bio
             },
             status=status.HTTP_200_OK
         )
     
+class NotificationView(ListAPIView):
+    """
+    Lists the authenticated user's notifications, newest first,
+    using keyset pagination. Pass `?unread=true` for unread only.
+    """
+    serializer_class = NotificationSerialiser
+    pagination_class = NotificationPagination
+
+    def get_queryset(self):
+        notifications = Notification.objects.filter(
+            created_for=self.request.user).select_related('user')
+        if self.request.query_params.get('unread') in ('1', 'true'):
+            notifications = notifications.filter(read=False)
+        return notifications
+
+
+@class_exception_handler
+class UnreadNotificationCountView(APIView):
+    def get(self, request: HttpRequest) -> Response:
+        """
+        Returns the number of unread notifications of the
+        authenticated user, served from a cached counter.
+
+        Args:
+            request: The HTTP request object.
+
+        Returns:
+            Response: The unread count.
+        """
+
+        user_id = request.user.id
+        unread = get_unread_count(
+            user_id,
+            lambda: Notification.objects.filter(
+                created_for_id=user_id, read=False).count())
+        return Response({'unread': unread})
+
+
+@class_exception_handler
+class MarkNotificationsReadView(APIView):
+    def post(self, request: HttpRequest) -> Response:
+        """
+        Marks notifications of the authenticated user as read in a
+        single UPDATE. Marks the given 'ids' only, or every unread
+        notification when no ids are passed.
+
+        Args:
+            request: The HTTP request object with optional 'ids'.
+
+        Returns:
+            Response: The number of notifications marked as read.
+        """
+
+        notifications = Notification.objects.filter(
+            created_for=request.user, read=False)
+        ids = request.data.get('ids')
+        if ids is not None:
+            if not isinstance(ids, list):
+                return Response(
+                    {'error': 'ids must be a list.'},
+                    status=status.HTTP_400_BAD_REQUEST)
+            notifications = notifications.filter(id__in=ids)
+
+        marked = notifications.update(read=True)
+        if marked:
+            invalidate_unread_count(request.user.id)
+        return Response({'marked': marked})
+
+
 class PublicApi(APIView):
     """
     An API view that allows public access without
@@ -244,9 +403,14 @@ class GoogleLoginRedirectApi(PublicApi):
         request.session["google_oauth2_state"] = state
         return redirect(authorization_url)
     
-class GoogleLoginApi(PublicApi):
+class GoogleLoginApi(View):
+    """
+    The Google OAuth2 login callback. It is an async Django view, as
+    DRF views cannot be async, so logins waiting on Google do not
+    hold a worker thread. Like PublicApi it needs no authentication.
+    """
 
-    def get(self, request, *args, **kwargs):
+    async def get(self, request, *args, **kwargs):
         """
         Handle GET requests to process Google OAuth2 login callback.
 
@@ -256,10 +420,12 @@ class GoogleLoginApi(PublicApi):
             **kwargs: Arbitrary keyword arguments.
 
         Returns:
-            Response: JSON response containing user information after successful login.
+            JsonResponse: JSON response containing user information after successful login.
         """
         input_serializer = InputSerializer(data=request.GET)
-        input_serializer.is_valid(raise_exception=True)
+        if not input_serializer.is_valid():
+            return JsonResponse(
+                input_serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
         validated_data = input_serializer.validated_data
 
@@ -268,52 +434,44 @@ class GoogleLoginApi(PublicApi):
         state = validated_data.get("state")
 
         if error is not None:
-            return Response(
+            return JsonResponse(
                 {"error": error},
                 status=status.HTTP_400_BAD_REQUEST
             )
 
         if code is None or state is None:
-            return Response(
+            return JsonResponse(
                 {"error": "Code and state are required."}, 
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-
         google_login_flow = GoogleRawLoginFlowService()
-        google_tokens = google_login_flow.get_tokens(code=code)
-        
-        id_token_decoded = google_tokens.decode_id_token(
-            client_id=os.getenv('GOOGLE_OAUTH2_CLIENT_ID'))
-        
-        #user_info = google_login_flow.get_user_info(google_tokens=google_tokens)
-        
+        try:
+            google_tokens = await google_login_flow.aget_tokens(code=code)
+            # verification may fetch Google's keys after a key rotation
+            id_token_decoded = await sync_to_async(
+                google_tokens.decode_id_token, thread_sensitive=False)(
+                    client_id=google_login_flow.client_id)
+        except ValueError as e:
+            return JsonResponse(
+                {"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
         user_email = id_token_decoded.get("email")
-        user_name = id_token_decoded.get("name")
-        user, _ = User.objects.get_or_create(email=user_email, username=user_name)
-        
+        if not user_email:
+            return JsonResponse(
+                {"error": "The ID token has no email."},
+                status=status.HTTP_400_BAD_REQUEST)
+
         try:
-            user = User.objects.get(email=user_email)
-            
-        except User.DoesNotExist:
-            username = user_email.split('@')[0]
-            first_name = id_token_decoded.get('given_name', '')
-            last_name = id_token_decoded.get('family_name', '')
-
-            user = User.objects.create(
-                username=username,
-                email=user_email,
-                first_name=first_name,
-                last_name=last_name,
-                registration_method='google',
-                phone_no=None,
-                referral=None
-            )
-        finally:
-            access_token, refresh_token = generate_tokens_for_user(user)
-            response_data = {
-                'user': user_email,
-                'access_token': str(access_token),
-                'refresh_token': str(refresh_token)
-            }
-            return Response(response_data)
\ No newline at end of file
+            user = await sync_to_async(get_or_create_google_user)(
+                id_token_decoded)
+        except ValueError as e:
+            return JsonResponse(
+                {"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        access_token, refresh_token = generate_tokens_for_user(user)
+        return JsonResponse({
+            'user': user_email,
+            'access_token': str(access_token),
+            'refresh_token': str(refresh_token)
+        })
@@ -9,17 +9,24 @@ https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
 
 import os
 from django.core.asgi import get_asgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'tu_meet.settings')
+
+# initialise Django before importing code that touches the models
+django_asgi_app = get_asgi_application()
+
 from channels.routing import ProtocolTypeRouter, URLRouter
 from channels.security.websocket import AllowedHostsOriginValidator
+from social_app.middleware import JWTAuthMiddleware
 from social_app.routing import websocket_urlpatterns
 
-os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'myproject.settings')
-
 application = ProtocolTypeRouter({
-    "http": get_asgi_application(),
+    "http": django_asgi_app,
     "websocket": AllowedHostsOriginValidator(
-            URLRouter(
-                websocket_urlpatterns
+            JWTAuthMiddleware(
+                URLRouter(
+                    websocket_urlpatterns
+                )
             )
         ),
 })
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 import os
+import sys
 from pathlib import Path
 from datetime import timedelta
 
@@ -28,6 +29,8 @@ DEBUG = True
 
 ALLOWED_HOSTS = []
 
+TESTING = sys.argv[1:2] == ['test']
+
 
 # Application definition
 
@@ -42,6 +45,7 @@ INSTALLED_APPS = [
     'social_app',
     'rest_framework',
     'rest_framework_simplejwt',
+    'django_rq',
 ]
 
 MIDDLEWARE = [
@@ -135,6 +139,21 @@ USE_TZ = True
 MEDIA_ROOT =  os.path.join(BASE_DIR, 'media')
 MEDIA_URL = '/media/'
 
+# how social_app.media hands MEDIA_URL files to the web server: None streams
+# them from Python, 'nginx' uses X-Accel-Redirect to the internal location
+# MEDIA_SENDFILE_URL (aliased to MEDIA_ROOT), 'xsendfile' uses X-Sendfile
+MEDIA_SENDFILE_BACKEND = os.environ.get('MEDIA_SENDFILE_BACKEND') or None
+MEDIA_SENDFILE_URL = '/protected-media/'
+# browser cache lifetime of media not stored under a content digest
+MEDIA_CACHE_MAX_AGE = 60 * 60
+
+# widths in pixels of the WebP/JPEG thumbnails generated for uploaded pictures
+IMAGE_THUMBNAIL_WIDTHS = [160, 320, 640]
+
+# limits enforced while post and profile pictures are streamed to disk
+IMAGE_UPLOAD_MAX_BYTES = 10 * 1024 * 1024
+IMAGE_UPLOAD_MAX_PIXELS = 40_000_000
+
 # Static files (CSS, JavaScript, Images)
 # https://docs.djangoproject.com/en/4.2/howto/static-files/
 
@@ -153,10 +172,13 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.IsAuthenticated',
     ),
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'social_app.authentication.CachedJWTAuthentication',
     ),
 }
 
+# seconds CachedJWTAuthentication keeps an authenticated user cached, 0 disables
+AUTH_USER_CACHE_TIMEOUT = 30
+
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=60),
     'SLIDING_TOKEN_REFRESH_LIFETIME': timedelta(days=1),
@@ -165,11 +187,91 @@ SIMPLE_JWT = {
     'SLIDING_TOKEN_LIFETIME_LATE_USER': timedelta(days=30),
 }
 
-CHANNEL_LAYERS = {
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+if TESTING:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django_redis.cache.RedisCache',
+            'LOCATION': 'redis://127.0.0.1:6379/1',
+            'OPTIONS': {
+                'CLIENT_CLASS': 'django_redis.client.DefaultClient',
+            },
+        }
+    }
+
+# seconds a serialized post detail / feed page stays cached
+POST_CACHE_TIMEOUT = 60 * 5
+FEED_CACHE_TIMEOUT = 60
+# seconds a cached unread notification count may be served stale
+UNREAD_COUNT_CACHE_TIMEOUT = 60 * 5
+
+# newest comments embedded in each post of the feed, timeline and details
+COMMENT_PREVIEW_SIZE = 3
+
+# Background job queues, run with
+# `python manage.py rqworker notifications --with-scheduler`.
+# ASYNC False runs jobs inline, so the test runner needs no Redis.
+RQ_QUEUES = {
     'default': {
-        'BACKEND': 'channels_redis.core.RedisChannelLayer',
-        'CONFIG': {
-            "hosts": [('127.0.0.1', 6379)],
-        },
+        'HOST': '127.0.0.1',
+        'PORT': 6379,
+        'DB': 0,
+        'DEFAULT_TIMEOUT': 360,
+        'ASYNC': not TESTING,
+    },
+    'notifications': {
+        'HOST': '127.0.0.1',
+        'PORT': 6379,
+        'DB': 0,
+        'DEFAULT_TIMEOUT': 60,
+        'ASYNC': not TESTING,
     },
 }
+
+# home timelines are materialized in Redis by pushing each new post to
+# its author's followers; authors with more followers than
+# TIMELINE_FANOUT_MAX_FOLLOWERS are merged in when a timeline is read.
+# Off under the test runner, where the timelines are merged from the db.
+TIMELINE_FANOUT = not TESTING
+TIMELINE_MAX_LENGTH = 800
+TIMELINE_FANOUT_MAX_FOLLOWERS = 10_000
+TIMELINE_TTL = 60 * 60 * 24 * 7
+
+# outgoing HTTP calls (Google OAuth): (connect, read) timeouts in seconds,
+# keep-alive connections per host and retries with exponential backoff
+HTTP_CLIENT_TIMEOUT = (3.05, 10)
+HTTP_CLIENT_POOL_SIZE = 10
+HTTP_CLIENT_RETRIES = 3
+HTTP_CLIENT_BACKOFF_FACTOR = 0.3
+
+# seconds Google's signing keys are cached when the JWKS response has no
+# max-age, and the minimum interval between fetches for unknown key ids
+JWKS_DEFAULT_MAX_AGE = 60 * 60
+JWKS_MIN_REFRESH_INTERVAL = 60
+
+# like/comment events per recipient are buffered this long and then
+# delivered as one coalesced notification per post
+NOTIFICATION_COALESCE_SECONDS = 10
+
+if TESTING:
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels.layers.InMemoryChannelLayer',
+        },
+    }
+else:
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels_redis.core.RedisChannelLayer',
+            'CONFIG': {
+                "hosts": [('127.0.0.1', 6379)],
+            },
+        },
+    }